@@ -0,0 +1,215 @@
+"""
+Compares the CPU cost per match/v5 payload of decoding it, extracting the stored fields and archiving it,
+before and after the fast decoding path.
+
+Old path: json.loads() -> per participant, every stored field read into one dict and the summoner's
+fields read again into a second one -> canonical JSON with json.dumps(sort_keys=True), sha256 and gzip level 6.
+New path: json_codec.loads() (orjson when installed) -> summoner_dashboard.services.match_extraction,
+one dict per participant, with the summoner's data taken from its participant's dict -> MatchArchive.encode()
+(orjson with OPT_SORT_KEYS), sha256 and gzip at the archive's level.
+The archive step is measured without writing the file, the same in both paths.
+
+The payloads are read from a match archive (the recorded payloads of real crawls), or generated if there
+isn't one. Generated payloads are padded with the per-participant stats a real response also carries
+("challenges", "perks"...), so their size is close to a real one.
+
+    python benchmarks/match_payload.py [--archive-dir match_archive] [--matches 500]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "whgg_django.settings")
+
+import django
+
+django.setup()
+
+from summoner_dashboard import json_codec
+from summoner_dashboard.fake_riot import FIRST_GAME_END, match_payload
+from summoner_dashboard.match_archive import MatchArchive
+from summoner_dashboard.services.match_extraction import calculate_kda, extract_match_data
+
+
+def archived_payloads(archive_dir: str, matches: int) -> list:
+    archive = MatchArchive(archive_dir)
+    payloads = []
+    for directory, _, file_names in os.walk(archive_dir):
+        for file_name in file_names:
+            if file_name.endswith(".json.gz"):
+                payloads.append(archive.get_bytes(file_name[:-len(".json.gz")]))
+                if len(payloads) == matches:
+                    return payloads
+    return payloads
+
+
+def generated_payloads(matches: int) -> list:
+    rng = random.Random(0)
+    payloads = []
+    for index in range(matches):
+        puuids = [f"puuid-{index}-{slot}-" + "x" * 60 for slot in range(10)]
+        payload = match_payload(f"EUW1_{6000000000 + index}", puuids, FIRST_GAME_END + index * 3600 * 1000)
+        for participant in payload["info"]["participants"]:
+            participant["challenges"] = {f"challenge{stat}": rng.random() * 100 for stat in range(120)}
+            participant["perks"] = {
+                "statPerks": {"defense": 5002, "flex": 5008, "offense": 5005},
+                "styles": [
+                    {"description": style, "selections": [{"perk": 8000 + perk, "var1": rng.randint(0, 999), "var2": 0, "var3": 0} for perk in range(4)], "style": 8000}
+                    for style in ["primaryStyle", "subStyle"]
+                ],
+            }
+            participant.update({f"stat{stat}": rng.randint(0, 10000) for stat in range(80)})
+        payloads.append(json.dumps(payload).encode())
+    return payloads
+
+
+def legacy_participant_data(participant) -> dict:
+    # Copia de APIHandler._handle_participant_data
+    return {
+        "puuid": participant["puuid"],
+        "summoner_name": participant["summonerName"],
+        "champion_name": participant["championName"],
+        "team_id": participant["teamId"],
+        "team_position": participant["teamPosition"],
+        "win": 1 if participant["win"] else 0,
+        "kills": participant["kills"],
+        "deaths": participant["deaths"],
+        "assists": participant["assists"],
+        "kda": calculate_kda(participant["kills"], participant["deaths"], participant["assists"]),
+        "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
+        "vision": participant["visionScore"],
+        "summoner_spell1": participant["summoner1Id"],
+        "summoner_spell2": participant["summoner2Id"],
+        "item0": participant["item0"],
+        "item1": participant["item1"],
+        "item2": participant["item2"],
+        "item3": participant["item3"],
+        "item4": participant["item4"],
+        "item5": participant["item5"],
+        "item6": participant["item6"],
+        "champion_level": participant["champLevel"],
+        "gold_earned": participant["goldEarned"],
+        "damage_dealt_to_champions": participant["totalDamageDealtToChampions"],
+        "damage_taken": participant["totalDamageTaken"],
+        "wards_placed": participant["wardsPlaced"],
+        "wards_killed": participant["wardsKilled"],
+    }
+
+
+def legacy_summoner_data(participant, puuid) -> dict:
+    # Copia de APIHandler._handle_summoner_data
+    return {
+        "summoner_puuid": puuid,
+        "champion_name": participant["championName"],
+        "kills": participant["kills"],
+        "deaths": participant["deaths"],
+        "assists": participant["assists"],
+        "win": 1 if participant["win"] else 0,
+        "kda": calculate_kda(participant["kills"], participant["deaths"], participant["assists"]),
+        "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
+        "vision": participant["visionScore"],
+        "summoner_spell1": participant["summoner1Id"],
+        "summoner_spell2": participant["summoner2Id"],
+        "item0": participant["item0"],
+        "item1": participant["item1"],
+        "item2": participant["item2"],
+        "item3": participant["item3"],
+        "item4": participant["item4"],
+        "item5": participant["item5"],
+        "item6": participant["item6"],
+        "team_position": participant["teamPosition"],
+    }
+
+
+def legacy_extract(match_request: dict, puuid: str) -> dict:
+    # Copia del bucle de APIHandler._match_data
+    summoner_data = None
+    participants_data = []
+    for participant in match_request["info"]["participants"]:
+        participants_data.append(legacy_participant_data(participant))
+        if participant["puuid"] == puuid:
+            summoner_data = legacy_summoner_data(participant, puuid)
+    return {
+        "match_data": {
+            "game_mode": match_request["info"]["gameMode"],
+            "game_duration": match_request["info"]["gameDuration"],
+            "queue_id": match_request["info"]["queueId"],
+            "game_end_timestamp": match_request["info"].get("gameEndTimestamp", 0),
+        },
+        "summoner_data": summoner_data,
+        "participants_data": participants_data,
+    }
+
+
+def legacy_archive(payload: dict) -> tuple:
+    # Copia de MatchArchive.put antes de json_codec.dumps(sort_keys=True), sin escribir el fichero
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    return hashlib.sha256(data).hexdigest(), gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def archive(payload: dict, compresslevel: int) -> tuple:
+    # MatchArchive.put sin escribir el fichero
+    data = MatchArchive.encode(payload)
+    return hashlib.sha256(data).hexdigest(), gzip.compress(data, compresslevel=compresslevel, mtime=0)
+
+
+def measure(label: str, run, matches: int) -> float:
+    seconds = min(timeit.repeat(run, number=1, repeat=5)) / matches
+    print(f"{label:<16} {seconds * 1e6:8.1f} us/match")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", help="Read the payloads from this match archive.")
+    parser.add_argument("--matches", type=int, default=500)
+    args = parser.parse_args()
+
+    payloads = archived_payloads(args.archive_dir, args.matches) if args.archive_dir else []
+    source = f"archive {args.archive_dir}"
+    if not payloads:
+        payloads = generated_payloads(args.matches)
+        source = "generated"
+
+    decoded = [json.loads(payload) for payload in payloads]
+    puuids = [payload["info"]["participants"][0]["puuid"] for payload in decoded]
+    match_ids = [payload["metadata"]["matchId"] for payload in decoded]
+    matches = len(payloads)
+
+    # Las dos rutas tienen que dar los mismos datos (summoner_data ahora lleva todos los campos del participante)
+    for match_id, payload, puuid in zip(match_ids, decoded, puuids):
+        new, old = extract_match_data(match_id, payload, puuid), legacy_extract(payload, puuid)
+        assert new["match_data"] == old["match_data"] and new["participants_data"] == old["participants_data"]
+        assert {key: new["summoner_data"][key] for key in old["summoner_data"]} == old["summoner_data"]
+        # Lo archivado es el mismo payload
+        assert json.loads(gzip.decompress(archive(payload, 1)[1])) == payload
+    compresslevel = MatchArchive("").compresslevel
+
+    print(f"{matches} payloads ({source}), {sum(map(len, payloads)) / matches / 1024:.1f} KB on average")
+    print(f"decoder: {'orjson' if json_codec.orjson is not None else 'json'}")
+    print("before")
+    decode = measure("  json.loads", lambda: [json.loads(payload) for payload in payloads], matches)
+    extract = measure("  extract", lambda: [legacy_extract(p, puuid) for p, puuid in zip(decoded, puuids)], matches)
+    archived = measure("  archive", lambda: [legacy_archive(p) for p in decoded], matches)
+    before = decode + extract + archived
+    print(f"  {'total':<14} {before * 1e6:8.1f} us/match")
+    print("after")
+    decode = measure("  json_codec", lambda: [json_codec.loads(payload) for payload in payloads], matches)
+    extract = measure(
+        "  extract",
+        lambda: [extract_match_data(m, p, puuid) for m, p, puuid in zip(match_ids, decoded, puuids)],
+        matches,
+    )
+    archived = measure("  archive", lambda: [archive(p, compresslevel) for p in decoded], matches)
+    after = decode + extract + archived
+    print(f"  {'total':<14} {after * 1e6:8.1f} us/match ({before / after:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Compares the cost per rendered match of the old flat dict path against MatchRecord.
+
+Old path: ORM instance -> ~60-key dict with flattened participants -> view dict rebuilding the lists.
+New path: values_list() row -> MatchRecord.
+
+No database is needed: the rows are synthetic and both paths start from the same raw column values.
+
+    python benchmarks/match_record.py [--matches 1000]
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "whgg_django.settings")
+
+import django
+
+django.setup()
+
+from summoner_dashboard.models import MatchModel
+from summoner_dashboard.services.match_record import MatchRecord
+from summoner_dashboard.utils import get_game_type
+
+
+def synthetic_values(index: int) -> dict:
+    return {
+        "id": index,
+        "summoner_id": "puuid",
+        "match_id": f"EUW1_{6000000000 + index}",
+        "champion_name": "Hecarim",
+        "win": index % 2,
+        "kills": 7.0,
+        "deaths": 3.0,
+        "assists": 11.0,
+        "kda": 6.0,
+        "cs": 210,
+        "vision": 25,
+        "summoner_spell1": 4,
+        "summoner_spell2": 11,
+        **{f"item{slot}": 3000 + slot for slot in range(7)},
+        "participant_summoner_names": [f"Player {player}" for player in range(10)],
+        "participant_champion_names": ["Hecarim", "Ahri", "Jinx", "Thresh", "Garen"] * 2,
+        "participant_team_ids": [100] * 5 + [200] * 5,
+        "game_mode": "CLASSIC",
+        "game_duration": 1800,
+        "queue_id": 420,
+        "team_position": "JUNGLE",
+        "game_end_timestamp": 1700000000000 + index,
+    }
+
+
+def legacy_match_dict(match) -> dict:
+    # Copia de DatabaseHandler._get_all_match_data antes de MatchRecord
+    match_data = {
+        "summoner_puuid": match.summoner_id,
+        "match_id": match.match_id,
+        "champion_name": match.champion_name,
+        "win": match.win,
+        "kills": match.kills,
+        "deaths": match.deaths,
+        "assists": match.assists,
+        "kda": match.kda,
+        "cs": match.cs,
+        "vision": match.vision,
+        "summoner_spell1": match.summoner_spell1,
+        "summoner_spell2": match.summoner_spell2,
+        "game_mode": match.game_mode,
+        "game_duration": match.game_duration,
+        "queue_id": match.queue_id,
+        "team_position": match.team_position,
+    }
+    for slot in range(7):
+        match_data[f"item{slot}"] = getattr(match, f"item{slot}")
+    for player in range(10):
+        match_data[f"participant{player + 1}_summoner_name"] = match.participant_summoner_names[player]
+        match_data[f"participant{player + 1}_champion_name"] = match.participant_champion_names[player]
+        match_data[f"participant{player + 1}_team_id"] = match.participant_team_ids[player]
+    return match_data
+
+
+def legacy_match_card(match: dict) -> dict:
+    # Copia del dict que construia views.summoner_info para cada partida
+    kills, deaths, assists = int(match["kills"]), int(match["deaths"]), int(match["assists"])
+    return {
+        "game_type": get_game_type(match["queue_id"]),
+        "game_mode": match["game_mode"],
+        "queue_id": match["queue_id"],
+        "game_duration": match["game_duration"],
+        "win": match["win"],
+        "champion_name": match["champion_name"],
+        "item_ids": [match[f"item{slot}"] for slot in range(7)],
+        "summoner_spell_ids": [match["summoner_spell1"], match["summoner_spell2"]],
+        "kills": kills,
+        "deaths": deaths,
+        "assists": assists,
+        "kda_ratio": round((kills + assists) / deaths, 2) if deaths > 0 else round(kills + assists, 2),
+        "cs": match["cs"],
+        "vision": match["vision"],
+        "participant_summoner_names": [match[f"participant{player}_summoner_name"] for player in range(1, 11)],
+        "participant_champion_names": [match[f"participant{player}_champion_name"] for player in range(1, 11)],
+    }
+
+
+def legacy_path(model_rows: list, field_names: list) -> list:
+    return [legacy_match_card(legacy_match_dict(MatchModel.from_db("default", field_names, row))) for row in model_rows]
+
+
+def record_path(record_rows: list) -> list:
+    return [MatchRecord(row) for row in record_rows]
+
+
+def measure(label: str, build, matches: int) -> None:
+    seconds = min(timeit.repeat(build, number=1, repeat=5))
+
+    tracemalloc.start()
+    result = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(f"{label:<12} {seconds / matches * 1e6:8.2f} us/match {memory / matches:10.0f} bytes/match")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matches", type=int, default=1000)
+    args = parser.parse_args()
+
+    field_names = [field.attname for field in MatchModel._meta.concrete_fields]
+    values = [synthetic_values(index) for index in range(args.matches)]
+    model_rows = [tuple(value[name] for name in field_names) for value in values]
+    record_rows = [tuple(value[name] for name in MatchRecord.FIELDS) for value in values]
+
+    print(f"{args.matches} matches")
+    measure("dicts", lambda: legacy_path(model_rows, field_names), args.matches)
+    measure("MatchRecord", lambda: record_path(record_rows), args.matches)
+
+
+if __name__ == "__main__":
+    main()
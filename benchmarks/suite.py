@@ -0,0 +1,320 @@
+"""
+Benchmark suite of the database side of the app at scale: ingestion, aggregation and the summoner page.
+
+Seeds the configured database with synthetic summoners and matches (only once for each scale: the
+seeded summoners with the same number of matches are reused by later runs), then times each service method and a full page request
+on random seeded summoners, and reports p50/p95 latency and queries per call.
+
+Results are saved as JSON with the commit they were measured on; --compare prints the change against
+a previous run. It writes to the database of DJANGO_SETTINGS_MODULE: use a database for benchmarks.
+
+    python benchmarks/suite.py --summoners 10000 --matches 1000 --output bench.json
+    python benchmarks/suite.py --summoners 10000 --matches 1000 --compare bench.json
+"""
+import argparse
+from datetime import datetime, timezone as dt_timezone
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "whgg_django.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from summoner_dashboard.fake_riot import CHAMPIONS, FIRST_GAME_END, POSITIONS, QUEUE_IDS, match_payload
+from summoner_dashboard.models import MatchDetailModel, MatchModel, ParticipantModel, SummonerModel
+from summoner_dashboard.services.db_handler import build_match_model
+from summoner_dashboard.services.match_extraction import extract_match_data
+from summoner_dashboard.services.summoner_data import SummonerData
+
+
+BENCH_PREFIX = "bench"
+INGEST_PREFIX = "bench-ingest"
+SEED_BATCH_SIZE = 5000
+
+
+def percentile(values: list, percent: float) -> float:
+    # Nearest-rank, sin interpolar
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))]
+
+
+def seeded_match(summoner: SummonerModel, index: int, rng: random.Random) -> MatchModel:
+    kills, deaths, assists = rng.randint(0, 15), rng.randint(0, 12), rng.randint(0, 20)
+    return MatchModel(
+        summoner=summoner,
+        match_id=f"BENCH_{summoner.summoner_puuid}_{index}",
+        champion_name=rng.choice(CHAMPIONS),
+        win=rng.randint(0, 1),
+        kills=kills,
+        deaths=deaths,
+        assists=assists,
+        kda=round((kills + assists) / (deaths or 1), 2),
+        cs=rng.randint(0, 300),
+        vision=rng.randint(0, 60),
+        summoner_spell1=4,
+        summoner_spell2=rng.choice([7, 11, 12, 14]),
+        item0=3006, item1=3031, item2=3071, item3=3089, item4=1001, item5=0, item6=3340,
+        game_mode="CLASSIC",
+        game_duration=rng.randint(900, 2400),
+        queue_id=QUEUE_IDS[index % len(QUEUE_IDS)],
+        team_position=rng.choice(POSITIONS),
+        game_end_timestamp=FIRST_GAME_END + index * 3600 * 1000,
+    )
+
+
+def seeded_participants(match: MatchModel, rng: random.Random) -> list:
+    # El summoner es el primer jugador: sus estadisticas son las de su partida
+    participants = []
+    for index in range(10):
+        kills, deaths, assists = (match.kills, match.deaths, match.assists) if index == 0 else (
+            rng.randint(0, 15), rng.randint(0, 12), rng.randint(0, 20)
+        )
+        participants.append(ParticipantModel(
+            match_id=match.match_id,
+            puuid=match.summoner_id if index == 0 else f"{match.match_id}-{index}",
+            participant_index=index,
+            summoner_name=f"Player {index}",
+            champion_name=match.champion_name if index == 0 else rng.choice(CHAMPIONS),
+            team_id=100 if index < 5 else 200,
+            team_position=match.team_position if index == 0 else POSITIONS[index % len(POSITIONS)],
+            win=match.win if index < 5 else 1 - match.win,
+            kills=kills,
+            deaths=deaths,
+            assists=assists,
+            kda=round((kills + assists) / (deaths or 1), 2),
+            cs=match.cs if index == 0 else rng.randint(0, 300),
+            vision=match.vision if index == 0 else rng.randint(0, 60),
+            summoner_spell1=match.summoner_spell1,
+            summoner_spell2=match.summoner_spell2,
+            item0=match.item0, item1=match.item1, item2=match.item2, item3=match.item3,
+            item4=match.item4, item5=match.item5, item6=match.item6,
+            champion_level=rng.randint(10, 18),
+            gold_earned=rng.randint(5000, 20000),
+            damage_dealt_to_champions=rng.randint(5000, 50000),
+            damage_taken=rng.randint(5000, 50000),
+            wards_placed=rng.randint(0, 30),
+            wards_killed=rng.randint(0, 10),
+        ))
+    return participants
+
+
+def seed_database(summoners: int, matches: int, seed: int) -> list:
+    '''
+    Makes sure the database has `summoners` seeded summoners with `matches` matches each (and their champion
+    stats), creating the missing ones. Returns their names.
+    '''
+    # El numero de partidas va en el nombre y el puuid: una ejecucion con otra escala no reutiliza estos summoners
+    scale = f"{matches}m"
+    names = [f"{BENCH_PREFIX} {scale} {index}" for index in range(summoners)]
+    seeded = SummonerModel.objects.filter(summoner_puuid__startswith=f"{BENCH_PREFIX}-{scale}-puuid-")
+    # Recien actualizados: la pagina no intenta refrescarlos desde la API
+    seeded.update(last_update=timezone.now())
+    existing = set(seeded.values_list("summoner_name", flat=True))
+    missing = [name for name in names if name not in existing]
+    if not missing:
+        return names
+
+    print(f"Seeding {len(missing)} summoners with {matches} matches each...", flush=True)
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    # update_champion_stats no usa nada del summoner: basta una instancia sin inicializar
+    handler = SummonerData.__new__(SummonerData)
+    batch_size = max(1, SEED_BATCH_SIZE // max(matches, 1))
+
+    for batch_start in range(0, len(missing), batch_size):
+        batch = missing[batch_start:batch_start + batch_size]
+        with transaction.atomic():
+            summoner_models = SummonerModel.objects.bulk_create([
+                SummonerModel(
+                    summoner_puuid=f"{BENCH_PREFIX}-{scale}-puuid-{name.split()[-1]}",
+                    summoner_id=f"{BENCH_PREFIX}-{scale}-id-{name.split()[-1]}",
+                    summoner_name=name,
+                    region="euw1",
+                    last_update=timezone.now(),
+                    profile_icon_id=1,
+                    summoner_level=100,
+                    soloq_rank="GOLD 2",
+                )
+                for name in batch
+            ])
+
+            for summoner in summoner_models:
+                summoner_matches = [seeded_match(summoner, index, rng) for index in range(matches)]
+                MatchModel.objects.bulk_create(summoner_matches, batch_size=SEED_BATCH_SIZE)
+                MatchDetailModel.objects.bulk_create([
+                    MatchDetailModel(
+                        match_id=match.match_id, game_mode=match.game_mode, game_duration=match.game_duration,
+                        queue_id=match.queue_id, game_end_timestamp=match.game_end_timestamp,
+                    )
+                    for match in summoner_matches
+                ], batch_size=SEED_BATCH_SIZE)
+                ParticipantModel.objects.bulk_create([
+                    participant for match in summoner_matches for participant in seeded_participants(match, rng)
+                ], batch_size=SEED_BATCH_SIZE)
+                handler.update_champion_stats(summoner, summoner_matches)
+
+        done = min(batch_start + len(batch), len(missing))
+        print(f"  {done}/{len(missing)} summoners ({time.perf_counter() - start:.0f} s)", flush=True)
+
+    return names
+
+
+def ingest_matches(summoner: SummonerModel, matches: int) -> dict:
+    game_data = {}
+    for index in range(matches):
+        match_id = f"BENCHINGEST_{summoner.summoner_puuid}_{index}"
+        puuids = [summoner.summoner_puuid] + [f"{summoner.summoner_puuid}-{slot}" for slot in range(9)]
+        payload = match_payload(match_id, puuids, FIRST_GAME_END + index * 3600 * 1000, QUEUE_IDS[index % len(QUEUE_IDS)])
+        game_data[match_id] = extract_match_data(match_id, payload, summoner.summoner_puuid)
+    return game_data
+
+
+def run_benchmark(name: str, call, iterations: int, setup=None) -> dict:
+    '''
+    Times `iterations` calls of call(*setup()), counting the queries of each one. setup() is not timed.
+    '''
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        args = setup() if setup is not None else ()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            call(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+
+    result = {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries": percentile(queries, 50),
+        "iterations": iterations,
+    }
+    print(f"{name:<26} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  {result['queries']:4d} queries", flush=True)
+    return result
+
+
+def run_suite(names: list, iterations: int, ingest_matches_count: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    client = Client()
+
+    def random_summoner() -> tuple:
+        summoner = SummonerModel.objects.get(summoner_name=rng.choice(names))
+        return (SummonerData.from_db(summoner, api_key=""),)
+
+    def new_summoner_matches() -> tuple:
+        # Summoner nuevo en cada iteracion: todas las partidas y sus champion stats se insertan
+        puuid = f"{INGEST_PREFIX}-{rng.getrandbits(64):x}"
+        summoner = SummonerModel.objects.create(summoner_puuid=puuid, summoner_id=puuid, summoner_name=puuid, region="euw1")
+        return SummonerData.from_db(summoner, api_key=""), ingest_matches(summoner, ingest_matches_count)
+
+    def new_champion_matches() -> tuple:
+        summoner = SummonerModel.objects.get(summoner_name=rng.choice(names))
+        matches = ingest_matches(summoner, ingest_matches_count)
+        new_matches = [build_match_model(summoner, match_id, data) for match_id, data in matches.items()]
+        return SummonerData.from_db(summoner, api_key=""), summoner, new_matches
+
+    def update_champion_stats(summoner_data, summoner, new_matches):
+        # Sin guardar: cada iteracion parte de las mismas stats
+        with transaction.atomic():
+            summoner_data.update_champion_stats(summoner, new_matches)
+            transaction.set_rollback(True)
+
+    benchmarks = {
+        "save_matches_data_to_db": (lambda summoner, matches: summoner.save_matches_data_to_db(matches), new_summoner_matches),
+        "update_champion_stats": (update_champion_stats, new_champion_matches),
+        "recent_matches_page": (lambda summoner: summoner.recent_matches_page(), random_summoner),
+        "role_data": (lambda summoner: summoner.role_data(), random_summoner),
+        "top_champions_data": (lambda summoner: summoner.top_champions_data(), random_summoner),
+        "profile_data": (lambda summoner: summoner.profile_data(), random_summoner),
+        "summoner_page": (
+            lambda name: client.get(reverse("summoner_dashboard:summoner_info", args=[name])),
+            lambda: (rng.choice(names),),
+        ),
+    }
+
+    try:
+        return {
+            name: run_benchmark(name, call, iterations, setup)
+            for name, (call, setup) in benchmarks.items()
+        }
+    finally:
+        MatchDetailModel.objects.filter(match_id__startswith="BENCHINGEST_").delete()
+        SummonerModel.objects.filter(summoner_puuid__startswith=INGEST_PREFIX).delete()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit') or '?'}):")
+    for name, result in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            print(f"{name:<26} (new)")
+            continue
+        changes = [
+            f"{metric} {before[metric]:.2f} -> {result[metric]:.2f} ms ({(result[metric] / before[metric] - 1) * 100 if before[metric] else 0:+.0f}%)"
+            for metric in ["p50_ms", "p95_ms"]
+        ]
+        print(f"{name:<26} {'  '.join(changes)}  queries {before['queries']} -> {result['queries']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summoners", type=int, default=100, help="Seeded summoners.")
+    parser.add_argument("--matches", type=int, default=100, help="Matches of each seeded summoner.")
+    parser.add_argument("--iterations", type=int, default=50, help="Calls timed for each benchmark.")
+    parser.add_argument("--ingest-matches", type=int, default=100, help="Matches saved per ingestion call.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare the results with a previous JSON file.")
+    args = parser.parse_args()
+
+    # El cliente de test necesita "testserver" en ALLOWED_HOSTS
+    setup_test_environment()
+    names = seed_database(args.summoners, args.matches, args.seed)
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+        "database": connection.vendor,
+        "python": platform.python_version(),
+        "scale": {"summoners": args.summoners, "matches": args.matches, "ingest_matches": args.ingest_matches},
+        "benchmarks": run_suite(names, args.iterations, args.ingest_matches, args.seed),
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results saved to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class SummonerDataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'summoner_dashboard'
+
+    def ready(self):
+        from .metrics import install_query_timer
+
+        # Todas las consultas se miden (whgg_db_query_seconds y "db" en Server-Timing)
+        connection_created.connect(install_query_timer, dispatch_uid="summoner_dashboard.install_query_timer")
@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import json_codec
+
+
+# Devuelto por get() cuando la clave no esta (None o [] son respuestas validas de la API)
+MISSING = object()
+
+
+class CacheStats:
+    '''
+    Thread-safe counters of a cache: hits, hits served by a request-scoped memo in front of it,
+    misses and entries evicted to stay under the size limit.
+    '''
+    def __init__(self) -> None:
+        self.hits = 0
+        self.request_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.request_hits + self.misses
+            return {
+                "hits": self.hits,
+                "request_hits": self.request_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.request_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+class TTLCache:
+    '''
+    In-process LRU cache with a time to live per entry and at most maxsize entries.
+
+    A ttl of None never expires (the entry can still be evicted by the LRU).
+    '''
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.add("hits")
+                    return value
+                del self._entries[key]
+
+        self.stats.add("misses")
+        return MISSING
+
+    def set(self, key, value, ttl: float = None) -> None:
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.add("evictions", evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheBackend(ABC):
+    '''
+    Storage of a SharedCache: keys are strings and values compressed bytes.
+    '''
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        '''
+        Returns the stored value, or None if the key is missing or expired.
+        '''
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float = None) -> int:
+        '''
+        Stores the value (ttl None: no expiry) and returns how many entries were evicted to make room.
+        '''
+
+    @abstractmethod
+    def clear(self) -> None:
+        '''
+        Deletes every entry.
+        '''
+
+
+class SQLiteCacheBackend(CacheBackend):
+    '''
+    Backend stored in a SQLite file, shared by every process on the same machine (e.g. gunicorn workers).
+
+    When the stored values go over max_size bytes, expired entries are deleted first and then
+    the least recently used ones.
+
+    Reads don't write: the access times of the hits are kept in memory and saved with the next set()
+    (or once access_flush_size of them are pending), so readers of different workers don't queue for the
+    write lock. The total size is kept in a counter updated by every write, instead of summed on every set().
+    '''
+    def __init__(self, path: str, max_size: int = 256 * 1024 * 1024, timeout: float = 30, access_flush_size: int = 1000) -> None:
+        self.path = str(path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.access_flush_size = access_flush_size
+        self._local = threading.local()
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS api_cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS api_cache_accessed_at ON api_cache (accessed_at)")
+            connection.execute("CREATE TABLE IF NOT EXISTS api_cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)")
+            # Ficheros creados sin el contador: se suma una sola vez
+            connection.execute("INSERT OR IGNORE INTO api_cache_size SELECT 0, COALESCE(SUM(size), 0) FROM api_cache")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> bytes:
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value FROM api_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+
+        with self._accessed_lock:
+            self._accessed[key] = now
+            flush = len(self._accessed) >= self.access_flush_size
+        if flush:
+            self._write(connection, lambda: self._flush_accessed(connection))
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: float = None) -> int:
+        connection = self._connection()
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+
+        def write():
+            old_size = connection.execute("SELECT size FROM api_cache WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO api_cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            self._flush_accessed(connection)
+            size = self._add_size(connection, len(value) - (old_size[0] if old_size else 0))
+            return self._evict(connection, size, now)
+
+        return self._write(connection, write)
+
+    def _write(self, connection: sqlite3.Connection, write):
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = write()
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def _flush_accessed(self, connection: sqlite3.Connection) -> None:
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        connection.executemany(
+            "UPDATE api_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in accessed.items()],
+        )
+
+    def _add_size(self, connection: sqlite3.Connection, delta: int) -> int:
+        connection.execute("UPDATE api_cache_size SET size = size + ? WHERE id = 0", (delta,))
+        return connection.execute("SELECT size FROM api_cache_size WHERE id = 0").fetchone()[0]
+
+    def _evict(self, connection: sqlite3.Connection, size: int, now: float) -> int:
+        if size <= self.max_size:
+            return 0
+
+        evicted, expired_size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM api_cache WHERE expires_at <= ?", (now,)
+        ).fetchone()
+        connection.execute("DELETE FROM api_cache WHERE expires_at <= ?", (now,))
+        size -= expired_size
+
+        # Borro las menos usadas hasta quedar por debajo del limite (el cursor solo lee las que hacen falta)
+        lru_keys = []
+        for key, entry_size in connection.execute("SELECT key, size FROM api_cache ORDER BY accessed_at"):
+            if size <= self.max_size:
+                break
+            lru_keys.append((key,))
+            size -= entry_size
+        connection.executemany("DELETE FROM api_cache WHERE key = ?", lru_keys)
+        connection.execute("UPDATE api_cache_size SET size = ? WHERE id = 0", (size,))
+        return evicted + len(lru_keys)
+
+    def clear(self) -> None:
+        connection = self._connection()
+        with self._accessed_lock:
+            self._accessed = {}
+
+        def write():
+            connection.execute("DELETE FROM api_cache")
+            connection.execute("UPDATE api_cache_size SET size = 0 WHERE id = 0")
+
+        self._write(connection, write)
+
+
+class DjangoCacheBackend(CacheBackend):
+    '''
+    Backend on one of Django's CACHES (memcached, redis...), which handles the expiry and eviction itself.
+    '''
+    def __init__(self, alias: str = "default", key_prefix: str = "riot-api:") -> None:
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def _key(self, key: str) -> str:
+        # memcached no acepta claves largas ni con espacios
+        return self.key_prefix + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        return self.cache.get(self._key(key))
+
+    def set(self, key: str, value: bytes, ttl: float = None) -> int:
+        self.cache.set(self._key(key), value, timeout=ttl)
+        return 0
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+def load_cache_backend(config: dict = None) -> CacheBackend:
+    '''
+    Builds the backend from a {"BACKEND": dotted path, "OPTIONS": kwargs} setting, or None if there is no setting.
+    '''
+    if not config:
+        return None
+    backend_class = import_string(config["BACKEND"])
+    return backend_class(**config.get("OPTIONS", {}))
+
+
+class SharedCache:
+    '''
+    Cache of JSON values shared between processes through a CacheBackend. Values are stored
+    zlib-compressed. Without a backend every lookup is a miss.
+    '''
+    def __init__(self, backend: CacheBackend = None) -> None:
+        self.backend = backend
+        self.stats = CacheStats()
+
+    def get(self, key: str):
+        if self.backend is None:
+            return MISSING
+        value = self.backend.get(key)
+        if value is None:
+            self.stats.add("misses")
+            return MISSING
+        self.stats.add("hits")
+        return json_codec.loads(zlib.decompress(value))
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        if self.backend is None:
+            return
+        evicted = self.backend.set(key, zlib.compress(json_codec.dumps(value)), ttl)
+        if evicted:
+            self.stats.add("evictions", evicted)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+        self.stats = CacheStats()
@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    '''
+    Stops calling an upstream service while it is unhealthy.
+
+    After failure_threshold consecutive failures the circuit opens and every call fails straight away
+    with CircuitOpenError. Once recovery_timeout seconds have passed, a single trial call is let through
+    (half-open): if it succeeds the circuit closes again, and if it fails it stays open for another
+    recovery_timeout.
+    '''
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        '''
+        Seconds until calls are let through again (0 if the circuit is closed).
+        '''
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(self.opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+
+    def before_call(self) -> None:
+        '''
+        Raises CircuitOpenError if the call must not be made.
+        '''
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() >= self.opened_at + self.recovery_timeout:
+                # Dejo pasar una llamada de prueba; el resto siguen fallando hasta saber como ha ido
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(f"Circuit open, retry in {max(self.opened_at + self.recovery_timeout - time.monotonic(), 0):.1f}s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
@@ -0,0 +1,394 @@
+'''
+Local fake of the Riot API endpoints used by the app, to test and benchmark without an API key
+or the real rate limits.
+
+    with FakeRiotServer(latency=0.05, app_limits=[(20, 1), (100, 120)]) as server:
+        server.api.add_summoner("Some Summoner", matches=30)
+        # settings.RIOT_API_BASE_URL = server.base_url
+
+The responses come from synthetic data (FakeRiotAPI) or from responses recorded from the real API
+(FixtureRiotAPI), which makes crawls and page loads reproducible offline. See also manage.py fake_riot.
+'''
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+import requests
+
+from .models import normalize_summoner_name
+
+
+CHAMPIONS = ["Ahri", "Garen", "Hecarim", "Jinx", "LeeSin", "Lux", "Thresh", "Yasuo", "Zed", "Ezreal"]
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+QUEUE_IDS = [420, 420, 440, 450]
+FIRST_GAME_END = 1700000000000
+SERVER_ERROR_CODES = (500, 502, 503, 504)
+RIOT_API_URL = "https://{region}.api.riotgames.com"
+
+# Metodo de la API de cada endpoint, para su rate limit: (prefijo de la ruta, sufijo, metodo)
+ENDPOINT_METHODS = [
+    ("lol/summoner/v4/summoners/by-name/", "", "summoner-v4.getBySummonerName"),
+    ("lol/league/v4/entries/by-summoner/", "", "league-v4.getLeagueEntriesForSummoner"),
+    ("lol/match/v5/matches/by-puuid/", "/ids", "match-v5.getMatchIdsByPUUID"),
+    ("lol/match/v5/matches/", "", "match-v5.getMatch"),
+]
+
+
+def endpoint_method(path: str) -> str:
+    for prefix, suffix, method in ENDPOINT_METHODS:
+        if path.startswith(prefix) and path.endswith(suffix):
+            return method
+    return path
+
+
+def not_found(message: str = "Data not found") -> tuple:
+    return 404, error_body(404, message)
+
+
+def error_body(status: int, message: str) -> dict:
+    return {"status": {"status_code": status, "message": message}}
+
+
+def match_payload(match_id: str, puuids: list, game_end_timestamp: int, queue_id: int = 420, seed: int = 0) -> dict:
+    '''
+    Builds a match/v5 payload for the given ten puuids with random (but reproducible) stats.
+    '''
+    rng = random.Random(f"{match_id}:{seed}")
+    game_duration = rng.randint(900, 2400)
+    participants = []
+
+    for index, puuid in enumerate(puuids):
+        team_id = 100 if index < 5 else 200
+        participants.append({
+            "puuid": puuid,
+            "summonerName": f"Player {puuid[:8]}",
+            "championName": rng.choice(CHAMPIONS),
+            "teamId": team_id,
+            "teamPosition": POSITIONS[index % 5] if queue_id != 450 else "",
+            "win": team_id == 100,
+            "kills": rng.randint(0, 15),
+            "deaths": rng.randint(0, 12),
+            "assists": rng.randint(0, 20),
+            "totalMinionsKilled": rng.randint(0, 250),
+            "neutralMinionsKilled": rng.randint(0, 60),
+            "visionScore": rng.randint(0, 60),
+            "summoner1Id": 4,
+            "summoner2Id": rng.choice([7, 11, 12, 14]),
+            **{f"item{slot}": rng.choice([0, 1001, 3006, 3031, 3071, 3089]) for slot in range(7)},
+            "champLevel": rng.randint(8, 18),
+            "goldEarned": rng.randint(5000, 18000),
+            "totalDamageDealtToChampions": rng.randint(3000, 45000),
+            "totalDamageTaken": rng.randint(5000, 40000),
+            "wardsPlaced": rng.randint(0, 30),
+            "wardsKilled": rng.randint(0, 10),
+        })
+
+    return {
+        "metadata": {"matchId": match_id, "participants": list(puuids)},
+        "info": {
+            "gameMode": "ARAM" if queue_id == 450 else "CLASSIC",
+            "gameDuration": game_duration,
+            "gameStartTimestamp": game_end_timestamp - game_duration * 1000,
+            "gameEndTimestamp": game_end_timestamp,
+            "queueId": queue_id,
+            "participants": participants,
+        },
+    }
+
+
+class FakeRiotAPI:
+    '''
+    In-memory synthetic data served by FakeRiotServer: summoners, their league entries and their matches.
+    '''
+    def __init__(self, region: str = "euw1") -> None:
+        self.region = region
+        self.summoners = {}
+        self.league_entries = {}
+        self.match_ids = {}
+        self.matches = {}
+        self._lock = threading.Lock()
+
+    def add_summoner(self, summoner_name: str, matches: int = 0) -> dict:
+        '''
+        Adds a summoner with a soloq entry and its most recent matches (newest first), and returns it.
+        '''
+        normalized_name = normalize_summoner_name(summoner_name)
+        puuid = f"puuid-{normalized_name}"
+        summoner = {
+            "id": f"id-{normalized_name}",
+            "accountId": f"account-{normalized_name}",
+            "puuid": puuid,
+            "name": summoner_name,
+            "profileIconId": len(normalized_name) % 30,
+            "summonerLevel": 30 + len(normalized_name),
+        }
+        # Ids estables entre ejecuciones (hash() cambia en cada proceso)
+        match_prefix = int(hashlib.sha256(puuid.encode()).hexdigest()[:8], 16) % 10 ** 6
+        match_ids = []
+        for index in range(matches):
+            match_id = f"{self.region.upper()}_{match_prefix:06d}{index:04d}"
+            puuids = [puuid] + [f"{puuid}-teammate-{index}-{slot}" for slot in range(9)]
+            game_end_timestamp = FIRST_GAME_END + index * 3600 * 1000
+            self.matches[match_id] = match_payload(match_id, puuids, game_end_timestamp, QUEUE_IDS[index % len(QUEUE_IDS)])
+            match_ids.insert(0, match_id)
+
+        with self._lock:
+            self.summoners[normalized_name] = summoner
+            self.league_entries[summoner["id"]] = [{
+                "queueType": "RANKED_SOLO_5x5", "tier": "GOLD", "rank": "II",
+                "leaguePoints": 50, "wins": 60, "losses": 40,
+            }]
+            self.match_ids[puuid] = match_ids
+        return summoner
+
+    def route(self, region: str, path: str, query: dict) -> tuple:
+        '''
+        Returns (status, payload) for a request path without the region prefix, e.g. "lol/league/v4/...".
+        '''
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+
+        if parts[:5] == ["lol", "summoner", "v4", "summoners", "by-name"] and len(parts) == 6:
+            summoner = self.summoners.get(normalize_summoner_name(parts[5]))
+            return (200, summoner) if summoner else not_found()
+
+        if parts[:5] == ["lol", "league", "v4", "entries", "by-summoner"] and len(parts) == 6:
+            return 200, self.league_entries.get(parts[5], [])
+
+        if parts[:5] == ["lol", "match", "v5", "matches", "by-puuid"] and len(parts) == 7 and parts[6] == "ids":
+            start_time = int(query.get("startTime", 0))
+            match_ids = [
+                match_id for match_id in self.match_ids.get(parts[5], [])
+                if self.matches[match_id]["info"]["gameStartTimestamp"] // 1000 >= start_time
+            ]
+            start = int(query.get("start", 0))
+            count = int(query.get("count", 20))
+            return 200, match_ids[start:start + count]
+
+        if parts[:4] == ["lol", "match", "v5", "matches"] and len(parts) == 5:
+            match = self.matches.get(parts[4])
+            return (200, match) if match else not_found()
+
+        return not_found("Unknown endpoint")
+
+
+class FixtureRiotAPI:
+    '''
+    Serves responses recorded from the real API, one JSON file per request in
+    <path>/<region>/<request path>/<query>.json.
+
+    With an upstream URL it records instead: every request is forwarded (with the api_key of the request)
+    and its response is saved, overwriting the previous recording. Only successful and 404 responses
+    are saved: a 429 or a 5xx is passed on, but never replaces a good recording.
+    '''
+    def __init__(self, path, upstream: str = None) -> None:
+        self.path = os.fspath(path)
+        self.upstream = upstream
+        self._session = requests.Session() if upstream else None
+
+    def _fixture_path(self, region: str, path: str, query: dict) -> str:
+        query = {key: value for key, value in query.items() if key != "api_key"}
+        # La clave de la API nunca se guarda; el resto de la query identifica la peticion
+        query_key = hashlib.sha256(urlencode(sorted(query.items())).encode()).hexdigest()[:16] if query else "index"
+        return os.path.join(self.path, region, *path.strip("/").split("/"), f"{query_key}.json")
+
+    def route(self, region: str, path: str, query: dict) -> tuple:
+        fixture_path = self._fixture_path(region, path, query)
+
+        if self.upstream:
+            response = self._session.get(f"{self.upstream.format(region=region)}/{path}", params=query, timeout=10)
+            status = response.status_code
+            try:
+                payload = response.json()
+            except ValueError:
+                # Los errores de un proxy o balanceador no siempre son JSON
+                payload = error_body(status, response.text[:200])
+            if 200 <= status < 300 or status == 404:
+                self._save(fixture_path, status, payload)
+            return status, payload
+
+        try:
+            with open(fixture_path, "rb") as fixture:
+                fixture = json.load(fixture)
+        except FileNotFoundError:
+            return not_found("No recorded response")
+        return fixture["status"], fixture["body"]
+
+    def _save(self, fixture_path: str, status: int, payload) -> None:
+        os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(fixture_path), suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump({"status": status, "body": payload}, tmp_file)
+        os.replace(tmp_path, fixture_path)
+
+
+class FakeRiotRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        # /<region>/lol/...: la region va en la ruta, asi un solo servidor sirve a todas
+        region, _, path = url.path.lstrip("/").partition("/")
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        server.count_request(region, path)
+
+        delay = server.request_delay()
+        if delay:
+            time.sleep(delay)
+
+        status, payload, headers = server.respond(region, path, query)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRiotServer(ThreadingHTTPServer):
+    '''
+    HTTP server for a FakeRiotAPI (or FixtureRiotAPI), run in a background thread.
+
+    - Every request waits `latency` seconds, plus a random jitter of up to `jitter` seconds.
+    - With app_limits / method_limits ([(requests, seconds)], as in the X-*-Rate-Limit headers) the
+      responses carry the rate limit headers of the real API, and requests over a limit get a 429 with
+      Retry-After. Method limits apply to each method of each region separately.
+    - error_rate is the probability of answering with a random 5xx, and fail_next() queues failures
+      for the next requests. With the same seed, the same requests fail.
+    '''
+    daemon_threads = True
+
+    def __init__(self, api=None, host: str = "127.0.0.1", port: int = 0, latency: float = 0, jitter: float = 0,
+                 app_limits: list = None, method_limits: list = None, error_rate: float = 0, seed: int = 0) -> None:
+        super().__init__((host, port), FakeRiotRequestHandler)
+        self.api = api or FakeRiotAPI()
+        self.latency = latency
+        self.jitter = jitter
+        self.app_limits = list(app_limits or [])
+        self.method_limits = list(method_limits or [])
+        self.error_rate = error_rate
+        self.requests = []
+        self.status_counts = Counter()
+        self._rng = random.Random(seed)
+        self._failures = deque()
+        self._request_logs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        '''
+        Value for the RIOT_API_BASE_URL setting.
+        '''
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{{region}}"
+
+    def count_request(self, region: str, path: str) -> None:
+        with self._lock:
+            self.requests.append((region, path))
+
+    def request_delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+
+    def fail_next(self, status: int, count: int = 1, retry_after: float = None) -> None:
+        '''
+        Answers the next `count` requests with `status` (a 429 with Retry-After if retry_after is given).
+        '''
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def respond(self, region: str, path: str, query: dict) -> tuple:
+        '''
+        Returns (status, payload, headers) of a request.
+        '''
+        failure = self._injected_failure()
+        if failure is not None:
+            status, retry_after = failure
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+            if status == 429:
+                headers["X-Rate-Limit-Type"] = "service"
+            self._count_status(status)
+            return status, error_body(status, "Injected failure"), headers
+
+        headers, retry_after, limit_type = self._rate_limit(region, endpoint_method(path))
+        if retry_after:
+            headers.update({"Retry-After": str(retry_after), "X-Rate-Limit-Type": limit_type})
+            self._count_status(429)
+            return 429, error_body(429, "Rate limit exceeded"), headers
+
+        status, payload = self.api.route(region, path, query)
+        self._count_status(status)
+        return status, payload, headers
+
+    def _count_status(self, status: int) -> None:
+        with self._lock:
+            self.status_counts[status] += 1
+
+    def _injected_failure(self) -> tuple:
+        with self._lock:
+            if self._failures:
+                return self._failures.popleft()
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return self._rng.choice(SERVER_ERROR_CODES), None
+        return None
+
+    def _rate_limit(self, region: str, method: str) -> tuple:
+        # Ventanas deslizantes como las de la API: devuelve (headers, segundos a esperar o 0, tipo de limite)
+        buckets = [("application", ("app", region), self.app_limits), ("method", ("method", region, method), self.method_limits)]
+        now = time.monotonic()
+
+        with self._lock:
+            retry_after, limit_type = 0, None
+            for bucket_type, key, limits in buckets:
+                log = self._request_logs.setdefault(key, deque())
+                longest_window = max((window for _, window in limits), default=0)
+                while log and log[0] <= now - longest_window:
+                    log.popleft()
+                for limit, window in limits:
+                    in_window = [timestamp for timestamp in log if timestamp > now - window]
+                    if len(in_window) >= limit:
+                        wait = math.ceil(in_window[-limit] + window - now)
+                        if wait > retry_after:
+                            retry_after, limit_type = max(wait, 1), bucket_type
+
+            if not retry_after:
+                for _, key, limits in buckets:
+                    if limits:
+                        self._request_logs[key].append(now)
+
+            headers = {}
+            for header, (_, key, limits) in zip(["X-App-Rate-Limit", "X-Method-Rate-Limit"], buckets):
+                if limits:
+                    log = self._request_logs[key]
+                    headers[header] = ",".join(f"{limit}:{window}" for limit, window in limits)
+                    headers[f"{header}-Count"] = ",".join(
+                        f"{sum(1 for timestamp in log if timestamp > now - window)}:{window}" for _, window in limits
+                    )
+        return headers, retry_after, limit_type
+
+    def start(self) -> "FakeRiotServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeRiotServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,153 @@
+import asyncio
+import random
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# (connect, read) en segundos
+DEFAULT_TIMEOUT = (3.05, 10)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+
+
+def backoff_delay(attempt: int) -> float:
+    '''
+    Exponential backoff with full jitter for the given retry attempt (0-based).
+    '''
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class ConnectionStats:
+    '''
+    Thread-safe counters of requests sent and new connections opened by the client.
+    '''
+    def __init__(self) -> None:
+        self.requests = 0
+        self.new_connections = 0
+        self._lock = threading.Lock()
+
+    def add_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def add_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+def _counting_pool(pool_class, stats: ConnectionStats):
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            stats.add_connection()
+            return super()._new_conn()
+    return CountingPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter whose connection pools count every new TCP (+TLS) connection they open.
+    '''
+    def __init__(self, stats: ConnectionStats, **kwargs) -> None:
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+
+class RiotHTTPClient:
+    '''
+    Pooled HTTP client for the Riot API.
+
+    The session keeps keep-alive connections open for each regional host (europe, euw1...),
+    so only the first requests to a host pay the TCP + TLS handshake. Responses are requested
+    gzip-compressed and every request has a connect/read timeout.
+    '''
+    def __init__(self, pool_maxsize: int = 10, pool_connections: int = 10, timeout: tuple = DEFAULT_TIMEOUT) -> None:
+        self.timeout = timeout
+        self._stats = ConnectionStats()
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+        adapter = CountingHTTPAdapter(
+            self._stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, params: dict = None) -> requests.Response:
+        self._stats.add_request()
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    def stats(self) -> dict:
+        '''
+        Returns the connection reuse statistics of the client.
+        '''
+        return self._stats.as_dict()
+
+
+class AsyncRiotHTTPClient:
+    '''
+    Asynchronous counterpart of RiotHTTPClient, on httpx.
+
+    An httpx client can't be shared between event loops, so there is one per running loop,
+    each one with its own pool of keep-alive connections. A client is closed when its loop
+    shuts down, so the loops that async_to_sync creates for each call don't leak connections.
+    '''
+    def __init__(self, max_connections: int = 10, timeout: tuple = DEFAULT_TIMEOUT) -> None:
+        connect_timeout, read_timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        # loop -> (cliente, generador que lo cierra con el loop)
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                headers={"Accept-Encoding": "gzip, deflate"},
+            )
+            closer = self._close_with_loop(client)
+            await closer.__anext__()
+            entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
+    async def _close_with_loop(self, client: httpx.AsyncClient):
+        # Generador asincrono que no termina: asyncio.run() y async_to_sync cierran los generadores pendientes
+        # de su loop (shutdown_asyncgens) antes de cerrarlo, y al cerrarse este cierra el cliente
+        try:
+            yield
+        finally:
+            self._clients.pop(asyncio.get_running_loop(), None)
+            await client.aclose()
+
+    async def get(self, url: str, params: dict = None) -> httpx.Response:
+        client = await self._client()
+        return await client.get(url, params=params)
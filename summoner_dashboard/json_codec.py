@@ -0,0 +1,28 @@
+'''
+JSON decoding and encoding of the Riot API responses and cached values: orjson when it is installed,
+which parses a match/v5 payload several times faster, and the standard json module otherwise.
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    '''
+    Decodes a JSON document from bytes or str.
+    '''
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value, sort_keys: bool = False) -> bytes:
+    '''
+    Encodes a value as compact UTF-8 JSON, with the keys of every object sorted if sort_keys is set.
+    '''
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+    return json.dumps(value, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False).encode()
@@ -0,0 +1,109 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+
+POLL_INTERVAL = 0.2
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _advisory_lock_id(key: str) -> int:
+    # pg_advisory_lock recibe un bigint: uso los 8 primeros bytes del hash de la clave
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def _local_lock(key: str) -> threading.Lock:
+    with _local_locks_guard:
+        return _local_locks.setdefault(key, threading.Lock())
+
+
+def _lock_functions(key: str):
+    '''
+    Returns (try_acquire, release) for the key: a PostgreSQL advisory lock, shared by every process,
+    or a process-local lock on databases without advisory locks (SQLite).
+    '''
+    if connection.vendor == "postgresql":
+        lock_id = _advisory_lock_id(key)
+
+        def try_acquire() -> bool:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+                return cursor.fetchone()[0]
+
+        def release() -> None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+        return try_acquire, release
+
+    lock = _local_lock(key)
+    return (lambda: lock.acquire(blocking=False)), lock.release
+
+
+@contextmanager
+def single_flight(key: str, wait: float = 0):
+    '''
+    Makes sure only one caller at a time does the work identified by key.
+
+    Yields True to the caller that got the lock, which must do the work. Any other caller
+    waits up to `wait` seconds for it to finish and gets False: the work was (or is being) done
+    by someone else, so it should read the stored result instead.
+
+        with single_flight(f"summoner:{puuid}", wait=10) as leader:
+            if leader:
+                refresh()
+        data = read_from_db()
+    '''
+    try_acquire, release = _lock_functions(key)
+
+    if try_acquire():
+        try:
+            yield True
+        finally:
+            release()
+        return
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        if try_acquire():
+            # El que tenia el lock ya ha terminado
+            release()
+            break
+
+    yield False
+
+
+@asynccontextmanager
+async def asingle_flight(key: str, wait: float = 0):
+    '''
+    Async version of single_flight(), with the same locks: sync and async callers of the same key
+    wait for each other. Waiting doesn't block the event loop.
+    '''
+    try_acquire, release = _lock_functions(key)
+    # Con PostgreSQL el lock es de la conexion: coger y soltar en el hilo de la conexion de la peticion
+    try_acquire, release = sync_to_async(try_acquire), sync_to_async(release)
+
+    if await try_acquire():
+        try:
+            yield True
+        finally:
+            await release()
+        return
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        if await try_acquire():
+            # El que tenia el lock ya ha terminado
+            await release()
+            break
+
+    yield False
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...fake_riot import RIOT_API_URL, FakeRiotAPI, FakeRiotServer, FixtureRiotAPI
+from ...rate_limiter import parse_rate_limit_header
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local fake of the Riot API, serving synthetic summoners or recorded responses. "
+        "Point RIOT_API_BASE_URL to the URL it prints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds every request waits.")
+        parser.add_argument("--jitter", type=float, default=0, help="Extra random latency, up to these seconds.")
+        parser.add_argument("--app-rate-limit", default="", help='Application rate limits, e.g. "20:1,100:120".')
+        parser.add_argument("--method-rate-limit", default="", help='Rate limits of each method, e.g. "2000:10".')
+        parser.add_argument("--error-rate", type=float, default=0, help="Probability of answering with a 5xx.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the latency jitter and the injected errors.")
+        parser.add_argument("--summoners", type=int, default=10, help='Synthetic summoners, named "Summoner <n>".')
+        parser.add_argument("--matches", type=int, default=100, help="Matches of each synthetic summoner.")
+        parser.add_argument("--fixtures", help="Serve the responses recorded in this directory instead.")
+        parser.add_argument(
+            "--record", action="store_true",
+            help="Forward the requests to the real API and record the responses in --fixtures.",
+        )
+
+    def handle(self, *args, **options):
+        if options["record"]:
+            if not options["fixtures"]:
+                raise CommandError("--record needs a --fixtures directory to record to.")
+            api = FixtureRiotAPI(options["fixtures"], upstream=RIOT_API_URL)
+            mode = f"recording to {options['fixtures']}"
+        elif options["fixtures"]:
+            api = FixtureRiotAPI(options["fixtures"])
+            mode = f"replaying {options['fixtures']}"
+        else:
+            api = FakeRiotAPI()
+            for index in range(options["summoners"]):
+                api.add_summoner(f"Summoner {index}", matches=options["matches"])
+            mode = f"{options['summoners']} synthetic summoners with {options['matches']} matches each"
+
+        server = FakeRiotServer(
+            api,
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            jitter=options["jitter"],
+            app_limits=parse_rate_limit_header(options["app_rate_limit"]),
+            method_limits=parse_rate_limit_header(options["method_rate_limit"]),
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        self.stdout.write(f"Fake Riot API ({mode}) listening, RIOT_API_BASE_URL = {server.base_url}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Responses: {dict(server.status_counts)}")
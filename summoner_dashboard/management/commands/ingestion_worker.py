@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...services.ingestion_queue import claim_ingestion_job, run_ingestion_job
+from ...utils import circuit_breaker
+
+
+class Command(BaseCommand):
+    help = "Runs the queued summoner ingestion jobs (match crawling and saving) in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the pending jobs and exit instead of polling.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Ingestion worker started.")
+
+        while True:
+            # Con el circuito abierto la API no esta respondiendo: no tiene sentido coger jobs
+            wait = circuit_breaker.retry_after()
+            if wait:
+                if options["once"]:
+                    break
+                time.sleep(wait)
+                continue
+            
+            job = claim_ingestion_job()
+
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running ingestion job for {job.summoner_name} (attempt {job.attempts}).")
+            run_ingestion_job(job, settings.API_KEY)
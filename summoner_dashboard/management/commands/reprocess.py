@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...match_archive import MatchArchive
+from ...models import SummonerModel
+from ...services.reprocess import REPROCESS_BATCH_SIZE, reprocess_archived_matches
+from ...services.summoner_data import REGION_DEFAULT
+
+
+class Command(BaseCommand):
+    help = "Extracts the stored match stats again from the archived match/v5 payloads, without calling the API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--summoner", help="Only reprocess the matches of this summoner.")
+        parser.add_argument("--region", default=REGION_DEFAULT, help="Region of --summoner.")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (one per CPU by default).")
+        parser.add_argument("--batch-size", type=int, default=REPROCESS_BATCH_SIZE, help="Matches saved per transaction.")
+        parser.add_argument("--archive-dir", help="Match archive directory (RIOT_MATCH_ARCHIVE_DIR by default).")
+
+    def handle(self, *args, **options):
+        archive_dir = options["archive_dir"] or getattr(settings, "RIOT_MATCH_ARCHIVE_DIR", None)
+        if not archive_dir:
+            raise CommandError("There is no match archive: set RIOT_MATCH_ARCHIVE_DIR or pass --archive-dir.")
+
+        puuid = None
+        if options["summoner"]:
+            summoner = SummonerModel.objects.by_name(options["summoner"]).filter(region=options["region"]).first()
+            if summoner is None:
+                raise CommandError(f"Summoner {options['summoner']} not found in the database.")
+            puuid = summoner.summoner_puuid
+
+        def progress(done: int, total: int) -> None:
+            self.stdout.write(f"{done}/{total} matches processed.")
+
+        reprocessed = reprocess_archived_matches(
+            MatchArchive(archive_dir),
+            puuid=puuid,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Reprocessed {reprocessed} matches."))
@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import os
+import tempfile
+
+from . import json_codec
+
+
+class MatchArchive:
+    '''
+    Content-addressed store of raw match/v5 payloads, gzip-compressed on disk.
+
+    Each payload is saved once, under the sha256 of its canonical JSON, in <path>/ab/cd/<digest>.json.gz.
+    The digest is stored with the match (MatchDetailModel.payload_digest), so the stats can be extracted
+    again later without calling the API.
+
+    Payloads are archived as they are downloaded, so both steps are cheap: orjson (when installed)
+    encodes the canonical JSON, and the default gzip level 1 compresses it about 4 times faster than
+    level 6 for files around 10% bigger.
+    '''
+    def __init__(self, path, compresslevel: int = 1) -> None:
+        self.path = os.fspath(path)
+        self.compresslevel = compresslevel
+
+    @staticmethod
+    def encode(payload: dict) -> bytes:
+        # JSON canonico: el mismo payload siempre da los mismos bytes, y por tanto el mismo digest. Sin orjson
+        # algunos floats se escriben de otra forma (9.7e-05 en vez de 0.000097): mismo contenido, otro fichero
+        return json_codec.dumps(payload, sort_keys=True)
+
+    def _file_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest[2:4], f"{digest}.json.gz")
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self._file_path(digest))
+
+    def put(self, payload: dict) -> str:
+        '''
+        Saves the payload if it isn't archived yet and returns its digest.
+        '''
+        data = self.encode(payload)
+        digest = hashlib.sha256(data).hexdigest()
+        file_path = self._file_path(digest)
+        if os.path.exists(file_path):
+            return digest
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Escribo en un temporal y lo renombro: otro proceso nunca ve un fichero a medias
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(gzip.compress(data, compresslevel=self.compresslevel, mtime=0))
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        '''
+        Returns the (uncompressed) JSON of an archived payload. Raises KeyError if it isn't archived.
+        '''
+        try:
+            with open(self._file_path(digest), "rb") as archived_file:
+                return gzip.decompress(archived_file.read())
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+    def get(self, digest: str) -> dict:
+        return json_codec.loads(self.get_bytes(digest))
+
+
+def load_match_archive(path=None) -> MatchArchive:
+    '''
+    Builds the archive for the RIOT_MATCH_ARCHIVE_DIR setting, or None if it isn't set.
+    '''
+    if not path:
+        return None
+    return MatchArchive(path)
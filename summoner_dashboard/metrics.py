@@ -0,0 +1,319 @@
+'''
+Metrics of the process in the Prometheus text format (served at /metrics), and the timings of the
+request being served, sent back in its Server-Timing header (see middleware.py).
+
+The metrics live in the memory of each process: with several workers, each one is scraped on its own.
+'''
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import threading
+import time
+
+
+# Segundos; los mismos que usa por defecto prometheus_client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metric(ABC):
+    '''
+    A metric with a value for each combination of its labels. Thread-safe.
+    '''
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list:
+        '''
+        Returns [(sample name, labels, value)] of every combination of labels seen.
+        '''
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [
+                (f"{self.name}_total", dict(zip(self.labelnames, key)), value)
+                for key, value in self._values.items()
+            ]
+
+
+class Histogram(Metric):
+    '''
+    Distribution of observed values (durations in seconds) over the upper bounds of buckets.
+    '''
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(set(buckets) | {float("inf")}))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # [contador de cada bucket (no acumulado), suma, total]
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[0][index] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            return counts[2] if counts else 0
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, (bucket_counts, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(upper_bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    '''
+    The metrics of the process, plus collectors: functions called on every scrape that return
+    [(name, type, documentation, [(labels, value)])], for values kept elsewhere (cache stats, rate limits).
+    Counter names go without the _total suffix, which is added to their samples.
+    '''
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def clear(self) -> None:
+        '''
+        Resets the value of every metric (for tests).
+        '''
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        '''
+        Returns every metric in the Prometheus text exposition format.
+        '''
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [
+            (metric.name, metric.type, metric.documentation, metric.samples())
+            for metric in metrics
+        ]
+        for collector in collectors:
+            families += [
+                (name, metric_type, documentation, [
+                    (f"{name}_total" if metric_type == "counter" else name, labels, value) for labels, value in values
+                ])
+                for name, metric_type, documentation, values in collector()
+            ]
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines += [
+                f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+                for sample_name, labels, value in samples
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("whgg_http_requests", "Requests served, by view and status code.", ("view", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram("whgg_http_request_seconds", "Time to serve a request, by view.", ("view",))
+TEMPLATE_RENDER_SECONDS = registry.histogram("whgg_template_render_seconds", "Time to render a template.", ("template",))
+DB_QUERY_SECONDS = registry.histogram(
+    "whgg_db_query_seconds", "Time of each database query.", ("alias",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+SERVICE_CALL_SECONDS = registry.histogram(
+    "whgg_service_call_seconds", "Time of the DatabaseHandler and MatchStats methods.", ("method",)
+)
+RIOT_API_REQUESTS = registry.counter(
+    "whgg_riot_api_requests", 'Requests sent to the Riot API, by method and status code ("error": no response).',
+    ("method", "status"),
+)
+RIOT_API_REQUEST_SECONDS = registry.histogram(
+    "whgg_riot_api_request_seconds", "Time waiting for the response of the Riot API.", ("method",)
+)
+RIOT_API_RATE_LIMITED = registry.counter(
+    "whgg_riot_api_rate_limited", "429 responses of the Riot API, by method and X-Rate-Limit-Type.", ("method", "type")
+)
+RIOT_API_THROTTLE_SECONDS = registry.histogram(
+    "whgg_riot_api_throttle_seconds", "Time waiting for the rate limiter before sending a request.", ("method",)
+)
+
+
+class RequestTimings:
+    '''
+    Time spent by the request being served in each phase ("db", "riot", "render"...), for its Server-Timing header.
+    Thread-safe: the matches of a request are fetched from several threads.
+    '''
+    def __init__(self) -> None:
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            total, count = self._timings.get(name, (0.0, 0))
+            self._timings[name] = (total + seconds, count + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self._timings)
+
+    def header(self) -> str:
+        '''
+        Returns the Server-Timing header value: duration in milliseconds and number of calls of each phase.
+        '''
+        return ", ".join(
+            f'{name};dur={total * 1000:.1f};desc="{count} calls"'
+            for name, (total, count) in self.as_dict().items()
+        )
+
+
+# Tiempos de la peticion en curso (None fuera de una peticion); las tareas y sync_to_async heredan el contexto
+current_timings = ContextVar("current_timings", default=None)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def timed(histogram: Histogram, timing: str = None, **labels):
+    '''
+    Observes the duration of the block in the histogram and, if a timing name is given, adds it to
+    the Server-Timing of the current request.
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        if timing is not None:
+            record_timing(timing, elapsed)
+
+
+def instrumented(method):
+    '''
+    Decorator that times every call of a service method in whgg_service_call_seconds.
+    '''
+    label = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with timed(SERVICE_CALL_SECONDS, method=label):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def time_query(execute, sql, params, many, context):
+    '''
+    Database execute wrapper (see apps.py) that times every query.
+    '''
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        DB_QUERY_SECONDS.observe(elapsed, alias=context["connection"].alias)
+        record_timing("db", elapsed)
+
+
+def install_query_timer(sender, connection, **kwargs) -> None:
+    '''
+    Receiver of connection_created: times the queries of every database connection.
+    '''
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def record_api_response(method: str, status, seconds: float, headers=None) -> None:
+    '''
+    Records a request to the Riot API: its status code ("error" if there was no response) and how long it took.
+    '''
+    method = method or "unknown"
+    RIOT_API_REQUESTS.inc(method=method, status=status)
+    RIOT_API_REQUEST_SECONDS.observe(seconds, method=method)
+    record_timing("riot", seconds)
+    if status == 429:
+        RIOT_API_RATE_LIMITED.inc(method=method, type=(headers or {}).get("X-Rate-Limit-Type", "unknown"))
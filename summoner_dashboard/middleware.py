@@ -0,0 +1,46 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    '''
+    Times every request: observes it in whgg_http_request_seconds and sends back where the time went
+    (database, Riot API, rate limiter, template) in the Server-Timing header.
+    '''
+    def finish(request, response, timings: metrics.RequestTimings, start: float):
+        elapsed = time.perf_counter() - start
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        metrics.HTTP_REQUESTS.inc(view=view, status=response.status_code)
+        metrics.HTTP_REQUEST_SECONDS.observe(elapsed, view=view)
+
+        timings.add("total", elapsed)
+        response["Server-Timing"] = timings.header()
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = metrics.RequestTimings()
+            token = metrics.current_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.current_timings.reset(token)
+            return finish(request, response, timings, start)
+    else:
+        def middleware(request):
+            timings = metrics.RequestTimings()
+            token = metrics.current_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.current_timings.reset(token)
+            return finish(request, response, timings, start)
+
+    return middleware
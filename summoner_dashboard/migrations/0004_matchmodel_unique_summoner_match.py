@@ -0,0 +1,26 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:35
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_matches(apps, schema_editor):
+    # Las actualizaciones solapadas pudieron guardar la misma partida varias veces; me quedo con la primera
+    MatchModel = apps.get_model('summoner_dashboard', 'MatchModel')
+    keep_ids = MatchModel.objects.values('summoner', 'match_id').annotate(keep_id=Min('id')).values('keep_id')
+    MatchModel.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0003_alter_summonermodel_profile_icon_id_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_matches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='matchmodel',
+            constraint=models.UniqueConstraint(fields=('summoner', 'match_id'), name='unique_summoner_match'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:36
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def rebuild_champion_stats(apps, schema_editor):
+    # Recalculo una sola vez las estadisticas (y sus totales) desde las partidas de soloq y flex guardadas
+    ChampionStatsModel = apps.get_model('summoner_dashboard', 'ChampionStatsModel')
+    MatchModel = apps.get_model('summoner_dashboard', 'MatchModel')
+
+    aggregates = MatchModel.objects.filter(queue_id__in=[420, 440]).values('summoner', 'champion_name').annotate(
+        matches_played=Count('id'),
+        wins=Sum('win'),
+        total_kills=Sum('kills'),
+        total_deaths=Sum('deaths'),
+        total_assists=Sum('assists'),
+        total_cs=Sum('cs'),
+    )
+
+    champion_stats = []
+    for row in aggregates:
+        played = row['matches_played']
+        champion_stats.append(ChampionStatsModel(
+            summoner_id=row['summoner'],
+            champion_name=row['champion_name'],
+            matches_played=played,
+            wins=row['wins'],
+            losses=played - row['wins'],
+            wr=row['wins'] * 100.0 / played,
+            kda=(row['total_kills'] + row['total_assists']) / (row['total_deaths'] + 0.001),
+            kills=round(row['total_kills'] / played),
+            deaths=round(row['total_deaths'] / played),
+            assists=round(row['total_assists'] / played),
+            cs=round(row['total_cs'] / played),
+            total_kills=row['total_kills'],
+            total_deaths=row['total_deaths'],
+            total_assists=row['total_assists'],
+            total_cs=row['total_cs'],
+        ))
+
+    ChampionStatsModel.objects.all().delete()
+    ChampionStatsModel.objects.bulk_create(champion_stats, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0004_matchmodel_unique_summoner_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='championstatsmodel',
+            name='total_assists',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='championstatsmodel',
+            name='total_cs',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='championstatsmodel',
+            name='total_deaths',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='championstatsmodel',
+            name='total_kills',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_champion_stats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='championstatsmodel',
+            constraint=models.UniqueConstraint(fields=('summoner', 'champion_name'), name='unique_summoner_champion'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0005_championstats_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchmodel',
+            name='game_end_timestamp',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='summonermodel',
+            name='last_match_end_timestamp',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='summonermodel',
+            name='last_match_id',
+            field=models.CharField(max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0006_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJobModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summoner_puuid', models.CharField(max_length=200, unique=True)),
+                ('summoner_name', models.CharField(max_length=200)),
+                ('region', models.CharField(max_length=200)),
+                ('priority', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=3)),
+                ('run_after', models.DateTimeField()),
+                ('matches_total', models.IntegerField(default=0)),
+                ('matches_done', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-priority', 'run_after'], name='ingestion_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0007_ingestion_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchDetailModel',
+            fields=[
+                ('match_id', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('game_mode', models.CharField(max_length=200)),
+                ('game_duration', models.IntegerField()),
+                ('queue_id', models.IntegerField()),
+                ('game_end_timestamp', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ParticipantModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puuid', models.CharField(db_index=True, max_length=200)),
+                ('participant_index', models.IntegerField()),
+                ('summoner_name', models.CharField(max_length=200)),
+                ('champion_name', models.CharField(max_length=200)),
+                ('team_id', models.IntegerField()),
+                ('team_position', models.CharField(max_length=200)),
+                ('win', models.IntegerField()),
+                ('kills', models.IntegerField()),
+                ('deaths', models.IntegerField()),
+                ('assists', models.IntegerField()),
+                ('kda', models.FloatField()),
+                ('cs', models.IntegerField()),
+                ('vision', models.IntegerField()),
+                ('summoner_spell1', models.IntegerField()),
+                ('summoner_spell2', models.IntegerField()),
+                ('item0', models.IntegerField()),
+                ('item1', models.IntegerField()),
+                ('item2', models.IntegerField()),
+                ('item3', models.IntegerField()),
+                ('item4', models.IntegerField()),
+                ('item5', models.IntegerField()),
+                ('item6', models.IntegerField()),
+                ('champion_level', models.IntegerField()),
+                ('gold_earned', models.IntegerField()),
+                ('damage_dealt_to_champions', models.IntegerField()),
+                ('damage_taken', models.IntegerField()),
+                ('wards_placed', models.IntegerField()),
+                ('wards_killed', models.IntegerField()),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='summoner_dashboard.matchdetailmodel')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='participantmodel',
+            constraint=models.UniqueConstraint(fields=('match', 'puuid'), name='unique_match_participant'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0008_match_detail_participants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchmodel',
+            index=models.Index(fields=['summoner', '-game_end_timestamp', '-match_id'], name='match_summoner_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:44
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0009_match_recent_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='championstatsmodel',
+            index=models.Index(fields=['summoner', '-matches_played', '-wr', '-kda'], name='champion_stats_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchmodel',
+            index=models.Index(fields=['summoner', 'team_position'], name='match_summoner_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchmodel',
+            index=models.Index(fields=['summoner', 'queue_id', 'champion_name'], name='match_summoner_champion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='summonermodel',
+            index=models.Index(django.db.models.functions.text.Upper('summoner_name'), name='summoner_name_upper_idx'),
+        ),
+    ]
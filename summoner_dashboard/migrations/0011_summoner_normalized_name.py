@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+def fill_normalized_names(apps, schema_editor):
+    # Mismo criterio que models.normalize_summoner_name (el modelo historico no tiene el save() que lo rellena)
+    SummonerModel = apps.get_model('summoner_dashboard', 'SummonerModel')
+
+    summoners = list(SummonerModel.objects.only('summoner_puuid', 'summoner_name'))
+    for summoner in summoners:
+        summoner.normalized_name = "".join(summoner.summoner_name.split()).lower()
+    SummonerModel.objects.bulk_update(summoners, ['normalized_name'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0010_page_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='summonermodel',
+            name='summoner_name_upper_idx',
+        ),
+        migrations.AddField(
+            model_name='summonermodel',
+            name='normalized_name',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='summonermodel',
+            index=models.Index(fields=['normalized_name', 'region'], name='summoner_name_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0011_summoner_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchdetailmodel',
+            name='payload_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+def fill_heartbeats(apps, schema_editor):
+    # Los jobs en running se reclaman por heartbeat: parten de su started_at
+    IngestionJobModel = apps.get_model('summoner_dashboard', 'IngestionJobModel')
+    IngestionJobModel.objects.filter(heartbeat_at__isnull=True).update(heartbeat_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0012_match_payload_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjobmodel',
+            name='heartbeat_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_heartbeats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:22
+
+from django.db import migrations, models
+import django.db.models.functions.text
+import summoner_dashboard.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0013_ingestion_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='summonermodel',
+            name='summoner_name_idx',
+        ),
+        migrations.RemoveField(
+            model_name='summonermodel',
+            name='normalized_name',
+        ),
+        migrations.AddIndex(
+            model_name='summonermodel',
+            index=models.Index(django.db.models.functions.text.Lower(summoner_dashboard.models.RemoveSpaces('summoner_name')), models.F('region'), name='summoner_name_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_game_end_timestamps(apps, schema_editor):
+    # Las partidas guardadas antes de 0006 tienen game_end_timestamp = 0, y con ellas el cursor de sincronizacion;
+    # la fecha se toma de los detalles de la partida cuando estan guardados
+    MatchModel = apps.get_model('summoner_dashboard', 'MatchModel')
+    MatchDetailModel = apps.get_model('summoner_dashboard', 'MatchDetailModel')
+    SummonerModel = apps.get_model('summoner_dashboard', 'SummonerModel')
+
+    MatchModel.objects.filter(game_end_timestamp=0).update(game_end_timestamp=Coalesce(
+        Subquery(MatchDetailModel.objects.filter(match_id=OuterRef('match_id')).values('game_end_timestamp')[:1]), 0
+    ))
+    SummonerModel.objects.filter(last_match_end_timestamp=0, last_match_id__isnull=False).update(
+        last_match_end_timestamp=Coalesce(Subquery(
+            MatchModel.objects.filter(
+                summoner=OuterRef('pk'), match_id=OuterRef('last_match_id')
+            ).values('game_end_timestamp')[:1]
+        ), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0014_summoner_name_expression_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_game_end_timestamps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:59
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def clear_stored_participant_lists(apps, schema_editor):
+    # Las partidas con participantes en ParticipantModel ya no necesitan las listas JSON
+    MatchModel = apps.get_model('summoner_dashboard', 'MatchModel')
+    ParticipantModel = apps.get_model('summoner_dashboard', 'ParticipantModel')
+
+    MatchModel.objects.filter(
+        Exists(ParticipantModel.objects.filter(match_id=OuterRef('match_id')))
+    ).update(participant_summoner_names=None, participant_champion_names=None, participant_team_ids=None)
+
+
+def restore_participant_lists(apps, schema_editor):
+    # Al deshacer la migracion las columnas vuelven a ser NOT NULL: se llenan otra vez desde ParticipantModel
+    MatchModel = apps.get_model('summoner_dashboard', 'MatchModel')
+    ParticipantModel = apps.get_model('summoner_dashboard', 'ParticipantModel')
+
+    for match in MatchModel.objects.filter(participant_champion_names__isnull=True).only('id', 'match_id').iterator():
+        participants = list(ParticipantModel.objects.filter(match_id=match.match_id).order_by(
+            'participant_index'
+        ).values_list('summoner_name', 'champion_name', 'team_id'))
+        MatchModel.objects.filter(pk=match.pk).update(
+            participant_summoner_names=[participant[0] for participant in participants],
+            participant_champion_names=[participant[1] for participant in participants],
+            participant_team_ids=[participant[2] for participant in participants],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('summoner_dashboard', '0015_backfill_game_end_timestamps'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='matchmodel',
+            name='participant_champion_names',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='matchmodel',
+            name='participant_summoner_names',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='matchmodel',
+            name='participant_team_ids',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(clear_stored_participant_lists, restore_participant_lists),
+    ]
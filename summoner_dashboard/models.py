@@ -1,4 +1,35 @@
 from django.db import models
+from django.db.models.functions import Lower
+
+
+def normalize_summoner_name(summoner_name: str) -> str:
+    # Riot no distingue mayusculas ni espacios en los nombres de summoner
+    return "".join(summoner_name.split()).lower()
+
+
+class RemoveSpaces(models.Func):
+    # Los literales van en la plantilla y no como parametros: asi la consulta coincide con la expresion del indice
+    template = "REPLACE(%(expressions)s, ' ', '')"
+    output_field = models.CharField()
+
+
+def normalized_name_expression(summoner_name) -> Lower:
+    # Misma normalizacion calculada por la base de datos: no depende de que cada escritura (save(), bulk_create,
+    # update()) rellene un campo aparte, y la columna y el nombre buscado se normalizan con el mismo Lower()
+    return Lower(RemoveSpaces(summoner_name))
+
+
+class SummonerQuerySet(models.QuerySet):
+    def by_name(self, summoner_name: str) -> models.QuerySet:
+        '''
+        Filters by summoner name ignoring case and whitespace, using the summoner_name_idx index.
+        '''
+        # Los espacios que no son " " se quitan aqui (los nombres de Riot no los tienen)
+        summoner_name = "".join(summoner_name.split())
+        return self.alias(normalized_name=normalized_name_expression("summoner_name")).filter(
+            normalized_name=normalized_name_expression(models.Value(summoner_name))
+        )
+
 
 class SummonerModel(models.Model):
     summoner_puuid = models.CharField(max_length=200, primary_key=True, unique=True)
@@ -18,6 +49,16 @@ class SummonerModel(models.Model):
     flex_wr = models.IntegerField(default=0)
     profile_icon_id = models.IntegerField(null=True)
     summoner_level = models.IntegerField(null=True)
+    # Cursor de sincronizacion: ultima partida guardada y su gameEndTimestamp (ms)
+    last_match_id = models.CharField(max_length=200, null=True)
+    last_match_end_timestamp = models.BigIntegerField(null=True)
+
+    objects = SummonerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(normalized_name_expression('summoner_name'), 'region', name='summoner_name_idx'),
+        ]
 
 
 class ChampionStatsModel(models.Model):
@@ -32,6 +73,20 @@ class ChampionStatsModel(models.Model):
     deaths = models.IntegerField()
     assists = models.IntegerField()
     cs = models.IntegerField()
+    # Totales acumulados para poder aplicar las partidas nuevas sin recalcular todo el historial
+    total_kills = models.IntegerField(default=0)
+    total_deaths = models.IntegerField(default=0)
+    total_assists = models.IntegerField(default=0)
+    total_cs = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['summoner', 'champion_name'], name='unique_summoner_champion'),
+        ]
+        indexes = [
+            # Orden de top_champions_data
+            models.Index(fields=['summoner', '-matches_played', '-wr', '-kda'], name='champion_stats_top_idx'),
+        ]
 
 
 class MatchModel(models.Model):
@@ -54,10 +109,107 @@ class MatchModel(models.Model):
     item4 = models.IntegerField()
     item5 = models.IntegerField()
     item6 = models.IntegerField()
-    participant_summoner_names = models.JSONField()
-    participant_champion_names = models.JSONField()
-    participant_team_ids = models.JSONField()
+    # Solo las partidas guardadas antes de ParticipantModel (0008) los tienen: las demas leen sus participantes de ahi
+    participant_summoner_names = models.JSONField(null=True)
+    participant_champion_names = models.JSONField(null=True)
+    participant_team_ids = models.JSONField(null=True)
     game_mode = models.CharField(max_length=200)
     game_duration = models.IntegerField()
     queue_id = models.IntegerField()
-    team_position = models.CharField(max_length=200)
\ No newline at end of file
+    team_position = models.CharField(max_length=200)
+    game_end_timestamp = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Tambien sirve de indice (summoner, match_id) para buscar las partidas ya guardadas
+            models.UniqueConstraint(fields=['summoner', 'match_id'], name='unique_summoner_match'),
+        ]
+        indexes = [
+            models.Index(fields=['summoner', '-game_end_timestamp', '-match_id'], name='match_summoner_recent_idx'),
+            models.Index(fields=['summoner', 'team_position'], name='match_summoner_role_idx'),
+            models.Index(fields=['summoner', 'queue_id', 'champion_name'], name='match_summoner_champion_idx'),
+        ]
+
+
+
+# Una fila por partida descargada, compartida por los diez jugadores que la jugaron
+class MatchDetailModel(models.Model):
+    match_id = models.CharField(max_length=200, primary_key=True)
+    game_mode = models.CharField(max_length=200)
+    game_duration = models.IntegerField()
+    queue_id = models.IntegerField()
+    game_end_timestamp = models.BigIntegerField(default=0)
+    # sha256 del payload de match/v5 en el archivo de partidas (vacio si no se archivo)
+    payload_digest = models.CharField(max_length=64, blank=True, default='')
+
+
+# Estadisticas de cada uno de los jugadores de una partida, sacadas del mismo payload de match/v5
+class ParticipantModel(models.Model):
+    match = models.ForeignKey(MatchDetailModel, on_delete=models.CASCADE, related_name='participants')
+    puuid = models.CharField(max_length=200, db_index=True)
+    participant_index = models.IntegerField()
+    summoner_name = models.CharField(max_length=200)
+    champion_name = models.CharField(max_length=200)
+    team_id = models.IntegerField()
+    team_position = models.CharField(max_length=200)
+    win = models.IntegerField()
+    kills = models.IntegerField()
+    deaths = models.IntegerField()
+    assists = models.IntegerField()
+    kda = models.FloatField()
+    cs = models.IntegerField()
+    vision = models.IntegerField()
+    summoner_spell1 = models.IntegerField()
+    summoner_spell2 = models.IntegerField()
+    item0 = models.IntegerField()
+    item1 = models.IntegerField()
+    item2 = models.IntegerField()
+    item3 = models.IntegerField()
+    item4 = models.IntegerField()
+    item5 = models.IntegerField()
+    item6 = models.IntegerField()
+    champion_level = models.IntegerField()
+    gold_earned = models.IntegerField()
+    damage_dealt_to_champions = models.IntegerField()
+    damage_taken = models.IntegerField()
+    wards_placed = models.IntegerField()
+    wards_killed = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'puuid'], name='unique_match_participant'),
+        ]
+
+class IngestionJobModel(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Un solo job por summoner: al volver a encolarlo se reutiliza la fila
+    summoner_puuid = models.CharField(max_length=200, unique=True)
+    summoner_name = models.CharField(max_length=200)
+    region = models.CharField(max_length=200)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField()
+    matches_total = models.IntegerField(default=0)
+    matches_done = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True) # El worker lo actualiza mientras avanza; si deja de hacerlo el job se reclama
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='ingestion_job_queue_idx'),
+        ]
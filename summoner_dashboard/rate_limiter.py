@@ -0,0 +1,314 @@
+from abc import ABC, abstractmethod
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.utils.module_loading import import_string
+
+
+# Margen extra por ventana para absorber la diferencia entre nuestro reloj y el de Riot
+WINDOW_MARGIN = 0.05
+
+
+def parse_rate_limit_header(value: str) -> list:
+    '''
+    Parses a Riot rate limit header such as "20:1,100:120" into [(20, 1), (100, 120)].
+    '''
+    limits = []
+    for part in value.split(","):
+        try:
+            limit, window = part.strip().split(":")
+            limits.append((int(limit), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+
+class RateLimitBackend(ABC):
+    '''
+    Storage for the rate limiter state. Every worker that uses the same backend draws from the same budget.
+
+    Buckets are (key, limit, window) tuples, key being a string that identifies the bucket window.
+    '''
+    @abstractmethod
+    def try_acquire(self, scope: str, buckets: list, now: float) -> float:
+        '''
+        Atomically records a request in every bucket if all of them have room and the scope is not penalized.
+        Returns 0 if the request was recorded, or the seconds to wait before trying again.
+        '''
+
+    @abstractmethod
+    def penalize(self, scope: str, until: float) -> None:
+        '''
+        Blocks every request to the scope until the given timestamp.
+        '''
+
+
+class LocalBackend(RateLimitBackend):
+    '''
+    In-memory backend, only shared between the threads of one process.
+    '''
+    def __init__(self) -> None:
+        self._requests = {}
+        self._penalties = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, scope: str, buckets: list, now: float) -> float:
+        with self._lock:
+            wait = self._penalties.get(scope, 0) - now
+
+            for key, limit, window in buckets:
+                timestamps = self._requests.setdefault(key, deque())
+
+                # Descarto las peticiones que ya han salido de la ventana
+                while timestamps and timestamps[0] <= now - window - WINDOW_MARGIN:
+                    timestamps.popleft()
+
+                if len(timestamps) >= limit:
+                    wait = max(wait, timestamps[len(timestamps) - limit] + window + WINDOW_MARGIN - now)
+
+            if wait > 0:
+                return wait
+
+            for key, limit, window in buckets:
+                self._requests[key].append(now)
+            return 0
+
+    def penalize(self, scope: str, until: float) -> None:
+        with self._lock:
+            self._penalties[scope] = max(self._penalties.get(scope, 0), until)
+
+
+class SQLiteBackend(RateLimitBackend):
+    '''
+    Backend stored in a SQLite file, shared by every process on the same machine (e.g. gunicorn workers).
+
+    Each acquire runs inside a BEGIN IMMEDIATE transaction, which takes SQLite's file lock,
+    so checking and recording a request is atomic across processes.
+    '''
+    def __init__(self, path: str, timeout: float = 30) -> None:
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_requests (bucket TEXT NOT NULL, ts REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS rate_limit_requests_bucket_ts ON rate_limit_requests (bucket, ts)")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_penalties (scope TEXT PRIMARY KEY, until REAL NOT NULL)")
+            self._local.connection = connection
+        return connection
+
+    def try_acquire(self, scope: str, buckets: list, now: float) -> float:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT until FROM rate_limit_penalties WHERE scope = ?", (scope,)).fetchone()
+            wait = row[0] - now if row else 0
+
+            for key, limit, window in buckets:
+                connection.execute(
+                    "DELETE FROM rate_limit_requests WHERE bucket = ? AND ts <= ?",
+                    (key, now - window - WINDOW_MARGIN),
+                )
+                # Timestamp de la peticion que tiene que salir de la ventana para que quepa una mas
+                row = connection.execute(
+                    "SELECT ts FROM rate_limit_requests WHERE bucket = ? ORDER BY ts DESC LIMIT 1 OFFSET ?",
+                    (key, limit - 1),
+                ).fetchone()
+                if row:
+                    wait = max(wait, row[0] + window + WINDOW_MARGIN - now)
+
+            if wait <= 0:
+                connection.executemany(
+                    "INSERT INTO rate_limit_requests (bucket, ts) VALUES (?, ?)",
+                    [(key, now) for key, limit, window in buckets],
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        return max(wait, 0)
+
+    def penalize(self, scope: str, until: float) -> None:
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO rate_limit_penalties (scope, until) VALUES (?, ?) "
+            "ON CONFLICT(scope) DO UPDATE SET until = MAX(until, excluded.until)",
+            (scope, until),
+        )
+
+
+class RedisBackend(RateLimitBackend):
+    '''
+    Backend for a Redis-like store, shared by every process that can reach it.
+
+    The client only needs eval(), as in redis-py. The check and the record of a request run in one
+    Lua script, so they are atomic in the server, and so does a penalty, which never shortens a longer one.
+    '''
+    ACQUIRE_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local wait = tonumber(redis.call('GET', KEYS[1]) or 0) - now
+        for i = 2, #KEYS do
+            local limit = tonumber(ARGV[2 * i])
+            local window = tonumber(ARGV[2 * i + 1])
+            redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window - tonumber(ARGV[3]))
+            local count = redis.call('ZCARD', KEYS[i])
+            if count >= limit then
+                local oldest = redis.call('ZRANGE', KEYS[i], count - limit, count - limit, 'WITHSCORES')
+                wait = math.max(wait, tonumber(oldest[2]) + window + tonumber(ARGV[3]) - now)
+            end
+        end
+        if wait > 0 then
+            return tostring(wait)
+        end
+        for i = 2, #KEYS do
+            redis.call('ZADD', KEYS[i], now, ARGV[2])
+            redis.call('EXPIRE', KEYS[i], math.ceil(tonumber(ARGV[2 * i + 1])) + 1)
+        end
+        return '0'
+    """
+    PENALIZE_SCRIPT = """
+        if tonumber(ARGV[1]) > tonumber(redis.call('GET', KEYS[1]) or 0) then
+            redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+        end
+        return 0
+    """
+
+    def __init__(self, client=None, url: str = None, prefix: str = "whgg:ratelimit:") -> None:
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def try_acquire(self, scope: str, buckets: list, now: float) -> float:
+        keys = [f"{self.prefix}penalty:{scope}"] + [f"{self.prefix}{key}" for key, limit, window in buckets]
+        # ARGV: now, miembro unico, margen de ventana y despues limit, window de cada bucket (KEYS[i] -> ARGV[2i], ARGV[2i+1])
+        args = [now, uuid.uuid4().hex, WINDOW_MARGIN]
+        for key, limit, window in buckets:
+            args += [limit, window]
+        return max(float(self.client.eval(self.ACQUIRE_SCRIPT, len(keys), *keys, *args)), 0)
+
+    def penalize(self, scope: str, until: float) -> None:
+        # Como en los otros backends se queda la penalizacion mas larga: un Retry-After corto no acorta otro largo
+        ttl = max(int((until - time.time()) * 1000), 1)
+        self.client.eval(self.PENALIZE_SCRIPT, 1, f"{self.prefix}penalty:{scope}", until, ttl)
+
+
+def load_backend(config: dict = None) -> RateLimitBackend:
+    '''
+    Builds the backend from a {"BACKEND": dotted path, "OPTIONS": kwargs} setting. Defaults to LocalBackend.
+    '''
+    if not config:
+        return LocalBackend()
+    backend_class = import_string(config["BACKEND"])
+    return backend_class(**config.get("OPTIONS", {}))
+
+
+class RateLimiter:
+    '''
+    Enforces every rate limit window of the Riot API at the same time.
+
+    Each routing value ("europe") and platform ("euw1") has its own application bucket, and
+    every method has its own bucket inside them, as the API counts them separately. Every bucket keeps
+    the timestamps of its requests for each window (sliding log), so a request is only sent once
+    all the windows it belongs to have room for it.
+
+    The limits start from the defaults given and are replaced by the real ones as soon as
+    the X-App-Rate-Limit / X-Method-Rate-Limit headers are received. The request log and the
+    429 penalties live in the backend, so workers sharing a backend share one budget.
+    '''
+    def __init__(self, app_limits: list, method_limits: list = None, backend: RateLimitBackend = None) -> None:
+        self.default_app_limits = list(app_limits)
+        self.default_method_limits = list(method_limits or [])
+        self.backend = backend or LocalBackend()
+        self._app_limits = {}
+        self._method_limits = {}
+        self._remaining = {}
+        self._lock = threading.Lock()
+
+    def _buckets(self, region: str, method: str) -> list:
+        with self._lock:
+            buckets = [
+                (f"app:{region}:{window}", limit, window)
+                for limit, window in self._app_limits.get(region, self.default_app_limits)
+            ]
+            if method is not None:
+                buckets += [
+                    (f"method:{region}:{method}:{window}", limit, window)
+                    for limit, window in self._method_limits.get((region, method), self.default_method_limits)
+                ]
+        return buckets
+
+    def acquire(self, region: str, method: str = None) -> None:
+        '''
+        Blocks until a request to the given region and method fits in every rate limit window, and records it.
+        '''
+        buckets = self._buckets(region, method)
+        while True:
+            wait = self.backend.try_acquire(region, buckets, time.time())
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, region: str, method: str = None) -> None:
+        '''
+        Same as acquire(), but waits without blocking the event loop. The backend is called from a thread,
+        as the SQLite backend can wait on the file lock.
+        '''
+        buckets = self._buckets(region, method)
+        while True:
+            wait = await asyncio.to_thread(self.backend.try_acquire, region, buckets, time.time())
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, region: str, method: str, headers) -> None:
+        '''
+        Learns the real limits of the API key from the headers of a response.
+        '''
+        app_limits = parse_rate_limit_header(headers.get("X-App-Rate-Limit", ""))
+        method_limits = parse_rate_limit_header(headers.get("X-Method-Rate-Limit", ""))
+        # Mismo formato "cuenta:ventana": lo que ya se ha gastado de cada ventana
+        app_counts = {
+            window: count for count, window in parse_rate_limit_header(headers.get("X-App-Rate-Limit-Count", ""))
+        }
+        method_counts = {
+            window: count for count, window in parse_rate_limit_header(headers.get("X-Method-Rate-Limit-Count", ""))
+        }
+
+        with self._lock:
+            if app_limits:
+                self._app_limits[region] = app_limits
+            if method_limits and method is not None:
+                self._method_limits[(region, method)] = method_limits
+
+            for limit, window in app_limits:
+                if window in app_counts:
+                    self._remaining[("application", region, "", window)] = limit - app_counts[window]
+            if method is not None:
+                for limit, window in method_limits:
+                    if window in method_counts:
+                        self._remaining[("method", region, method, window)] = limit - method_counts[window]
+
+    def remaining_budget(self) -> dict:
+        '''
+        Returns the requests left in each window according to the last response of the API,
+        as {(scope, region, method, window): remaining}, with scope "application" or "method".
+        '''
+        with self._lock:
+            return dict(self._remaining)
+
+    def penalize(self, region: str, retry_after: float) -> None:
+        '''
+        Stops every request to the region for retry_after seconds (429 Retry-After), in every worker.
+        '''
+        self.backend.penalize(region, time.time() + retry_after)
@@ -1,32 +1,159 @@
-from typing import Dict, Any
-from urllib.parse import urlunparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from itertools import islice
+import logging
+from typing import Any, Container, Dict, Iterable, Iterator
+from urllib.parse import urlencode, urlunparse
 
-from ..utils import make_request, SEASON_START_TIMESTAMP
+from django.conf import settings
 
+from ..cache import MISSING, SharedCache, TTLCache, load_cache_backend
+from .. import metrics
+from ..circuit_breaker import CircuitOpenError
+from ..utils import RiotAPIError, make_request, http_client, SEASON_START_TIMESTAMP, BURST_LIMIT
+from ..match_archive import load_match_archive
+from .match_extraction import extract_match_data
+from .ranked_data import LEAGUE_ENTRIES_METHOD
+from .summoner_info import SUMMONER_BY_NAME_METHOD
+
+
+logger = logging.getLogger(__name__)
+
+
+# Numero maximo de peticiones de partidas en vuelo a la vez
+MAX_CONCURRENT_REQUESTS = BURST_LIMIT
+# Numero maximo de partidas pedidas o descargadas pendientes de guardar
+MAX_PENDING_MATCHES = 2 * MAX_CONCURRENT_REQUESTS
+
+# Nombres de los metodos de la API para sus rate limits
+MATCH_IDS_METHOD = "match-v5.getMatchIdsByPUUID"
+MATCH_METHOD = "match-v5.getMatch"
+
+# Segundos que se guarda la respuesta de cada metodo (None: no caduca, 0: solo se reutiliza dentro del mismo SummonerData)
+RESPONSE_CACHE_TTLS = {
+    MATCH_METHOD: None, # Una partida terminada ya no cambia
+    MATCH_IDS_METHOD: 60,
+    LEAGUE_ENTRIES_METHOD: 60,
+    SUMMONER_BY_NAME_METHOD: 10 * 60,
+}
+DEFAULT_RESPONSE_CACHE_TTL = 0
+RESPONSE_CACHE_SIZE = 512
+
+# "{region}" se sustituye por el routing value o la plataforma (para tests se puede apuntar a un servidor local)
+DEFAULT_RIOT_API_BASE_URL = "https://{region}.api.riotgames.com"
+
+# Primero la cache del proceso (respuestas ya decodificadas) y despues la compartida por todos los workers
+api_response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE)
+shared_response_cache = SharedCache(load_cache_backend(getattr(settings, "RIOT_API_CACHE", None)))
+
+
+def response_cache_metrics() -> list:
+    '''
+    Collector of /metrics: lookups and evictions of the API response caches.
+    '''
+    lookups = []
+    evictions = []
+    hit_ratios = []
+    for cache_name, cache in [("process", api_response_cache), ("shared", shared_response_cache)]:
+        stats = cache.stats.as_dict()
+        lookups += [
+            ({"cache": cache_name, "result": result}, stats[counter])
+            for result, counter in [("hit", "hits"), ("request_hit", "request_hits"), ("miss", "misses")]
+        ]
+        evictions.append(({"cache": cache_name}, stats["evictions"]))
+        hit_ratios.append(({"cache": cache_name}, stats["hit_ratio"]))
+    return [
+        ("whgg_api_cache_lookups", "counter",
+         'Lookups of the API response caches ("request_hit": repeated within the same SummonerData).', lookups),
+        ("whgg_api_cache_evictions", "counter", "Entries evicted from the API response caches.", evictions),
+        ("whgg_api_cache_hit_ratio", "gauge", "Share of the lookups of the API response caches that were hits.", hit_ratios),
+    ]
+
+
+metrics.registry.add_collector(response_cache_metrics)
+
+# Payloads completos de las partidas descargadas, para reprocesarlos sin volver a pedirlos (manage.py reprocess)
+match_archive = load_match_archive(getattr(settings, "RIOT_MATCH_ARCHIVE_DIR", None))
 
 
 class APIHandler:
-    def _get(self, endpoint, general_region=False, **params) -> Dict[str, Any] :
+    def _request_url(self, endpoint: str, general_region: bool = False) -> tuple:
         '''
-        Private method that performs a GET request to the specified Riot API endpoint.
+        Returns (region, url) of an endpoint: the routing value ("europe") or the summoner's platform.
         '''
         region_url = "europe" if general_region else self.region
         
         # Utilizo urlunparse para construir la URL
-        netloc = f"{region_url}.api.riotgames.com"
+        base_url = getattr(settings, "RIOT_API_BASE_URL", DEFAULT_RIOT_API_BASE_URL)
+        scheme, netloc = base_url.format(region=region_url).split("://", 1)
         path = f"lol/{endpoint}"
-        url = urlunparse(('https', netloc, path, '', '', ''))
+        url = urlunparse((scheme, netloc, path, '', '', ''))
+        return region_url, url
+    
+    def _cached_response(self, cache_key: str, ttl: float):
+        '''
+        Returns the cached response of a request, or MISSING.
+        '''
+        # Misma peticion ya hecha por este objeto (p.ej. league_entries() desde soloq_rank() y flex_rank())
+        if cache_key in self._responses:
+            api_response_cache.stats.add("request_hits")
+            return self._responses[cache_key]
+        
+        if ttl == 0:
+            return MISSING
+        
+        response = api_response_cache.get(cache_key)
+        if response is MISSING:
+            response = shared_response_cache.get(cache_key)
+            if response is not MISSING:
+                api_response_cache.set(cache_key, response, ttl)
+        if response is not MISSING:
+            self._memoize_response(cache_key, response, ttl)
+        return response
+    
+    def _store_response(self, cache_key: str, response, ttl: float):
+        if ttl != 0:
+            api_response_cache.set(cache_key, response, ttl)
+            shared_response_cache.set(cache_key, response, ttl)
+        return self._memoize_response(cache_key, response, ttl)
+    
+    def _memoize_response(self, cache_key: str, response, ttl: float):
+        # Las partidas no se guardan por objeto: solo se piden una vez y el worker descarga miles
+        if ttl is not None:
+            self._responses[cache_key] = response
+        return response
+    
+    def _get(self, endpoint, general_region=False, method=None, **params) -> Dict[str, Any] :
+        '''
+        Private method that performs a GET request to the specified Riot API endpoint.
+        The method name identifies the endpoint for its own rate limit bucket.
+        '''
+        region, url = self._request_url(endpoint, general_region)
+        
+        method = method or endpoint
+        ttl = RESPONSE_CACHE_TTLS.get(method, DEFAULT_RESPONSE_CACHE_TTL)
+        cache_key = f"{url}?{urlencode(sorted(params.items()))}"
+        
+        response = self._cached_response(cache_key, ttl)
+        if response is not MISSING:
+            return response
         
         params['api_key'] = self.api_key
         
         try:
-            return make_request(url, params)
+            response = make_request(url, params, method, region)
+        except (CircuitOpenError, RiotAPIError):
+            raise
         except Exception as e:
-            raise Exception(f"Error fetching data from API: {e}")
+            raise RiotAPIError(f"Error fetching data from API: {e}")
         
-    def all_match_ids_this_season(self) -> list:
+        return self._store_response(cache_key, response, ttl)
+        
+    def all_match_ids_this_season(self, start_time: int = SEASON_START_TIMESTAMP, stop_at: Container = ()) -> list:
         '''
-        Devuelve todos los match id de las partidas jugadas.
+        Devuelve todos los match id de las partidas que empezaron desde start_time (epoch en segundos), de mas reciente a mas antigua.
+        Si se da stop_at (los match id ya guardados), se para en el primero que este en stop_at, sin incluirlo.
         '''
         MAX_GAMES = 5000
         REQUEST_CAP = 100
@@ -35,105 +162,104 @@ class APIHandler:
         for start_index in range(0, MAX_GAMES, REQUEST_CAP):
             endpoint = f"match/v5/matches/by-puuid/{self.puuid}/ids"
             params = {
-                "startTime": SEASON_START_TIMESTAMP,
+                "startTime": start_time,
                 "start": start_index,
                 "count": int(min(REQUEST_CAP, MAX_GAMES - start_index))
             }
-            current_match_ids = self._get(endpoint, general_region=True, **params)
+            current_match_ids = self._get(endpoint, general_region=True, method=MATCH_IDS_METHOD, **params)
             
             if not current_match_ids:
                 break
             
+            for index, match_id in enumerate(current_match_ids):
+                if match_id in stop_at:
+                    return match_ids + current_match_ids[:index]
             match_ids += current_match_ids
             
+            if len(current_match_ids) < params["count"]:
+                break
+            
         return match_ids
     
     
-    def _handle_participant_data(self, participant) -> dict:
-        return {
-            "summoner_name": participant["summonerName"],
-            "champion_name": participant["championName"],
-            "team_id": participant["teamId"],
-        }
-    
-    
-    def _handle_summoner_data(self, participant) -> dict:
-        return {
-            "summoner_puuid": self.puuid,
-            "champion_name": participant["championName"],
-            "kills": participant["kills"],
-            "deaths": participant["deaths"],
-            "assists": participant["assists"],
-            "win": 1 if participant["win"] else 0,
-            "kda": self.calculate_kda(participant["kills"], participant["deaths"], participant["assists"]),
-            "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
-            "vision": participant["visionScore"],
-            "summoner_spell1": participant["summoner1Id"],
-            "summoner_spell2": participant["summoner2Id"],
-            "item0": participant["item0"],
-            "item1": participant["item1"],
-            "item2": participant["item2"],
-            "item3": participant["item3"],
-            "item4": participant["item4"],
-            "item5": participant["item5"],
-            "item6": participant["item6"],
-            "team_position": participant["teamPosition"],
-        }
+    def _match_data(self, match_id: str) -> dict:
+        """
+        Devuelve los datos del summoner y de todos los participantes de un match_id, o None si no se pueden obtener.
+        El payload completo se guarda en el archivo de partidas (si esta configurado), para poder reprocesarlo.
+        """
+        endpoint = f"match/v5/matches/{match_id}"
+        try:
+            match_request = self._get(general_region=True, endpoint=endpoint, method=MATCH_METHOD)
+        except CircuitOpenError:
+            # La API no responde: se aborta la sincronizacion (el job se reintenta) en vez de saltarse la partida
+            raise
+        except RiotAPIError as e:
+            # Igual con un 5xx o un timeout tras los reintentos; un 404 no se arregla reintentando y se salta
+            if e.transient:
+                raise
+            logger.warning(f"Error getting data for match_id {match_id}: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Error getting data for match_id {match_id}: {e}")
+            return None
+        
+        game_data = extract_match_data(match_id, match_request, self.puuid)
+        if game_data is not None:
+            game_data["match_data"]["payload_digest"] = match_archive.put(match_request) if match_archive else ""
+        return game_data
     
     
-    def _handle_match_data(self, match_request) -> dict:
-        return {
-            "game_mode": match_request["info"]["gameMode"],
-            "game_duration": match_request["info"]["gameDuration"],
-            "queue_id": match_request["info"]["queueId"]
-        }
+    def _iter_matches_data(self, match_ids: Iterable[str], fetch_match=None) -> Iterator[tuple]:
+        """
+        Genera (match_id, datos de la partida o None si no se pueden obtener) en el mismo orden que match_ids,
+        a medida que llegan.
+        
+        Las partidas se piden en paralelo; el rate limiter marca el ritmo de salida de las peticiones.
+        Como mucho hay MAX_PENDING_MATCHES partidas pedidas o esperando a que se consuman, asi que la memoria
+        no crece con el tamano del historial. fetch_match sustituye a _match_data() para obtener cada partida.
+        """
+        fetch_match = fetch_match or self._match_data
+        pending = deque()
+        match_ids = iter(match_ids)
+        fetched = 0
+        
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            while True:
+                for match_id in islice(match_ids, MAX_PENDING_MATCHES - len(pending)):
+                    # Con el contexto de la peticion, para que sus tiempos lleguen a Server-Timing
+                    context = contextvars.copy_context()
+                    pending.append((match_id, executor.submit(context.run, fetch_match, match_id)))
+                if not pending:
+                    break
+                
+                match_id, future = pending.popleft()
+                match_data = future.result()
+                if match_data is not None:
+                    fetched += 1
+                yield match_id, match_data
+        
+        logger.info(
+            f"Fetched {fetched} matches. HTTP connection stats: {http_client.stats()}. "
+            f"API response cache stats: {api_response_cache.stats.as_dict()}, shared: {shared_response_cache.stats.as_dict()}"
+        )
     
     
-    def _matches_data(self, match_ids: list = None) -> dict:    
+    def _matches_data(self, match_ids: list = None, progress=None) -> dict:
         """
         Devuelve un diccionario con los datos del summoner y los datos de todos los participantes para cada match_id.
+        Si se pasa progress, se llama con (partidas procesadas, total) a medida que llegan.
+        
+        Lo guarda todo en memoria: para historiales completos mejor _iter_matches_data().
         """
         if match_ids is None:
             match_ids = self.all_match_ids_this_season()
             
         all_matches_data = {}
         
-        for match_id in match_ids:
-            endpoint = f"match/v5/matches/{match_id}"
-            try:
-                match_request = self._get(general_region=True, endpoint=endpoint)
-            except Exception as e:
-                print(f"Error getting data for match_id {match_id}: {e}")
-                continue
-            
-            # Manejo la posibilidad de que haya cambiado el formato de los datos dispuesto por la API de Riot Games
-            if "info" not in match_request or "participants" not in match_request["info"]:
-                print(f"Unexpected format of data for match_id {match_id}: {match_request}")
-                continue
-        
-            summoner_data = None
-            participants_data = []
-
-
-            for participant in match_request["info"]["participants"]:
-                participant_info = self._handle_participant_data(participant)
-                participants_data.append(participant_info)
-                
-                if participant["puuid"] == self.puuid:
-                    summoner_data = self._handle_summoner_data(participant)
-                    
-            if summoner_data is None:
-                print(f"No summoner data found for match_id {match_id} and puuid {self.puuid}")
-                continue
-            
-            
-            match_data = self._handle_match_data(match_request)
-            
-            all_match_data= {
-                "match_data": match_data,
-                "summoner_data": summoner_data,
-                "participants_data": participants_data,
-            }
-            all_matches_data[match_id] = all_match_data
+        for done, (match_id, match_data) in enumerate(self._iter_matches_data(match_ids), 1):
+            if match_data is not None:
+                all_matches_data[match_id] = match_data
+            if progress is not None:
+                progress(done, len(match_ids))
         
-        return all_matches_data
\ No newline at end of file
+        return all_matches_data
@@ -0,0 +1,120 @@
+from typing import Any, Dict
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+
+from ..cache import MISSING
+from ..circuit_breaker import CircuitOpenError
+from ..locks import asingle_flight
+from ..models import IngestionJobModel
+from ..utils import RiotAPIError, make_request_async
+from .api_handler import DEFAULT_RESPONSE_CACHE_TTL, RESPONSE_CACHE_TTLS
+from .ranked_data import LEAGUE_ENTRIES_METHOD, SUMMONER_REFRESH_WAIT, ranks_from_league_entries
+from .summoner_data import BASE_URL_TEMPLATE, REGION_DEFAULT, SummonerData
+from .summoner_identity import aresolve_summoner_identity
+from .summoner_info import SUMMONER_BY_NAME_METHOD
+
+
+class AsyncSummonerData(SummonerData):
+    '''
+    Async variant of SummonerData for async views, with the methods the summoner page needs.
+
+    API calls go through httpx and the asyncio-aware rate limiter, and the database through Django's
+    async ORM (or sync_to_async for raw SQL and writes), so a request waiting on the Riot API or on
+    the rate limit doesn't hold a worker. The sync methods of SummonerData are still available.
+
+        summoner = await AsyncSummonerData.create("name", api_key)
+    '''
+    @classmethod
+    async def create(cls, summoner_name: str, api_key: str, region: str = REGION_DEFAULT) -> "AsyncSummonerData":
+        self = cls.__new__(cls)
+        self.api_key = api_key
+        self.region = region
+        self.summoner_name = summoner_name
+        self.base_url = BASE_URL_TEMPLATE.format(region=region)
+
+        self._summoner_info = None
+        self._responses = {}
+        self.id, self.puuid, self.icon_id, self.level = await aresolve_summoner_identity(
+            summoner_name, region, self.asummoner_info
+        )
+        return self
+
+    async def _aget(self, endpoint, general_region=False, method=None, **params) -> Dict[str, Any]:
+        '''
+        Async version of _get(), with the same caches.
+        '''
+        region, url = self._request_url(endpoint, general_region)
+
+        method = method or endpoint
+        ttl = RESPONSE_CACHE_TTLS.get(method, DEFAULT_RESPONSE_CACHE_TTL)
+        cache_key = f"{url}?{urlencode(sorted(params.items()))}"
+
+        response = self._cached_response(cache_key, ttl)
+        if response is not MISSING:
+            return response
+
+        params['api_key'] = self.api_key
+
+        try:
+            response = await make_request_async(url, params, method, region)
+        except (CircuitOpenError, RiotAPIError):
+            raise
+        except Exception as e:
+            raise RiotAPIError(f"Error fetching data from API: {e}")
+
+        return self._store_response(cache_key, response, ttl)
+
+    async def asummoner_info(self) -> dict:
+        if not self._summoner_info:
+            endpoint = f"summoner/v4/summoners/by-name/{self.summoner_name}"
+            self._summoner_info = await self._aget(endpoint, method=SUMMONER_BY_NAME_METHOD)
+        return self._summoner_info
+
+    async def aleague_entries(self) -> list:
+        endpoint = f"league/v4/entries/by-summoner/{self.id}"
+        return await self._aget(endpoint, method=LEAGUE_ENTRIES_METHOD)
+
+    async def afetch_summoner_ranks(self) -> Dict[str, Any]:
+        league_entries = await self.aleague_entries()
+        summoner_info = await self.asummoner_info()
+        return ranks_from_league_entries(league_entries, summoner_info["profileIconId"], summoner_info["summonerLevel"])
+
+    async def aprofile_data(self) -> dict:
+        return await sync_to_async(self.profile_data)()
+
+    async def aleague_data(self) -> dict:
+        '''
+        Async version of league_data(): the stored data if there is any (refreshed in the background
+        when stale), otherwise the ranks fetched from the API, which are saved. Like league_data(),
+        only one request (sync or async) fetches a new summoner; the others wait and read what it saved.
+        '''
+        summoner_data = await sync_to_async(self._summoner_data_from_db)()
+        if summoner_data:
+            await self.arefresh_if_stale(summoner_data)
+            return summoner_data
+
+        async with asingle_flight(f"league_data:{self.puuid}", wait=SUMMONER_REFRESH_WAIT) as leader:
+            if leader:
+                return await self._afetch_and_save_ranks()
+
+        summoner_data = await sync_to_async(self._summoner_data_from_db)()
+        if summoner_data:
+            return summoner_data
+
+        # El otro refresco no termino a tiempo o fallo: lo pido yo
+        return await self._afetch_and_save_ranks()
+
+    async def _afetch_and_save_ranks(self) -> dict:
+        data = await self.afetch_summoner_ranks()
+        await sync_to_async(self.handle_summoner_data)(data)
+        return data
+
+    async def arefresh_if_stale(self, summoner_data: dict) -> IngestionJobModel:
+        return await sync_to_async(self.refresh_if_stale)(summoner_data)
+
+    async def aenqueue_ingestion(self) -> IngestionJobModel:
+        return await sync_to_async(self.enqueue_ingestion)()
+
+    async def aingestion_status(self) -> dict:
+        return await sync_to_async(self.ingestion_status)()
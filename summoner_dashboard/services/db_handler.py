@@ -1,24 +1,72 @@
 from datetime import timedelta
 import logging
+from typing import Iterable, Iterator, Union
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from ..models import SummonerModel, MatchModel
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from ..locks import single_flight
+from ..metrics import instrumented
+from ..models import SummonerModel, MatchModel, MatchDetailModel, ParticipantModel
+from ..utils import SEASON_START_TIMESTAMP
+from .match_record import MatchRecord
 
 
 logger = logging.getLogger(__name__)
 UPDATE_THRESHOLD = timedelta(hours=1)
+MATCHES_BATCH_SIZE = 100
+PARTICIPANT_FIELDS = [
+    "puuid", "summoner_name", "champion_name", "team_id", "team_position", "win", "kills", "deaths", "assists",
+    "kda", "cs", "vision", "summoner_spell1", "summoner_spell2", "item0", "item1", "item2", "item3", "item4",
+    "item5", "item6", "champion_level", "gold_earned", "damage_dealt_to_champions", "damage_taken",
+    "wards_placed", "wards_killed",
+]
+
+
+def build_match_model(summoner: SummonerModel, match_id: str, game_data: dict) -> MatchModel:
+    match_data = game_data["match_data"]
+    summoner_data = game_data["summoner_data"]
+
+    return MatchModel(
+        summoner=summoner,
+        match_id=match_id,
+        champion_name=summoner_data["champion_name"],
+        win=summoner_data["win"],
+        kills=summoner_data["kills"],
+        deaths=summoner_data["deaths"],
+        assists=summoner_data["assists"],
+        kda=summoner_data["kda"],
+        cs=summoner_data["cs"],
+        vision=summoner_data["vision"],
+        summoner_spell1=summoner_data["summoner_spell1"],
+        summoner_spell2=summoner_data["summoner_spell2"],
+        item0=summoner_data["item0"],
+        item1=summoner_data["item1"],
+        item2=summoner_data["item2"],
+        item3=summoner_data["item3"],
+        item4=summoner_data["item4"],
+        item5=summoner_data["item5"],
+        item6=summoner_data["item6"],
+        game_mode=match_data["game_mode"],
+        game_duration=match_data["game_duration"],
+        queue_id=match_data["queue_id"],
+        team_position=summoner_data["team_position"],
+        game_end_timestamp=match_data["game_end_timestamp"],
+    )
 
 
 class DatabaseHandler:
+    @instrumented
     def _summoner_data_from_db(self) -> dict:
-        """Retrieve summoner data from the database based on the summoner_name.
+        """Retrieve summoner data from the database based on the summoner's puuid.
         Returns:
             A dict with summoner data or None if not found.
         """
-        try:
-            summoner_model = SummonerModel.objects.get(summoner_name=self.summoner_name)
+        summoner_model = SummonerModel.objects.filter(summoner_puuid=self.puuid).first()
+        if summoner_model is not None:
             return {
                 "summoner_puuid": summoner_model.summoner_puuid,
+                "last_update": summoner_model.last_update,
                 "profile_icon_id": summoner_model.profile_icon_id,
                 "summoner_level": summoner_model.summoner_level,
                 "soloq_rank": summoner_model.soloq_rank,
@@ -32,18 +80,17 @@ class DatabaseHandler:
                 "flex_losses": summoner_model.flex_losses,
                 "flex_wr": summoner_model.flex_wr,
             }
-        
-        except SummonerModel.DoesNotExist:
-            return None
+        return None
         
         
+    @instrumented
     def handle_summoner_data(self, league_data: dict) -> None:
         '''
         Handles the summoner data depending on if the summoner exists in the database
         '''
         
-        summoner, created = SummonerModel.objects.get_or_create(summoner_puuid=self.puuid)
-        if created:
+        summoner = SummonerModel.objects.filter(summoner_puuid=self.puuid).first()
+        if summoner is None:
             self.save_summoner_to_db(league_data)
         
         else:
@@ -70,8 +117,8 @@ class DatabaseHandler:
             summoner.flex_wins = league_data["flex_wins"]
             summoner.flex_losses = league_data["flex_losses"]
             summoner.flex_wr = league_data["flex_wr"]
-            summoner.profile_icon_id = self.icon_id
-            summoner.summoner_level = self.level
+            summoner.profile_icon_id = league_data["profile_icon_id"]
+            summoner.summoner_level = league_data["summoner_level"]
 
             summoner.save()
                 
@@ -83,180 +130,292 @@ class DatabaseHandler:
         current_timestamp = timezone.now()
         
         logger.info("Adding a new summoner to the database.")
-        SummonerModel.objects.create(
-            summoner_puuid=self.puuid,
-            summoner_id=self.id,
-            summoner_name=self.summoner_name,
-            region=self.region,
-            last_update=current_timestamp,
-            soloq_rank=league_data["soloq_rank"],
-            soloq_lp=league_data["soloq_lp"],
-            soloq_wins=league_data["soloq_wins"],
-            soloq_losses=league_data["soloq_losses"],
-            soloq_wr=league_data["soloq_wr"],
-            flex_rank=league_data["flex_rank"],
-            flex_lp=league_data["flex_lp"],
-            flex_wins=league_data["flex_wins"],
-            flex_losses=league_data["flex_losses"],
-            flex_wr=league_data["flex_wr"],
-            profile_icon_id=self.icon_id,
-            summoner_level=self.level,
-        )
-            
-            
-    def _matches_data_from_db(self) -> list[dict]:
         try:
-            last_match = self._get_last_match()
+            with transaction.atomic():
+                SummonerModel.objects.create(
+                    summoner_puuid=self.puuid,
+                    summoner_id=self.id,
+                    summoner_name=self.summoner_name,
+                    region=self.region,
+                    last_update=current_timestamp,
+                    soloq_rank=league_data["soloq_rank"],
+                    soloq_lp=league_data["soloq_lp"],
+                    soloq_wins=league_data["soloq_wins"],
+                    soloq_losses=league_data["soloq_losses"],
+                    soloq_wr=league_data["soloq_wr"],
+                    flex_rank=league_data["flex_rank"],
+                    flex_lp=league_data["flex_lp"],
+                    flex_wins=league_data["flex_wins"],
+                    flex_losses=league_data["flex_losses"],
+                    flex_wr=league_data["flex_wr"],
+                    profile_icon_id=league_data["profile_icon_id"],
+                    summoner_level=league_data["summoner_level"],
+                )
+        except IntegrityError:
+            # Otra peticion (o proceso) lo ha dado de alta a la vez: se actualiza lo que ha guardado
+            self.update_summoner_in_db(league_data, SummonerModel.objects.get(summoner_puuid=self.puuid))
+            
             
-            if last_match:
-                self._handle_new_matches(last_match)
+    @instrumented
+    def _matches_data_from_db(self, limit: int, before: tuple = None) -> list[MatchRecord]:
+        '''
+        Returns up to limit of the matches already stored for the summoner, most recent first.
+        It never calls the API; see sync_matches().
         
-            else:
-                self._handle_all_matches()
+            Args:
+                limit: Maximum number of matches to return.
+                before: Optional (game_end_timestamp, match_id) cursor; only older matches are returned.
+        '''
+        return self._get_recent_match_data(limit, before)
+    
+    
+    @instrumented
+    def sync_matches(self, progress=None) -> None:
+        '''
+        Downloads the summoner's matches that are not stored yet and saves them to the database.
+        
+            Args:
+                progress: Optional callable(done, total) called as the matches are downloaded.
+        '''
+        # Si otro proceso ya esta sincronizando este summoner no repito el crawl: lo que guarde sera el resultado
+        with single_flight(f"sync_matches:{self.puuid}") as leader:
+            if not leader:
+                logger.info("Matches are already being synced by another process.")
+                return
+            
+            try:
+                summoner = SummonerModel.objects.get(summoner_puuid=self.puuid)
+            except ObjectDoesNotExist:
+                logger.warning("Summoner not found in the database, can't sync matches.")
+                return
             
-            return self._get_all_match_data()
+            if summoner.last_match_id:
+                self._handle_new_matches(summoner, progress)
         
-        except ObjectDoesNotExist:
-            logger.warning("No matches found for summoner.")
-            return []
+            else:
+                self._handle_all_matches(summoner, progress)
         
-
-    def _get_last_match(self):
-        return MatchModel.objects.filter(summoner__summoner_puuid=self.puuid).order_by('-match_id').first()
-    
     
-    def _handle_new_matches(self, last_match):
-        recent_matches = [
-            match_id for match_id in self.all_match_ids_this_season() if match_id > last_match.match_id
-        ]
+    def _handle_new_matches(self, summoner: SummonerModel, progress=None):
+        # Solo pido las partidas que empezaron despues de que acabara la ultima guardada (startTime es el inicio
+        # de la partida, asi que la ultima guardada ya no aparece). Un cursor sin fecha (partidas guardadas antes
+        # de que existiera) no va mas atras del inicio de la temporada
+        start_time = max((summoner.last_match_end_timestamp or 0) // 1000, SEASON_START_TIMESTAMP)
+        # Los ids llegan de mas reciente a mas antigua: a partir de la primera ya guardada, lo estan todas
+        stored_match_ids = set(MatchModel.objects.filter(summoner=summoner).values_list('match_id', flat=True))
+        recent_matches = self.all_match_ids_this_season(start_time=start_time, stop_at=stored_match_ids)
         if recent_matches:
             logger.info("Found new matches, updating database...")
-            new_matches_data = self._matches_data(recent_matches)
-            self.save_matches_data_to_db(new_matches_data)
+            self.save_matches_data_to_db(self._iter_new_matches_data(recent_matches, progress))
             
     
-    def _handle_all_matches(self):
-        all_matches = self.all_match_ids_this_season()
+    def _handle_all_matches(self, summoner: SummonerModel, progress=None):
+        # Sin cursor todavia: pido la temporada entera, pero solo descargo las partidas que no estan guardadas
+        stored_match_ids = set(
+            MatchModel.objects.filter(summoner=summoner).values_list('match_id', flat=True)
+        )
+        all_matches = [match_id for match_id in self.all_match_ids_this_season() if match_id not in stored_match_ids]
         if all_matches:
             logger.info("Adding all matches to the database...")
-            all_matches_data = self._matches_data(all_matches)
-            self.save_matches_data_to_db(all_matches_data)
+            self.save_matches_data_to_db(self._iter_new_matches_data(all_matches, progress))
+        
+        # Con toda la temporada guardada, el cursor apunta a la partida mas reciente aunque ninguna fuera nueva
+        # (summoners guardados antes de que existiera el cursor); la siguiente sincronizacion ya es incremental
+        with transaction.atomic():
+            summoner = SummonerModel.objects.select_for_update().get(pk=summoner.pk)
+            newest_match = MatchModel.objects.filter(summoner=summoner).order_by('-game_end_timestamp', '-match_id').first()
+            if newest_match is not None:
+                self._advance_sync_cursor(summoner, [newest_match])
             
+    
+    def _iter_new_matches_data(self, match_ids: list, progress=None) -> Iterator[tuple]:
+        '''
+        Yields (match_id, match data) for the given matches (most recent first, as the API returns them)
+        from the oldest to the most recent, as they are downloaded. Saved in that order, the sync cursor
+        always points to the newest saved match, so an interrupted sync resumes after the last saved batch.
+        
+        Matches already downloaded for another summoner are built from the stored participants; only the
+        rest are requested to the API. Matches that can never be fetched (404, unexpected payload) are skipped.
+        If the API doesn't answer (circuit open, 5xx or timeouts after the retries) the error is raised instead:
+        the batches saved before stay saved and the cursor doesn't move past the match, so the next sync retries it.
+        '''
+        match_ids = match_ids[::-1]
+        stored_matches_data = {}
+        
+        def lookup_stored_matches():
+            # Los participantes guardados se buscan por lotes, justo antes de pedir cada lote a la API
+            for start in range(0, len(match_ids), MATCHES_BATCH_SIZE):
+                batch = match_ids[start:start + MATCHES_BATCH_SIZE]
+                stored_matches_data.update(self._matches_data_from_participants(batch))
+                yield from batch
+        
+        def match_data(match_id: str) -> dict:
+            return stored_matches_data.pop(match_id, None) or self._match_data(match_id)
+        
+        matches = self._iter_matches_data(lookup_stored_matches(), fetch_match=match_data)
+        for done, (match_id, game_data) in enumerate(matches, 1):
+            if game_data is not None:
+                yield match_id, game_data
+            if progress is not None:
+                progress(done, len(match_ids))
+    
+    
+    @instrumented
+    def _matches_data_from_participants(self, match_ids: list) -> dict:
+        '''
+        Builds the same dict as _matches_data() for the matches whose details and participants are already stored.
+        '''
+        matches_data = {}
+        
+        for start in range(0, len(match_ids), MATCHES_BATCH_SIZE):
+            participants = ParticipantModel.objects.filter(
+                match_id__in=match_ids[start:start + MATCHES_BATCH_SIZE]
+            ).select_related('match').order_by('match_id', 'participant_index')
             
-    def _get_all_match_data(self):
-        matches = MatchModel.objects.filter(summoner__summoner_puuid=self.puuid).select_related('summoner')
-        matches_data = []
-
-        for match in matches:
-            match_data = {
-                    "summoner_puuid": match.summoner.summoner_puuid,
-                    "match_id": match.match_id,
-                    "champion_name": match.champion_name,
-                    "win": match.win,
-                    "kills": match.kills,
-                    "deaths": match.deaths,
-                    "assists": match.assists,
-                    "kda": match.kda,
-                    "cs": match.cs,
-                    "vision": match.vision,
-                    "summoner_spell1": match.summoner_spell1,
-                    "summoner_spell2": match.summoner_spell2,
-                    "item0": match.item0,
-                    "item1": match.item1,
-                    "item2": match.item2,
-                    "item3": match.item3,
-                    "item4": match.item4,
-                    "item5": match.item5,
-                    "item6": match.item6,
-                    "participant1_summoner_name": match.participant_summoner_names[0],
-                    "participant2_summoner_name": match.participant_summoner_names[1],
-                    "participant3_summoner_name": match.participant_summoner_names[2],
-                    "participant4_summoner_name": match.participant_summoner_names[3],
-                    "participant5_summoner_name": match.participant_summoner_names[4],
-                    "participant6_summoner_name": match.participant_summoner_names[5],
-                    "participant7_summoner_name": match.participant_summoner_names[6],
-                    "participant8_summoner_name": match.participant_summoner_names[7],
-                    "participant9_summoner_name": match.participant_summoner_names[8],
-                    "participant10_summoner_name": match.participant_summoner_names[9],
-                    "participant1_champion_name": match.participant_champion_names[0],
-                    "participant2_champion_name": match.participant_champion_names[1],
-                    "participant3_champion_name": match.participant_champion_names[2],
-                    "participant4_champion_name": match.participant_champion_names[3],
-                    "participant5_champion_name": match.participant_champion_names[4],
-                    "participant6_champion_name": match.participant_champion_names[5],
-                    "participant7_champion_name": match.participant_champion_names[6],
-                    "participant8_champion_name": match.participant_champion_names[7],
-                    "participant9_champion_name": match.participant_champion_names[8],
-                    "participant10_champion_name": match.participant_champion_names[9],
-                    "participant1_team_id": match.participant_team_ids[0],
-                    "participant2_team_id": match.participant_team_ids[1],
-                    "participant3_team_id": match.participant_team_ids[2],
-                    "participant4_team_id": match.participant_team_ids[3],
-                    "participant5_team_id": match.participant_team_ids[4],
-                    "participant6_team_id": match.participant_team_ids[5],
-                    "participant7_team_id": match.participant_team_ids[6],
-                    "participant8_team_id": match.participant_team_ids[7],
-                    "participant9_team_id": match.participant_team_ids[8],
-                    "participant10_team_id": match.participant_team_ids[9],
-                    "game_mode": match.game_mode,
-                    "game_duration": match.game_duration,
-                    "queue_id": match.queue_id,
-                    "team_position": match.team_position,
-                }
-            matches_data.append(match_data)
-        logger.info("Retrieved all match data.")
+            for participant in participants:
+                match = participant.match
+                game_data = matches_data.setdefault(match.match_id, {
+                    "match_data": {
+                        "game_mode": match.game_mode,
+                        "game_duration": match.game_duration,
+                        "queue_id": match.queue_id,
+                        "game_end_timestamp": match.game_end_timestamp,
+                        "payload_digest": match.payload_digest,
+                    },
+                    "summoner_data": None,
+                    "participants_data": [],
+                })
+                participant_data = {field: getattr(participant, field) for field in PARTICIPANT_FIELDS}
+                game_data["participants_data"].append(participant_data)
+                
+                if participant.puuid == self.puuid:
+                    game_data["summoner_data"] = {"summoner_puuid": self.puuid, **participant_data}
+        
+        # Si el summoner no aparece entre los participantes guardados, la partida se pide a la API
+        return {match_id: game_data for match_id, game_data in matches_data.items() if game_data["summoner_data"]}
+            
+            
+    @instrumented
+    def _get_recent_match_data(self, limit: int, before: tuple = None) -> list[MatchRecord]:
+        matches = MatchModel.objects.filter(summoner_id=self.puuid)
+        
+        if before is not None:
+            game_end_timestamp, match_id = before
+            matches = matches.filter(
+                Q(game_end_timestamp__lt=game_end_timestamp)
+                | Q(game_end_timestamp=game_end_timestamp, match_id__lt=match_id)
+            )
+        
+        # Consulta ordenada y limitada, servida por el indice (summoner, -game_end_timestamp, -match_id)
+        matches = list(matches.order_by('-game_end_timestamp', '-match_id')[:limit].values_list(*MatchRecord.FIELDS))
+        
+        participants = {}
+        participant_rows = ParticipantModel.objects.filter(
+            match_id__in=[row[0] for row in matches]
+        ).order_by('match_id', 'participant_index').values_list('match_id', *MatchRecord.PARTICIPANT_FIELDS)
+        for match_id, *participant in participant_rows:
+            participants.setdefault(match_id, []).append(participant)
+        
+        matches_data = [MatchRecord(row, participants.get(row[0], ())) for row in matches]
+        logger.info(f"Retrieved {len(matches_data)} matches.")
         return matches_data
     
     
     
-    def save_matches_data_to_db(self, matches_data: dict) -> None:
+    @instrumented
+    def save_matches_data_to_db(self, matches_data: Union[dict, Iterable[tuple]]) -> None:
         """
         Saves match data to the database.
+        
+        Matches are inserted in batches of MATCHES_BATCH_SIZE, each one in its own transaction, as they
+        arrive: with an iterator only one batch is kept in memory, and what was saved before an error stays saved.
+        Matches already stored for the summoner are ignored, so overlapping refreshes can't duplicate them,
+        The match details and all its participants are stored too, and the champion stats and the sync cursor
+        are updated with the new matches in the same transaction.
 
             Args:
-                matches_data: A dict containing match data for each match ID.
+                matches_data: A dict containing match data for each match ID, or an iterable of
+                    (match ID, match data) pairs.
 
             Returns:
                 None.
         """
-        for match_id, game_data in matches_data.items():
-            match_data = game_data["match_data"]
-            summoner_data = game_data["summoner_data"]
-            participants_data = game_data["participants_data"]
-
-            participant_summoner_names = [p["summoner_name"] for p in participants_data]
-            participant_champion_names = [p["champion_name"] for p in participants_data]
-            participant_team_ids = [p["team_id"] for p in participants_data]
-
-            summoner = SummonerModel.objects.get(summoner_puuid=summoner_data["summoner_puuid"])
-
-            new_match = MatchModel(
-                summoner=summoner,
+        if isinstance(matches_data, dict):
+            matches_data = matches_data.items()
+        
+        batch = {}
+        for match_id, game_data in matches_data:
+            batch[match_id] = game_data
+            if len(batch) == MATCHES_BATCH_SIZE:
+                self._save_matches_batch(batch)
+                batch = {}
+        
+        if batch:
+            self._save_matches_batch(batch)
+    
+    
+    @instrumented
+    def _save_matches_batch(self, matches_data: dict) -> None:
+        batch = list(matches_data)
+        
+        with transaction.atomic():
+            # Bloqueo la fila del summoner para que dos guardados del mismo summoner no se solapen
+            summoner = SummonerModel.objects.select_for_update().get(summoner_puuid=self.puuid)
+            stored_match_ids = set(
+                MatchModel.objects.filter(summoner=summoner, match_id__in=batch).values_list('match_id', flat=True)
+            )
+            new_matches = [
+                build_match_model(summoner, match_id, matches_data[match_id])
+                for match_id in batch if match_id not in stored_match_ids
+            ]
+            MatchModel.objects.bulk_create(new_matches, ignore_conflicts=True)
+            self._save_match_details(batch, matches_data)
+            self.update_champion_stats(summoner, new_matches)
+            self._advance_sync_cursor(summoner, new_matches)
+        
+        logger.info(f"Saved {len(new_matches)} new matches.")
+    
+    
+    def _save_match_details(self, match_ids: list, matches_data: dict) -> None:
+        '''
+        Saves the match details and the stats of all its participants, so the other nine players
+        of each match don't need to download it again.
+        '''
+        match_details = []
+        participants = []
+        
+        for match_id in match_ids:
+            match_data = matches_data[match_id]["match_data"]
+            match_details.append(MatchDetailModel(
                 match_id=match_id,
-                champion_name=summoner_data["champion_name"],
-                win=summoner_data["win"],
-                kills=summoner_data["kills"],
-                deaths=summoner_data["deaths"],
-                assists=summoner_data["assists"],
-                kda=summoner_data["kda"],
-                cs=summoner_data["cs"],
-                vision=summoner_data["vision"],
-                summoner_spell1=summoner_data["summoner_spell1"],
-                summoner_spell2=summoner_data["summoner_spell2"],
-                item0=summoner_data["item0"],
-                item1=summoner_data["item1"],
-                item2=summoner_data["item2"],
-                item3=summoner_data["item3"],
-                item4=summoner_data["item4"],
-                item5=summoner_data["item5"],
-                item6=summoner_data["item6"],
-                participant_summoner_names=participant_summoner_names,
-                participant_champion_names=participant_champion_names,
-                participant_team_ids=participant_team_ids,
                 game_mode=match_data["game_mode"],
                 game_duration=match_data["game_duration"],
                 queue_id=match_data["queue_id"],
-                team_position=summoner_data["team_position"]
-            )
-
-            new_match.save()
\ No newline at end of file
+                game_end_timestamp=match_data["game_end_timestamp"],
+                payload_digest=match_data.get("payload_digest", ""),
+            ))
+            participants += [
+                ParticipantModel(
+                    match_id=match_id,
+                    participant_index=index,
+                    **{field: participant_data[field] for field in PARTICIPANT_FIELDS},
+                )
+                for index, participant_data in enumerate(matches_data[match_id]["participants_data"])
+            ]
+        
+        MatchDetailModel.objects.bulk_create(match_details, ignore_conflicts=True)
+        ParticipantModel.objects.bulk_create(participants, ignore_conflicts=True)
+    
+    
+    def _advance_sync_cursor(self, summoner: SummonerModel, new_matches: list[MatchModel]) -> None:
+        '''
+        Moves the summoner's sync cursor to the most recent of the new matches, if it is newer than the current one.
+        '''
+        if not new_matches:
+            return
+        
+        last_match = max(new_matches, key=lambda match: match.game_end_timestamp)
+        if summoner.last_match_end_timestamp is None or last_match.game_end_timestamp > summoner.last_match_end_timestamp:
+            summoner.last_match_id = last_match.match_id
+            summoner.last_match_end_timestamp = last_match.game_end_timestamp
+            summoner.save(update_fields=['last_match_id', 'last_match_end_timestamp'])
@@ -0,0 +1,188 @@
+from datetime import timedelta
+import logging
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..circuit_breaker import CircuitOpenError
+from ..models import IngestionJobModel, SummonerModel
+from ..utils import circuit_breaker
+
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobLost(Exception):
+    '''
+    The job stopped sending heartbeats for too long and another worker claimed it.
+    '''
+
+PRIORITY_NEW_SUMMONER = 0
+PRIORITY_REFRESH = 10 # Las actualizaciones de summoners conocidos cuestan una sola llamada, van primero
+RETRY_BASE_DELAY = timedelta(seconds=30)
+# Un job en running sin heartbeat durante este tiempo se da por perdido (worker caido). El heartbeat se
+# actualiza con el progreso, asi que un crawl largo (una temporada entera son horas) no se reclama
+HEARTBEAT_TIMEOUT = timedelta(minutes=10)
+PROGRESS_SAVE_EVERY = 10
+
+
+def enqueue_ingestion_job(puuid: str, summoner_name: str, region: str, priority: int = PRIORITY_NEW_SUMMONER) -> IngestionJobModel:
+    '''
+    Enqueues the ingestion of a summoner's matches. There is only one job per puuid:
+    if it is already pending or running it is returned as is (with the higher priority),
+    and if it is finished it is queued again.
+    '''
+    now = timezone.now()
+    job, created = IngestionJobModel.objects.get_or_create(
+        summoner_puuid=puuid,
+        defaults={
+            "summoner_name": summoner_name,
+            "region": region,
+            "priority": priority,
+            "run_after": now,
+        },
+    )
+    if created:
+        return job
+
+    if job.status in (IngestionJobModel.PENDING, IngestionJobModel.RUNNING):
+        if priority > job.priority:
+            IngestionJobModel.objects.filter(pk=job.pk).update(priority=priority)
+            job.priority = priority
+        return job
+
+    IngestionJobModel.objects.filter(
+        pk=job.pk, status__in=[IngestionJobModel.DONE, IngestionJobModel.FAILED]
+    ).update(
+        summoner_name=summoner_name,
+        region=region,
+        priority=priority,
+        status=IngestionJobModel.PENDING,
+        attempts=0,
+        run_after=now,
+        matches_total=0,
+        matches_done=0,
+        last_error='',
+    )
+    job.refresh_from_db()
+    return job
+
+
+def claim_ingestion_job() -> IngestionJobModel:
+    '''
+    Takes the next job to run (highest priority first), or None if there is nothing to do.
+
+    The job is claimed with a conditional UPDATE, so two workers can never take the same one,
+    also on databases without SELECT ... FOR UPDATE SKIP LOCKED.
+    '''
+    now = timezone.now()
+    candidates = IngestionJobModel.objects.filter(
+        Q(status=IngestionJobModel.PENDING, run_after__lte=now)
+        | Q(status=IngestionJobModel.RUNNING, heartbeat_at__lt=now - HEARTBEAT_TIMEOUT)
+    ).order_by('-priority', 'run_after')
+
+    for job in candidates[:10]:
+        claimed = IngestionJobModel.objects.filter(
+            pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at
+        ).update(
+            status=IngestionJobModel.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+    return None
+
+
+def run_ingestion_job(job: IngestionJobModel, api_key: str) -> None:
+    '''
+    Downloads and stores the summoner's new matches, saving the progress in the job.
+    Failed jobs are retried with exponential backoff until max_attempts.
+    '''
+    # Import local: summoner_data importa este modulo
+    from .summoner_data import SummonerData
+
+    def progress(done: int, total: int) -> None:
+        if done % PROGRESS_SAVE_EVERY == 0 or done == total:
+            # Solo mientras el job siga siendo de este worker (started_at cambia si otro lo reclama)
+            updated = IngestionJobModel.objects.filter(
+                pk=job.pk, status=IngestionJobModel.RUNNING, started_at=job.started_at
+            ).update(matches_done=done, matches_total=total, heartbeat_at=timezone.now())
+            if not updated:
+                raise IngestionJobLost(f"Ingestion job for {job.summoner_name} was claimed by another worker")
+
+    try:
+        summoner = SummonerData(job.summoner_name, api_key, job.region)
+        summoner.handle_summoner_data(summoner.fetch_summoner_ranks())
+        summoner.sync_matches(progress=progress)
+
+    except IngestionJobLost as e:
+        # Lo que ya se guardo vale; el job es ahora del otro worker y no se toca
+        logger.warning(str(e))
+        return
+
+    except CircuitOpenError as e:
+        # No es culpa del job: se vuelve a encolar para cuando la API se recupere, sin gastar un intento
+        logger.warning(f"Ingestion job for {job.summoner_name} postponed: {e}")
+        IngestionJobModel.objects.filter(pk=job.pk).update(
+            status=IngestionJobModel.PENDING,
+            attempts=F('attempts') - 1,
+            run_after=timezone.now() + timedelta(seconds=circuit_breaker.retry_after()),
+            last_error=str(e),
+        )
+        return
+
+    except Exception as e:
+        logger.exception(f"Ingestion job for {job.summoner_name} failed.")
+        if job.attempts < job.max_attempts:
+            IngestionJobModel.objects.filter(pk=job.pk).update(
+                status=IngestionJobModel.PENDING,
+                run_after=timezone.now() + RETRY_BASE_DELAY * 2 ** (job.attempts - 1),
+                last_error=str(e),
+            )
+        else:
+            IngestionJobModel.objects.filter(pk=job.pk).update(
+                status=IngestionJobModel.FAILED,
+                finished_at=timezone.now(),
+                last_error=str(e),
+            )
+        return
+
+    IngestionJobModel.objects.filter(pk=job.pk).update(
+        status=IngestionJobModel.DONE,
+        finished_at=timezone.now(),
+        last_error='',
+    )
+    logger.info(f"Ingestion job for {job.summoner_name} done.")
+
+
+def ingestion_job_status(job: IngestionJobModel) -> dict:
+    return {
+        "status": job.status,
+        "active": job.status in (IngestionJobModel.PENDING, IngestionJobModel.RUNNING),
+        "matches_done": job.matches_done,
+        "matches_total": job.matches_total,
+    }
+
+
+class IngestionQueue:
+    def enqueue_ingestion(self) -> IngestionJobModel:
+        '''
+        Enqueues the background sync of the summoner's matches.
+        '''
+        has_cursor = SummonerModel.objects.filter(summoner_puuid=self.puuid, last_match_id__isnull=False).exists()
+        priority = PRIORITY_REFRESH if has_cursor else PRIORITY_NEW_SUMMONER
+        return enqueue_ingestion_job(self.puuid, self.summoner_name, self.region, priority)
+
+    def ingestion_status(self) -> dict:
+        '''
+        Returns the status and progress of the summoner's ingestion job, or None if it was never enqueued.
+        '''
+        job = IngestionJobModel.objects.filter(summoner_puuid=self.puuid).first()
+        if job is None:
+            return None
+        return ingestion_job_status(job)
+
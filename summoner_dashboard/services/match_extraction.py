@@ -0,0 +1,90 @@
+'''
+Extraction of the stats the app stores from a match/v5 payload. Pure functions, without database
+or API access, so the same code runs when a match is downloaded and when the archived payloads are
+reprocessed (see reprocess.py).
+'''
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def calculate_kda(kills: int, deaths: int, assists: int) -> float:
+    kda = (kills + assists) / (deaths if deaths != 0 else 1)
+    return round(kda, 2)
+
+
+def participant_data(participant: dict) -> dict:
+    # Solo se leen las claves que se guardan (el participante trae mas de cien)
+    kills, deaths, assists = participant["kills"], participant["deaths"], participant["assists"]
+    return {
+        "puuid": participant["puuid"],
+        "summoner_name": participant["summonerName"],
+        "champion_name": participant["championName"],
+        "team_id": participant["teamId"],
+        "team_position": participant["teamPosition"],
+        "win": 1 if participant["win"] else 0,
+        "kills": kills,
+        "deaths": deaths,
+        "assists": assists,
+        "kda": calculate_kda(kills, deaths, assists),
+        "cs": participant["totalMinionsKilled"] + participant["neutralMinionsKilled"],
+        "vision": participant["visionScore"],
+        "summoner_spell1": participant["summoner1Id"],
+        "summoner_spell2": participant["summoner2Id"],
+        "item0": participant["item0"],
+        "item1": participant["item1"],
+        "item2": participant["item2"],
+        "item3": participant["item3"],
+        "item4": participant["item4"],
+        "item5": participant["item5"],
+        "item6": participant["item6"],
+        "champion_level": participant["champLevel"],
+        "gold_earned": participant["goldEarned"],
+        "damage_dealt_to_champions": participant["totalDamageDealtToChampions"],
+        "damage_taken": participant["totalDamageTaken"],
+        "wards_placed": participant["wardsPlaced"],
+        "wards_killed": participant["wardsKilled"],
+    }
+
+
+def match_info_data(match_request: dict) -> dict:
+    return {
+        "game_mode": match_request["info"]["gameMode"],
+        "game_duration": match_request["info"]["gameDuration"],
+        "queue_id": match_request["info"]["queueId"],
+        "game_end_timestamp": match_request["info"].get("gameEndTimestamp", 0),
+    }
+
+
+def extract_match_data(match_id: str, match_request: dict, puuid: str = None) -> dict:
+    '''
+    Returns the match data, the data of the summoner with the given puuid and the data of every participant,
+    or None if the payload doesn't have the expected format or the summoner isn't in the match.
+    Without a puuid, summoner_data is None.
+    '''
+    # Manejo la posibilidad de que haya cambiado el formato de los datos dispuesto por la API de Riot Games
+    if "info" not in match_request or "participants" not in match_request["info"]:
+        logger.warning(f"Unexpected format of data for match_id {match_id}: {match_request}")
+        return None
+
+    summoner_data = None
+    participants_data = []
+
+    # Una sola pasada: los datos del summoner son los de su participante (como en _matches_data_from_participants)
+    for participant in match_request["info"]["participants"]:
+        data = participant_data(participant)
+        participants_data.append(data)
+
+        if data["puuid"] == puuid:
+            summoner_data = {"summoner_puuid": puuid, **data}
+
+    if puuid is not None and summoner_data is None:
+        logger.warning(f"No summoner data found for match_id {match_id} and puuid {puuid}")
+        return None
+
+    return {
+        "match_data": match_info_data(match_request),
+        "summoner_data": summoner_data,
+        "participants_data": participants_data,
+    }
@@ -0,0 +1,51 @@
+from ..utils import get_game_type
+
+
+class MatchRecord:
+    '''
+    Compact representation of one of the summoner's matches, used from the database query
+    to the template context without copying it into intermediate dicts.
+
+    It is built straight from a values_list() row of MatchModel (see FIELDS) and the match's rows of
+    ParticipantModel (see PARTICIPANT_FIELDS), in participant order. The JSON columns of MatchModel are
+    only used for the matches stored before ParticipantModel, which have no participant rows.
+    '''
+    FIELDS = (
+        "match_id", "game_end_timestamp", "queue_id", "game_mode", "game_duration", "win", "champion_name",
+        "kills", "deaths", "assists", "kda", "cs", "vision", "summoner_spell1", "summoner_spell2",
+        "item0", "item1", "item2", "item3", "item4", "item5", "item6",
+        "participant_summoner_names", "participant_champion_names", "participant_team_ids",
+    )
+    PARTICIPANT_FIELDS = ("summoner_name", "champion_name", "team_id")
+
+    __slots__ = (
+        "match_id", "game_end_timestamp", "queue_id", "game_mode", "game_duration", "win", "champion_name",
+        "kills", "deaths", "assists", "kda_ratio", "cs", "vision", "summoner_spell_ids", "item_ids",
+        "participant_summoner_names", "participant_champion_names", "participant_team_ids",
+    )
+
+    def __init__(self, row: tuple, participants: list = ()) -> None:
+        (
+            self.match_id, self.game_end_timestamp, self.queue_id, self.game_mode, self.game_duration,
+            self.win, self.champion_name, kills, deaths, assists, self.kda_ratio, self.cs, self.vision,
+            spell1, spell2, item0, item1, item2, item3, item4, item5, item6,
+            summoner_names, champion_names, team_ids,
+        ) = row
+        if participants:
+            summoner_names, champion_names, team_ids = (list(column) for column in zip(*participants))
+        self.participant_summoner_names = summoner_names or []
+        self.participant_champion_names = champion_names or []
+        self.participant_team_ids = team_ids or []
+        # Las kills, deaths y assists se guardan como float
+        self.kills = int(kills)
+        self.deaths = int(deaths)
+        self.assists = int(assists)
+        self.summoner_spell_ids = (spell1, spell2)
+        self.item_ids = (item0, item1, item2, item3, item4, item5, item6)
+
+    @property
+    def game_type(self) -> str:
+        return get_game_type(self.queue_id)
+
+    def __repr__(self) -> str:
+        return f"MatchRecord({self.match_id})"
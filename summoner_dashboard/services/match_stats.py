@@ -1,75 +1,160 @@
-from ..models import ChampionStatsModel, MatchModel
+from ..metrics import instrumented
+from ..models import ChampionStatsModel, MatchModel, SummonerModel
 from django.db.models import F
-from typing import List
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Count, Sum, Avg, F, FloatField, ExpressionWrapper
-from django.db.models import OuterRef, Exists
+from typing import Iterable, List
+from django.db.models import Count, Sum
+from .match_extraction import calculate_kda
+from .match_record import MatchRecord
 
 
 RECENT_MATCHES_LIMIT = 10
 TOP_CHAMPIONS_LIMIT = 5
+RANKED_QUEUE_IDS = [420, 440] # Solo se tienen en cuenta soloq y flex
+CHAMPION_STATS_FIELDS = [
+    'matches_played', 'wins', 'losses', 'wr', 'kda', 'kills', 'deaths', 'assists', 'cs',
+    'total_kills', 'total_deaths', 'total_assists', 'total_cs',
+]
 
-class MatchStats:
-    def recent_matches_data(self) -> List[dict]:
-        matches_data = self._matches_data_from_db()
-        self.update_champion_stats()
+def encode_matches_cursor(match: MatchRecord) -> str:
+    return f"{match.game_end_timestamp}:{match.match_id}"
 
-        if not matches_data:
-            return []
-        
-        def match_id_key(match_data):
-            return match_data['match_id']
 
-        matches_data.sort(key=match_id_key, reverse=True)
-        recent_matches_data = matches_data[:RECENT_MATCHES_LIMIT]
+def decode_matches_cursor(cursor: str) -> tuple:
+    '''
+    Returns the (game_end_timestamp, match_id) of a cursor, or None without one. Raises ValueError if it is invalid.
+    '''
+    if not cursor:
+        return None
+    # Un cursor invalido no es la primera pagina: "cargar mas" anadiria partidas repetidas
+    game_end_timestamp, separator, match_id = cursor.partition(":")
+    if not separator or not match_id:
+        raise ValueError(f"Invalid matches cursor: {cursor}")
+    return int(game_end_timestamp), match_id
+
+
+def set_champion_averages(stats: ChampionStatsModel) -> None:
+    # Las medias salen de los totales acumulados
+    played = stats.matches_played
+    stats.losses = played - stats.wins
+    stats.wr = stats.wins * 100.0 / played
+    stats.kda = (stats.total_kills + stats.total_assists) / (stats.total_deaths + 0.001)
+    stats.kills = round(stats.total_kills / played)
+    stats.deaths = round(stats.total_deaths / played)
+    stats.assists = round(stats.total_assists / played)
+    stats.cs = round(stats.total_cs / played)
+
+
+def rebuild_champion_stats(summoner_puuids: Iterable[str]) -> None:
+    '''
+    Recomputes from scratch the champion stats of the summoners from their stored soloq and flex matches,
+    for when their matches are rewritten instead of added. Run it inside the transaction that rewrites them.
+    '''
+    summoner_puuids = list(summoner_puuids)
+    totals = MatchModel.objects.filter(
+        summoner_id__in=summoner_puuids, queue_id__in=RANKED_QUEUE_IDS
+    ).values('summoner_id', 'champion_name').annotate(
+        matches_played=Count('id'),
+        wins=Sum('win'),
+        total_kills=Sum('kills'),
+        total_deaths=Sum('deaths'),
+        total_assists=Sum('assists'),
+        total_cs=Sum('cs'),
+    )
+    
+    champion_stats = []
+    for row in totals:
+        stats = ChampionStatsModel(
+            summoner_id=row['summoner_id'],
+            champion_name=row['champion_name'],
+            matches_played=row['matches_played'],
+            wins=row['wins'],
+            total_kills=int(row['total_kills']),
+            total_deaths=int(row['total_deaths']),
+            total_assists=int(row['total_assists']),
+            total_cs=row['total_cs'],
+        )
+        set_champion_averages(stats)
+        champion_stats.append(stats)
+    
+    ChampionStatsModel.objects.filter(summoner_id__in=summoner_puuids).delete()
+    ChampionStatsModel.objects.bulk_create(champion_stats, batch_size=500)
+
 
-        return recent_matches_data
+class MatchStats:
+    def recent_matches_data(self) -> List[MatchRecord]:
+        return self.recent_matches_page()[0]
+    
+    
+    @instrumented
+    def recent_matches_page(self, before: str = None, limit: int = RECENT_MATCHES_LIMIT) -> tuple:
+        '''
+        Returns (matches, next_cursor): a page of stored matches, most recent first, and the cursor
+        to request the next page, or None if there are no more matches. Raises ValueError if before is invalid.
+        '''
+        # Pido una de mas para saber si hay otra pagina
+        matches_data = self._matches_data_from_db(limit + 1, decode_matches_cursor(before))
+        
+        next_cursor = None
+        if len(matches_data) > limit:
+            matches_data = matches_data[:limit]
+            next_cursor = encode_matches_cursor(matches_data[-1])
+        
+        return matches_data, next_cursor
     
     
     def calculate_kda(self, kills: int, deaths: int, assists: int) -> float:
-        kda = (kills + assists) / (deaths if deaths != 0 else 1)
-        return round(kda, 2)
+        return calculate_kda(kills, deaths, assists)
 
     def calculate_average(self, value: int, total_games: int) -> float:
         return round(value / total_games, 1)
     
     
-    def update_champion_stats(self):
-        matches = MatchModel.objects.values(
-            'summoner',
-            'champion_name'
-        ).filter(
-            queue_id__in= [420, 440] # Filtro para obtener solo los datos de soloq y flex
-        ).annotate(
-            matches_played= Count('match_id'),
-            wins= Sum('win'),
-            losses= ExpressionWrapper(Count('match_id') - Sum('win'), output_field=FloatField()),
-            wr= ExpressionWrapper(Sum('win') * 100.0 / Count('match_id'), output_field=FloatField()),
-            kda= ExpressionWrapper((Sum('kills') + Sum('assists')) / (Sum('deaths') + 0.001), output_field=FloatField()),
-            kills= Avg('kills'),
-            deaths= Avg('deaths'),
-            assists= Avg('assists'),
-            cs= Avg('cs')
-        )
+    @instrumented
+    def update_champion_stats(self, summoner: SummonerModel, new_matches: List[MatchModel]) -> None:
+        '''
+        Applies newly stored matches to the summoner's champion stats, only for soloq and flex.
+        Only the affected (summoner, champion) rows are read and written, in bulk.
+        '''
+        deltas = {}
+        for match in new_matches:
+            if match.queue_id not in RANKED_QUEUE_IDS:
+                continue
+            delta = deltas.setdefault(match.champion_name, {
+                'matches_played': 0, 'wins': 0, 'total_kills': 0, 'total_deaths': 0, 'total_assists': 0, 'total_cs': 0,
+            })
+            delta['matches_played'] += 1
+            delta['wins'] += match.win
+            delta['total_kills'] += int(match.kills)
+            delta['total_deaths'] += int(match.deaths)
+            delta['total_assists'] += int(match.assists)
+            delta['total_cs'] += match.cs
+        
+        if not deltas:
+            return
+        
+        existing_stats = {
+            stats.champion_name: stats
+            for stats in ChampionStatsModel.objects.filter(summoner=summoner, champion_name__in=deltas)
+        }
+        new_stats = []
         
-        for match in matches:
-            defaults = {
-                'matches_played': match['matches_played'],
-                'wins': match['wins'],
-                'losses': match['losses'],
-                'wr': match['wr'],
-                'kda': match['kda'],
-                'kills': match['kills'],
-                'deaths': match['deaths'],
-                'assists': match['assists'],
-                'cs': match['cs']
-            }
-            ChampionStatsModel.objects.update_or_create(
-                summoner_id= match['summoner'],
-                champion_name= match['champion_name'],
-                defaults= defaults
-            )
+        for champion_name, delta in deltas.items():
+            stats = existing_stats.get(champion_name)
+            if stats is None:
+                stats = ChampionStatsModel(summoner=summoner, champion_name=champion_name, matches_played=0, wins=0)
+                new_stats.append(stats)
+            
+            for field, value in delta.items():
+                setattr(stats, field, getattr(stats, field) + value)
+            set_champion_averages(stats)
+        
+        ChampionStatsModel.objects.bulk_create(new_stats)
+        ChampionStatsModel.objects.bulk_update(
+            [stats for stats in existing_stats.values() if stats.champion_name in deltas],
+            fields=CHAMPION_STATS_FIELDS,
+        )
         
+    @instrumented
     def top_champions_data(self, top=TOP_CHAMPIONS_LIMIT):
         top_champions = ChampionStatsModel.objects.filter(
             summoner_id= self.puuid
@@ -93,6 +178,7 @@ class MatchStats:
         
         return top_champions_list
         
+    @instrumented
     def role_data(self) -> dict:
         roles = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
         
@@ -2,47 +2,62 @@ import roman
 
 from typing import Dict, Any
 
+from django.utils import timezone
+
+from ..locks import single_flight
+from ..models import IngestionJobModel
+from .db_handler import UPDATE_THRESHOLD
+
+
+SUMMONER_REFRESH_WAIT = 10 # Segundos que espera una peticion a que otra termine de dar de alta al summoner
+LEAGUE_ENTRIES_METHOD = "league-v4.getLeagueEntriesForSummoner"
+
+
+def ranks_from_league_entries(league_entries: list, profile_icon_id: int, summoner_level: int) -> Dict[str, Any]:
+    '''
+    Builds the soloq and flex ranks dict from the league/v4 entries of a summoner.
+    '''
+    ranks = {
+        "soloq_rank": "Unranked",
+        "soloq_lp": 0,
+        "soloq_wins": 0,
+        "soloq_losses": 0,
+        "soloq_wr": 0,
+        "flex_rank": "Unranked",
+        "flex_lp": 0,
+        "flex_wins": 0,
+        "flex_losses": 0,
+        "flex_wr": 0,
+        "profile_icon_id": profile_icon_id,
+        "summoner_level": summoner_level,
+    }
+    
+    # Itero sobre las 2 entradas (soloq y flex) porque cada solicitud devuelve la info de las colas en orden aleatorio.
+    for entry in league_entries:
+        win_rate = int(round((entry['wins'] / (entry['wins'] + entry['losses'])) * 100))
+        if entry["queueType"] == "RANKED_SOLO_5x5":
+            ranks["soloq_rank"] = f"{entry['tier']} {roman.fromRoman(entry['rank'])}"
+            ranks["soloq_lp"] = entry['leaguePoints']
+            ranks["soloq_wins"] = entry['wins']
+            ranks["soloq_losses"] = entry['losses']
+            ranks["soloq_wr"] = win_rate
+        elif entry["queueType"] == "RANKED_FLEX_SR":
+            ranks["flex_rank"] = f"{entry['tier']} {roman.fromRoman(entry['rank'])}"
+            ranks["flex_lp"] = entry['leaguePoints']
+            ranks["flex_wins"] = entry['wins']
+            ranks["flex_losses"] = entry['losses']
+            ranks["flex_wr"] = win_rate
+    return ranks
 
 
 class RankedData:
     def league_entries(self) -> Dict[str, Any]:
         endpoint = f"league/v4/entries/by-summoner/{self.id}"
-        return self._get(endpoint)
+        return self._get(endpoint, method=LEAGUE_ENTRIES_METHOD)
     
     def fetch_summoner_ranks(self)-> Dict[str, str]:
         '''Retorna el rank de soloq y flex en formato Dict'''
-        league_entries = self.league_entries()
-        ranks = {
-            "soloq_rank": "Unranked",
-            "soloq_lp": 0,
-            "soloq_wins": 0,
-            "soloq_losses": 0,
-            "soloq_wr": 0,
-            "flex_rank": "Unranked",
-            "flex_lp": 0,
-            "flex_wins": 0,
-            "flex_losses": 0,
-            "flex_wr": 0,
-            "profile_icon_id": self.summoner_icon_id(),
-            "summoner_level": self.summoner_level(),
-        }
-        
-        # Itero sobre las 2 entradas (soloq y flex) porque cada solicitud devuelve la info de las colas en orden aleatorio.
-        for entry in league_entries:
-            win_rate = int(round((entry['wins'] / (entry['wins'] + entry['losses'])) * 100))
-            if entry["queueType"] == "RANKED_SOLO_5x5":
-                ranks["soloq_rank"] = f"{entry['tier']} {roman.fromRoman(entry['rank'])}"
-                ranks["soloq_lp"] = entry['leaguePoints']
-                ranks["soloq_wins"] = entry['wins']
-                ranks["soloq_losses"] = entry['losses']
-                ranks["soloq_wr"] = win_rate
-            elif entry["queueType"] == "RANKED_FLEX_SR":
-                ranks["flex_rank"] = f"{entry['tier']} {roman.fromRoman(entry['rank'])}"
-                ranks["flex_lp"] = entry['leaguePoints']
-                ranks["flex_wins"] = entry['wins']
-                ranks["flex_losses"] = entry['losses']
-                ranks["flex_wr"] = win_rate
-        return ranks
+        return ranks_from_league_entries(self.league_entries(), self.summoner_icon_id(), self.summoner_level())
     
     def soloq_rank(self) -> str:
         return self.fetch_summoner_ranks()['soloq_rank']
@@ -50,22 +65,43 @@ class RankedData:
     def flex_rank(self) -> str:
         return self.fetch_summoner_ranks()['flex_rank']
     
+    def refresh_if_stale(self, summoner_data: dict) -> IngestionJobModel:
+        '''
+        Stale-while-revalidate: the stored data is served as is, and if it is older than UPDATE_THRESHOLD
+        a background refresh (ranks and new matches) is enqueued. Returns the job, or None if the data is fresh.
+        '''
+        last_update = summoner_data.get("last_update")
+        if last_update is not None and timezone.now() - last_update < UPDATE_THRESHOLD:
+            return None
+        return self.enqueue_ingestion()
+    
     def league_data(self) -> dict:
         '''
         Intenta obtener los datos de soloq y flex desde la base de datos. Si no existen, los solicita a la API con fetch_summoner_ranks() y los guarda en la base de datos.
-        Además, si han pasado más de una hora desde la última actualización, actualiza los datos de partidas y la información del invocador en la base de datos.
+        Si los datos guardados tienen más de UPDATE_THRESHOLD, se devuelven igualmente y se encola su actualización en segundo plano.
         '''
         
         summoner_data = self._summoner_data_from_db()
         
+        if summoner_data:
+            self.refresh_if_stale(summoner_data)
+            return summoner_data
+        
+        # Si otra peticion ya esta dando de alta a este summoner, espero a que acabe y uso lo que ha guardado
+        with single_flight(f"league_data:{self.puuid}", wait=SUMMONER_REFRESH_WAIT) as leader:
+            if leader:
+                data = self.fetch_summoner_ranks()
+                self.handle_summoner_data(data)
+                return data
+        
+        summoner_data = self._summoner_data_from_db()
         if summoner_data:
             return summoner_data
-        else:
-            
-            data = self.fetch_summoner_ranks()
-            self.handle_summoner_data(data)
-            
-            return data
+        
+        # El otro refresco no termino a tiempo o fallo: lo pido yo
+        data = self.fetch_summoner_ranks()
+        self.handle_summoner_data(data)
+        return data
     
     def total_ranked_games_played_per_queue(self) -> tuple:
         league_entries = self.league_entries()
@@ -0,0 +1,148 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import logging
+import os
+
+from django.db import connections, transaction
+
+from ..match_archive import MatchArchive
+from ..models import MatchDetailModel, MatchModel, ParticipantModel, SummonerModel
+from .db_handler import PARTICIPANT_FIELDS, build_match_model
+from .match_extraction import extract_match_data
+from .match_stats import rebuild_champion_stats
+
+
+logger = logging.getLogger(__name__)
+REPROCESS_BATCH_SIZE = 200
+MATCH_DETAIL_FIELDS = ["game_mode", "game_duration", "queue_id", "game_end_timestamp"]
+MATCH_FIELDS = [
+    field.name for field in MatchModel._meta.concrete_fields
+    if field.name not in ("id", "summoner", "match_id")
+]
+
+
+def extract_archived_matches(archive_path: str, matches: list) -> list:
+    '''
+    Reads the archived payloads of a batch of (match_id, payload_digest) and returns [(match_id, match data)]
+    with the data of every participant. Runs in the worker processes: no database access.
+    '''
+    archive = MatchArchive(archive_path)
+    extracted = []
+
+    for match_id, payload_digest in matches:
+        try:
+            payload = archive.get(payload_digest)
+        except KeyError:
+            logger.warning(f"Payload of match {match_id} not found in the archive.")
+            continue
+
+        game_data = extract_match_data(match_id, payload)
+        if game_data is not None:
+            extracted.append((match_id, game_data))
+
+    return extracted
+
+
+def save_reprocessed_matches(extracted: list) -> int:
+    '''
+    Overwrites the stored match details, participants and summoners' matches with the extracted data,
+    and rebuilds the champion stats of the summoners whose matches changed.
+    '''
+    games_data = dict(extracted)
+
+    with transaction.atomic():
+        MatchDetailModel.objects.bulk_update(
+            [
+                MatchDetailModel(match_id=match_id, **{
+                    field: game_data["match_data"][field] for field in MATCH_DETAIL_FIELDS
+                })
+                for match_id, game_data in extracted
+            ],
+            MATCH_DETAIL_FIELDS,
+        )
+
+        # Los participantes se reemplazan enteros: pueden cambiar los campos que se extraen
+        ParticipantModel.objects.filter(match_id__in=games_data).delete()
+        ParticipantModel.objects.bulk_create([
+            ParticipantModel(
+                match_id=match_id,
+                participant_index=index,
+                **{field: participant_data[field] for field in PARTICIPANT_FIELDS},
+            )
+            for match_id, game_data in extracted
+            for index, participant_data in enumerate(game_data["participants_data"])
+        ])
+
+        matches = []
+        for match in MatchModel.objects.filter(match_id__in=games_data).only("id", "match_id", "summoner_id"):
+            game_data = games_data[match.match_id]
+            participant_data = next(
+                (data for data in game_data["participants_data"] if data["puuid"] == match.summoner_id), None
+            )
+            if participant_data is None:
+                continue
+
+            summoner = SummonerModel(summoner_puuid=match.summoner_id)
+            summoner_data = {"summoner_puuid": match.summoner_id, **participant_data}
+            updated_match = build_match_model(summoner, match.match_id, {**game_data, "summoner_data": summoner_data})
+            updated_match.pk = match.pk
+            matches.append(updated_match)
+
+        MatchModel.objects.bulk_update(matches, MATCH_FIELDS)
+        # Los totales de campeones se sumaron con los datos viejos de las partidas
+        rebuild_champion_stats({match.summoner_id for match in matches})
+
+    return len(extracted)
+
+
+def reprocess_archived_matches(archive: MatchArchive, puuid: str = None, workers: int = None,
+                               batch_size: int = REPROCESS_BATCH_SIZE, progress=None) -> int:
+    '''
+    Extracts again the stats of every archived match (or only the summoner's matches, with a puuid) from
+    its payload, without calling the API, and saves them. Returns the number of matches reprocessed.
+
+    Decompressing, parsing and extracting run in `workers` processes (one per CPU by default);
+    this process only saves the results, one transaction per batch.
+    If progress is given, it is called with (matches processed, total) after each batch.
+    '''
+    matches = MatchDetailModel.objects.exclude(payload_digest="")
+    if puuid is not None:
+        matches = matches.filter(participants__puuid=puuid)
+    matches = list(matches.order_by("match_id").values_list("match_id", "payload_digest"))
+    batches = [matches[start:start + batch_size] for start in range(0, len(matches), batch_size)]
+
+    workers = workers or os.cpu_count() or 1
+    extract = partial(extract_archived_matches, archive.path)
+    reprocessed = 0
+    done = 0
+
+    if workers == 1:
+        results = (extract(batch) for batch in batches)
+    else:
+        # Los procesos hijos no usan la base de datos: que no hereden las conexiones abiertas
+        connections.close_all()
+        results = _map_bounded(ProcessPoolExecutor(max_workers=workers), extract, batches, 2 * workers)
+
+    for batch, extracted in zip(batches, results):
+        reprocessed += save_reprocessed_matches(extracted)
+        done += len(batch)
+        if progress is not None:
+            progress(done, len(matches))
+
+    logger.info(f"Reprocessed {reprocessed} of {len(matches)} archived matches.")
+    return reprocessed
+
+
+def _map_bounded(executor, function, items: list, max_pending: int):
+    # Como executor.map pero sin mandar mas de max_pending lotes a la vez: los resultados no se acumulan en memoria
+    pending = deque()
+    items = iter(items)
+    with executor:
+        while True:
+            for item in islice(items, max_pending - len(pending)):
+                pending.append(executor.submit(function, item))
+            if not pending:
+                break
+            yield pending.popleft().result()
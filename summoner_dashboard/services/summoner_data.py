@@ -1,8 +1,12 @@
+from ..models import SummonerModel
 from .api_handler import APIHandler
 from .db_handler import DatabaseHandler
+from .ingestion_queue import IngestionQueue
 from .match_stats import MatchStats
 from .ranked_data import RankedData
+from .summoner_identity import resolve_summoner_identity
 from .summoner_info import SummonerInfo
+from .summoner_profile import SummonerProfile
 
 
 
@@ -10,7 +14,7 @@ REGION_DEFAULT = "euw1"
 BASE_URL_TEMPLATE = "https://{region}.api.riotgames.com/lol/"
 
 
-class SummonerData(SummonerInfo, DatabaseHandler, APIHandler, RankedData, MatchStats):
+class SummonerData(SummonerInfo, DatabaseHandler, APIHandler, RankedData, MatchStats, IngestionQueue, SummonerProfile):
     def __init__(self, summoner_name: str, api_key: str, region: str = REGION_DEFAULT) -> None:
         self.api_key = api_key
         self.region = region
@@ -18,15 +22,25 @@ class SummonerData(SummonerInfo, DatabaseHandler, APIHandler, RankedData, MatchS
         self.base_url = BASE_URL_TEMPLATE.format(region=region)
         
         self._summoner_info = None
-        self.id = self.summoner_id()
-        
-        summoner_data = self._summoner_data_from_db()
+        self._responses = {}
+        # Sin llamadas a la API si el summoner ya esta en cache o guardado en la base de datos
+        self.id, self.puuid, self.icon_id, self.level = resolve_summoner_identity(summoner_name, region, self.summoner_info)
+    
+    @classmethod
+    def from_db(cls, summoner: SummonerModel, api_key: str) -> "SummonerData":
+        '''
+        Builds a SummonerData for a summoner already stored in the database, without calling the API.
+        '''
+        self = cls.__new__(cls)
+        self.api_key = api_key
+        self.region = summoner.region
+        self.summoner_name = summoner.summoner_name
+        self.base_url = BASE_URL_TEMPLATE.format(region=summoner.region)
         
-        if summoner_data is not None:
-            self.puuid = summoner_data["summoner_puuid"]
-            self.icon_id = summoner_data["profile_icon_id"]
-            self.level = summoner_data["summoner_level"]
-        else:
-            self.puuid = self.summoner_puuid()
-            self.icon_id = self.summoner_icon_id()
-            self.level = self.summoner_level()
\ No newline at end of file
+        self._summoner_info = None
+        self._responses = {}
+        self.id = summoner.summoner_id
+        self.puuid = summoner.summoner_puuid
+        self.icon_id = summoner.profile_icon_id
+        self.level = summoner.summoner_level
+        return self
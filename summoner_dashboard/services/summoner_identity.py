@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from datetime import timedelta
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, NamedTuple
+
+from ..circuit_breaker import CircuitOpenError
+from ..models import SummonerModel, normalize_summoner_name
+from ..utils import RiotAPIError
+
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_TTL = timedelta(days=1) # Un summoner puede cambiar de nombre: la resolucion nombre -> puuid caduca
+IDENTITY_CACHE_SIZE = 1024
+
+
+class SummonerIdentity(NamedTuple):
+    id: str
+    puuid: str
+    icon_id: int
+    level: int
+
+
+class SummonerIdentityCache:
+    '''
+    In-process LRU of (region, normalized name) -> SummonerIdentity, with an expiry time per entry.
+    '''
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> SummonerIdentity:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return identity
+
+    def set(self, key: tuple, identity: SummonerIdentity, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (identity, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+summoner_identity_cache = SummonerIdentityCache()
+
+
+def _model_identity(summoner: SummonerModel) -> SummonerIdentity:
+    return SummonerIdentity(
+        summoner.summoner_id, summoner.summoner_puuid, summoner.profile_icon_id, summoner.summoner_level
+    )
+
+
+def _stored_identity(summoner: SummonerModel, key: tuple) -> SummonerIdentity:
+    # La resolucion guardada en la base de datos solo vale si el summoner se actualizo hace menos de IDENTITY_TTL
+    if summoner is None or summoner.last_update is None:
+        return None
+    expires_at = (summoner.last_update + IDENTITY_TTL).timestamp()
+    if expires_at <= time.time():
+        return None
+    identity = _model_identity(summoner)
+    summoner_identity_cache.set(key, identity, expires_at)
+    return identity
+
+
+def _fetched_identity(summoner_info: dict, key: tuple) -> SummonerIdentity:
+    identity = SummonerIdentity(
+        summoner_info["id"], summoner_info["puuid"], summoner_info["profileIconId"], summoner_info["summonerLevel"]
+    )
+    summoner_identity_cache.set(key, identity, time.time() + IDENTITY_TTL.total_seconds())
+    return identity
+
+
+def _fallback_identity(summoner: SummonerModel, error: Exception) -> SummonerIdentity:
+    # Sin API la resolucion guardada vale aunque haya caducado: la pagina se sirve y el refresco en segundo
+    # plano la actualiza. No se guarda en la cache, para volver a intentarlo en la siguiente peticion
+    if summoner is None:
+        raise error
+    logger.warning(f"Using the stored identity of {summoner.summoner_name}, the API is not available: {error}")
+    return _model_identity(summoner)
+
+
+def resolve_summoner_identity(summoner_name: str, region: str, fetch_summoner_info: Callable[[], dict]) -> SummonerIdentity:
+    '''
+    Resolves a summoner name to its ids, icon and level without calling the API when possible:
+    first the in-process cache, then the summoner stored in the database if it was updated less
+    than IDENTITY_TTL ago, and only then fetch_summoner_info() (summoner/v4/summoners/by-name).
+    If the API can't be reached, the stored summoner is used whatever its age.
+
+    Names are compared like Riot does, ignoring case and whitespace.
+    '''
+    key = (region, normalize_summoner_name(summoner_name))
+    identity = summoner_identity_cache.get(key)
+    if identity is not None:
+        return identity
+
+    summoner = SummonerModel.objects.by_name(summoner_name).filter(region=region).first()
+    identity = _stored_identity(summoner, key)
+    if identity is not None:
+        return identity
+
+    try:
+        return _fetched_identity(fetch_summoner_info(), key)
+    except (CircuitOpenError, RiotAPIError) as e:
+        return _fallback_identity(summoner, e)
+
+
+async def aresolve_summoner_identity(summoner_name: str, region: str, afetch_summoner_info: Callable[[], Awaitable[dict]]) -> SummonerIdentity:
+    '''
+    Async version of resolve_summoner_identity(), with the async ORM and an async fetch.
+    '''
+    key = (region, normalize_summoner_name(summoner_name))
+    identity = summoner_identity_cache.get(key)
+    if identity is not None:
+        return identity
+
+    summoner = await SummonerModel.objects.by_name(summoner_name).filter(region=region).afirst()
+    identity = _stored_identity(summoner, key)
+    if identity is not None:
+        return identity
+
+    try:
+        return _fetched_identity(await afetch_summoner_info(), key)
+    except (CircuitOpenError, RiotAPIError) as e:
+        return _fallback_identity(summoner, e)
@@ -1,8 +1,11 @@
+SUMMONER_BY_NAME_METHOD = "summoner-v4.getBySummonerName"
+
+
 class SummonerInfo:
     def summoner_info(self):
         if not self._summoner_info:
             endpoint = f"summoner/v4/summoners/by-name/{self.summoner_name}"
-            self._summoner_info = self._get(endpoint)
+            self._summoner_info = self._get(endpoint, method=SUMMONER_BY_NAME_METHOD)
         return self._summoner_info
     
     def summoner_id(self) -> str:
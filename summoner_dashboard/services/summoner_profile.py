@@ -0,0 +1,142 @@
+from datetime import timezone as dt_timezone
+import json
+
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..metrics import instrumented
+from ..models import ChampionStatsModel, MatchModel, ParticipantModel, SummonerModel
+from .match_record import MatchRecord
+from .match_stats import RECENT_MATCHES_LIMIT, TOP_CHAMPIONS_LIMIT, encode_matches_cursor
+
+
+ROLES = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+SUMMONER_FIELDS = [
+    "summoner_puuid", "last_update", "profile_icon_id", "summoner_level",
+    "soloq_rank", "soloq_lp", "soloq_wins", "soloq_losses", "soloq_wr",
+    "flex_rank", "flex_lp", "flex_wins", "flex_losses", "flex_wr",
+]
+TOP_CHAMPIONS_FIELDS = ["champion_name", "matches_played", "wr", "kda", "kills", "deaths", "assists", "cs"]
+JSON_MATCH_FIELDS = ["participant_summoner_names", "participant_champion_names", "participant_team_ids"]
+
+# Funciones JSON de cada base de datos: (construir un array, agregar filas en un array, leer una columna JSONField)
+JSON_FUNCTIONS = {
+    "postgresql": ("json_build_array", "json_agg", "{}"),
+    "sqlite": ("json_array", "json_group_array", "json({})"),
+}
+
+PROFILE_QUERY = '''
+WITH roles AS (
+    SELECT team_position, COUNT(*) AS matches
+    FROM {match_table}
+    WHERE summoner_id = %s
+    GROUP BY team_position
+), top_champions AS (
+    SELECT {top_champions_fields},
+        ROW_NUMBER() OVER (ORDER BY matches_played DESC, wr DESC, kda DESC) AS position
+    FROM {champion_stats_table}
+    WHERE summoner_id = %s
+    ORDER BY matches_played DESC, wr DESC, kda DESC
+    LIMIT %s
+), recent_matches AS (
+    SELECT {match_fields},
+        (
+            SELECT {agg}({array}(participant_index, {participant_fields}))
+            FROM {participant_table}
+            WHERE {participant_table}.match_id = {match_table}.match_id
+        ) AS participants,
+        ROW_NUMBER() OVER (ORDER BY game_end_timestamp DESC, match_id DESC) AS position
+    FROM {match_table}
+    WHERE summoner_id = %s
+    ORDER BY game_end_timestamp DESC, match_id DESC
+    LIMIT %s
+)
+SELECT
+    (SELECT {array}({summoner_fields}) FROM {summoner_table} WHERE summoner_puuid = %s),
+    (SELECT {agg}({array}(team_position, matches)) FROM roles),
+    (SELECT {agg}({array}(position, {top_champions_fields})) FROM top_champions),
+    (SELECT {agg}({array}(position, {recent_match_fields}, {participants})) FROM recent_matches)
+'''
+
+
+def _profile_query() -> str:
+    array, agg, json_column = JSON_FUNCTIONS.get(connection.vendor, JSON_FUNCTIONS["postgresql"])
+    return PROFILE_QUERY.format(
+        summoner_table=SummonerModel._meta.db_table,
+        match_table=MatchModel._meta.db_table,
+        champion_stats_table=ChampionStatsModel._meta.db_table,
+        participant_table=ParticipantModel._meta.db_table,
+        summoner_fields=", ".join(SUMMONER_FIELDS),
+        top_champions_fields=", ".join(TOP_CHAMPIONS_FIELDS),
+        match_fields=", ".join(MatchRecord.FIELDS),
+        participant_fields=", ".join(MatchRecord.PARTICIPANT_FIELDS),
+        recent_match_fields=", ".join(
+            json_column.format(field) if field in JSON_MATCH_FIELDS else field for field in MatchRecord.FIELDS
+        ),
+        participants=json_column.format("participants"),
+        array=array,
+        agg=agg,
+    )
+
+
+def _json_value(value):
+    # psycopg2 ya devuelve los json decodificados, sqlite devuelve texto
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _ordered_rows(value) -> list:
+    # Los agregados JSON no garantizan el orden: cada fila lleva su posicion (ROW_NUMBER) delante
+    return [row[1:] for row in sorted(_json_value(value) or [], key=lambda row: row[0])]
+
+
+class SummonerProfile:
+    @instrumented
+    def profile_data(self, recent_matches_limit: int = RECENT_MATCHES_LIMIT, top_champions_limit: int = TOP_CHAMPIONS_LIMIT) -> dict:
+        '''
+        Reads everything the summoner page shows from the database in a single query: the stored ranks,
+        the role distribution, the top champions and the first page of recent matches.
+
+        Returns a dict with the same data as _summoner_data_from_db() (None if the summoner is not stored),
+        role_data(), top_champions_data() and recent_matches_page().
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute(_profile_query(), [
+                self.puuid,
+                self.puuid, top_champions_limit,
+                self.puuid, recent_matches_limit + 1, # Una de mas para saber si hay otra pagina
+                self.puuid,
+            ])
+            summoner_row, role_rows, top_champion_rows, recent_match_rows = cursor.fetchone()
+
+        summoner_row = _json_value(summoner_row)
+        summoner_data = dict(zip(SUMMONER_FIELDS, summoner_row)) if summoner_row else None
+        if summoner_data and summoner_data["last_update"]:
+            # En el JSON la fecha llega como texto (sin zona horaria en SQLite, que la guarda en UTC)
+            last_update = parse_datetime(summoner_data["last_update"])
+            if timezone.is_naive(last_update):
+                last_update = timezone.make_aware(last_update, dt_timezone.utc)
+            summoner_data["last_update"] = last_update
+
+        role_counts = {role: 0 for role in ROLES}
+        for team_position, matches in _json_value(role_rows) or []:
+            role_counts[team_position] = matches
+
+        top_champions = [dict(zip(TOP_CHAMPIONS_FIELDS, row)) for row in _ordered_rows(top_champion_rows)]
+
+        # Los participantes de cada partida llegan como otro agregado, con su participant_index delante
+        recent_matches = [MatchRecord(row[:-1], _ordered_rows(row[-1])) for row in _ordered_rows(recent_match_rows)]
+        next_matches_cursor = None
+        if len(recent_matches) > recent_matches_limit:
+            recent_matches = recent_matches[:recent_matches_limit]
+            next_matches_cursor = encode_matches_cursor(recent_matches[-1])
+
+        return {
+            "summoner_data": summoner_data,
+            "role_data": role_counts,
+            "top_champions": top_champions,
+            "recent_matches": recent_matches,
+            "next_matches_cursor": next_matches_cursor,
+        }
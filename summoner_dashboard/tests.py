@@ -1,3 +1,1117 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+import importlib
+from io import StringIO
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import requests
+
+from . import json_codec, metrics
+from .cache import SharedCache, SQLiteCacheBackend
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .fake_riot import FakeRiotServer, FixtureRiotAPI, error_body
+from .locks import single_flight
+from .match_archive import MatchArchive
+from .models import ChampionStatsModel, IngestionJobModel, MatchDetailModel, MatchModel, ParticipantModel, SummonerModel
+from .services.api_handler import MATCH_METHOD, api_response_cache
+from .services.ingestion_queue import HEARTBEAT_TIMEOUT, claim_ingestion_job, run_ingestion_job
+from .services.summoner_data import SummonerData
+from . import utils
+from .rate_limiter import LocalBackend, RateLimiter, SQLiteBackend
+from .services.summoner_identity import summoner_identity_cache
+from .utils import SEASON_START_TIMESTAMP, make_request, make_request_async
+
+
+SUMMONER_PAGE_QUERY_BUDGET = 3
+
+
+def fake_riot_get(self, endpoint, general_region=False, method=None, **params):
+    if endpoint.startswith("summoner/v4/summoners/by-name/"):
+        return {"id": "summoner-id", "puuid": "puuid", "profileIconId": 1, "summonerLevel": 100}
+    if endpoint.startswith("league/v4/entries/by-summoner/"):
+        return []
+    raise AssertionError(f"Unexpected API call: {endpoint}")
+
+
+def sequential_scans(sql: str) -> list:
+    '''
+    Returns the tables the database reads with a full table scan to run the query.
+    '''
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Con tablas tan pequenas el planner prefiere el seq scan aunque haya indice
+            cursor.execute("SET enable_seqscan = off")
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+            cursor.execute("RESET enable_seqscan")
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            scans = []
+            nodes = [plan[0]["Plan"]]
+            while nodes:
+                node = nodes.pop()
+                if node["Node Type"] == "Seq Scan":
+                    scans.append(node["Relation Name"])
+                nodes += node.get("Plans", [])
+            return scans
+
+        tables = set(connection.introspection.table_names(cursor))
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        # SQLite: "SEARCH <tabla> USING INDEX ..." usa un indice, "SCAN <tabla>" recorre la tabla entera
+        # ("SCAN <cte>" recorre el resultado de una subconsulta, no una tabla)
+        return [
+            detail.split()[1]
+            for *_, detail in cursor.fetchall()
+            if detail.startswith("SCAN ") and "USING" not in detail and detail.split()[1] in tables
+        ]
+
+
+class SummonerPageQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        summoner = SummonerModel.objects.create(
+            summoner_puuid="puuid",
+            summoner_id="summoner-id",
+            summoner_name="Some Summoner",
+            region="euw1",
+            last_update=timezone.now(),
+            profile_icon_id=1,
+            summoner_level=100,
+        )
+        MatchModel.objects.bulk_create([
+            MatchModel(
+                summoner=summoner,
+                match_id=f"EUW1_{index}",
+                champion_name="Hecarim",
+                win=index % 2,
+                kills=5,
+                deaths=2,
+                assists=7,
+                kda=6.0,
+                cs=200,
+                vision=20,
+                summoner_spell1=4,
+                summoner_spell2=11,
+                item0=0, item1=0, item2=0, item3=0, item4=0, item5=0, item6=0,
+                participant_summoner_names=["player"] * 10,
+                participant_champion_names=["Hecarim"] * 10,
+                participant_team_ids=[100] * 5 + [200] * 5,
+                game_mode="CLASSIC",
+                game_duration=1800,
+                queue_id=420,
+                team_position="JUNGLE",
+                game_end_timestamp=1700000000000 + index,
+            )
+            for index in range(30)
+        ])
+        ChampionStatsModel.objects.create(
+            summoner=summoner, champion_name="Hecarim", matches_played=30, wins=15, losses=15,
+            wr=50.0, kda=6.0, kills=5, deaths=2, assists=7, cs=200,
+        )
+
+    def setUp(self):
+        summoner_identity_cache.clear()
+
+    def get_summoner_page(self, summoner_name="Some Summoner"):
+        with mock.patch.object(SummonerData, "_get", fake_riot_get):
+            return self.client.get(reverse("summoner_dashboard:summoner_info", args=[summoner_name]))
+
+    def test_summoner_page_query_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_summoner_page()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), SUMMONER_PAGE_QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+
+    def test_summoner_page_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_summoner_page()
+
+        for query in queries.captured_queries:
+            if query["sql"].lstrip().startswith(("SELECT", "WITH")):
+                self.assertEqual(sequential_scans(query["sql"]), [], query["sql"])
+
+    def test_profile_data_matches_the_separate_queries(self):
+        summoner = SummonerData.from_db(SummonerModel.objects.get(summoner_puuid="puuid"), "api-key")
+
+        with self.assertNumQueries(1):
+            profile = summoner.profile_data()
+
+        recent_matches, next_matches_cursor = summoner.recent_matches_page()
+        self.assertEqual(profile["summoner_data"], summoner._summoner_data_from_db())
+        self.assertEqual(profile["role_data"], summoner.role_data())
+        self.assertEqual(profile["top_champions"], summoner.top_champions_data())
+        self.assertEqual(
+            [(match.match_id, match.kills, match.item_ids, match.participant_team_ids) for match in profile["recent_matches"]],
+            [(match.match_id, match.kills, match.item_ids, match.participant_team_ids) for match in recent_matches],
+        )
+        self.assertEqual(profile["next_matches_cursor"], next_matches_cursor)
+
+    def test_invalid_matches_cursor_is_rejected(self):
+        url = reverse("summoner_dashboard:recent_matches", args=["Some Summoner"])
+        self.assertEqual(self.client.get(url, {"before": "1681000000000:EUW1_1"}).status_code, 200)
+        for cursor in ["garbage", "1681000000000", "x:EUW1_1", "1681000000000:"]:
+            self.assertEqual(self.client.get(url, {"before": cursor}).status_code, 400, cursor)
+
+    def test_matches_page_with_a_repeated_summoner_name(self):
+        # Otro summoner con el mismo nombre normalizado: uno que se cambio el nombre y otro de otra region
+        for puuid, region, days in [("old-puuid", "euw1", 30), ("na-puuid", "na1", 0)]:
+            SummonerModel.objects.create(
+                summoner_puuid=puuid, summoner_id=f"{puuid}-id", summoner_name="somesummoner", region=region,
+                last_update=timezone.now() - timedelta(days=days), profile_icon_id=1, summoner_level=30,
+            )
+
+        response = self.client.get(reverse("summoner_dashboard:recent_matches", args=["Some Summoner"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["recent_matches"]), 10)
+
+        response = self.client.get(reverse("summoner_dashboard:recent_matches", args=["Nobody"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_summoner_name_lookup_ignores_case_and_whitespace(self):
+        self.assertTrue(SummonerModel.objects.by_name("some summoner").exists())
+        self.assertTrue(SummonerModel.objects.by_name(" SomeSummoner").exists())
+        self.assertEqual(self.get_summoner_page("SOME  SUMMONER").status_code, 200)
+
+    def test_summoner_name_lookup_without_save(self):
+        SummonerModel.objects.bulk_create([SummonerModel(summoner_puuid="other", summoner_name="Other Summoner", region="euw1")])
+        self.assertTrue(SummonerModel.objects.by_name("othersummoner").exists())
+
+        SummonerModel.objects.filter(summoner_puuid="other").update(summoner_name="Renamed Summoner")
+        self.assertTrue(SummonerModel.objects.by_name("RENAMED summoner").exists())
+
+    def test_warm_summoner_page_makes_no_api_calls(self):
+        with mock.patch.object(SummonerData, "_get", side_effect=AssertionError("Unexpected API call")) as api:
+            for summoner_name in ["Some Summoner", "somesummoner"]:
+                response = self.client.get(reverse("summoner_dashboard:summoner_info", args=[summoner_name]))
+                self.assertEqual(response.status_code, 200)
+
+        api.assert_not_called()
+
+    def test_stale_summoner_page_is_served_and_refreshed_in_background(self):
+        last_update = timezone.now() - timedelta(hours=2)
+        SummonerModel.objects.filter(summoner_puuid="puuid").update(last_update=last_update)
+
+        with mock.patch.object(SummonerData, "_get", side_effect=AssertionError("Unexpected API call")):
+            response = self.client.get(reverse("summoner_dashboard:summoner_info", args=["Some Summoner"]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["summoner_data"]["last_update"], last_update)
+        self.assertEqual(IngestionJobModel.objects.get(summoner_puuid="puuid").status, IngestionJobModel.PENDING)
+
+    def test_fresh_summoner_page_does_not_enqueue_a_refresh(self):
+        self.get_summoner_page()
+        self.assertFalse(IngestionJobModel.objects.exists())
+
+    def test_stale_summoner_identity_is_fetched_again(self):
+        SummonerModel.objects.filter(summoner_puuid="puuid").update(last_update=timezone.now() - timedelta(days=2))
+
+        with mock.patch.object(SummonerData, "_get", autospec=True, side_effect=fake_riot_get) as api:
+            SummonerData("Some Summoner", "api-key")
+
+        self.assertEqual(api.call_count, 1)
+
+    def test_summoner_inserted_by_another_request_is_updated(self):
+        SummonerModel.objects.filter(summoner_puuid="puuid").update(last_update=timezone.now() - timedelta(days=2))
+
+        with mock.patch.object(SummonerData, "_get", fake_riot_get):
+            summoner = SummonerData("Some Summoner", "api-key")
+            # Como si otra peticion lo hubiera guardado despues de que este no lo encontrara
+            summoner.save_summoner_to_db(summoner.fetch_summoner_ranks())
+
+        self.assertEqual(SummonerModel.objects.filter(summoner_puuid="puuid").count(), 1)
+        self.assertLess(timezone.now() - SummonerModel.objects.get(summoner_puuid="puuid").last_update, timedelta(minutes=1))
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        mock.patch("summoner_dashboard.locks.POLL_INTERVAL", 0.01).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def hold_lock(self, key: str, release: threading.Event, stored: dict) -> None:
+        # Otro hilo es el lider: coge el lock y guarda el resultado cuando se le avisa
+        acquired = threading.Event()
+
+        def leader():
+            with single_flight(key) as is_leader:
+                self.assertTrue(is_leader)
+                acquired.set()
+                release.wait(5)
+                stored["result"] = "fetched"
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        acquired.wait(5)
+
+    def test_second_caller_waits_and_reads_the_stored_result(self):
+        release, stored = threading.Event(), {}
+        self.hold_lock("summoner:puuid", release, stored)
+        threading.Timer(0.1, release.set).start()
+
+        with single_flight("summoner:puuid", wait=5) as leader:
+            self.assertFalse(leader)
+        self.assertEqual(stored, {"result": "fetched"})
+
+        # Terminado el lider, el siguiente coge el lock
+        with single_flight("summoner:puuid") as leader:
+            self.assertTrue(leader)
+
+    def test_second_caller_gives_up_after_the_wait(self):
+        release, stored = threading.Event(), {}
+        self.hold_lock("summoner:puuid", release, stored)
+
+        start = time.monotonic()
+        with single_flight("summoner:puuid", wait=0.2) as leader:
+            self.assertFalse(leader)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        # Sin resultado guardado, el que llama hace el trabajo por su cuenta (league_data)
+        self.assertEqual(stored, {})
+
+
+class IngestionQueueTests(TestCase):
+    def test_running_jobs_are_reclaimed_on_a_stale_heartbeat(self):
+        now = timezone.now()
+        job = IngestionJobModel.objects.create(
+            summoner_puuid="puuid", summoner_name="Some Summoner", region="euw1", run_after=now,
+            status=IngestionJobModel.RUNNING, started_at=now - timedelta(hours=3), heartbeat_at=now,
+        )
+        # Un crawl largo que sigue avanzando no se reclama
+        self.assertIsNone(claim_ingestion_job())
+
+        IngestionJobModel.objects.filter(pk=job.pk).update(heartbeat_at=now - HEARTBEAT_TIMEOUT * 2)
+        self.assertEqual(claim_ingestion_job().pk, job.pk)
+
+    def test_worker_stops_when_its_job_is_reclaimed(self):
+        job = IngestionJobModel.objects.create(
+            summoner_puuid="puuid", summoner_name="Some Summoner", region="euw1", run_after=timezone.now(),
+        )
+        job = claim_ingestion_job()
+
+        def sync_matches(summoner, progress):
+            # Otro worker reclama el job mientras este sigue descargando
+            IngestionJobModel.objects.filter(pk=job.pk).update(started_at=timezone.now() + timedelta(seconds=1))
+            progress(10, 20)
+
+        with mock.patch.object(SummonerData, "__init__", return_value=None), \
+                mock.patch.object(SummonerData, "fetch_summoner_ranks"), \
+                mock.patch.object(SummonerData, "handle_summoner_data"), \
+                mock.patch.object(SummonerData, "sync_matches", sync_matches):
+            run_ingestion_job(job, "api-key")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJobModel.RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.matches_done, 0)
+
+
+class APIResponseCacheTests(TestCase):
+    def setUp(self):
+        api_response_cache.clear()
+        summoner_identity_cache.clear()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.shared_cache = SharedCache(SQLiteCacheBackend(os.path.join(cache_dir.name, "api_cache.sqlite3")))
+        mock.patch("summoner_dashboard.services.api_handler.shared_response_cache", self.shared_cache).start()
+        self.make_request = mock.patch(
+            "summoner_dashboard.services.api_handler.make_request", side_effect=self.fake_make_request
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    @staticmethod
+    def fake_make_request(url, params, method=None, region=None):
+        if "/summoners/by-name/" in url:
+            return {"id": "summoner-id", "puuid": "puuid", "profileIconId": 1, "summonerLevel": 100}
+        if "/entries/by-summoner/" in url:
+            return [{"queueType": "RANKED_SOLO_5x5", "tier": "GOLD", "rank": "II", "leaguePoints": 50, "wins": 10, "losses": 5}]
+        return {"metadata": {"matchId": url.rsplit("/", 1)[1]}}
+
+    def requested_urls(self) -> list:
+        return [call.args[0] for call in self.make_request.call_args_list]
+
+    def test_repeated_calls_in_a_request_are_made_once(self):
+        summoner = SummonerData("Some Summoner", "api-key")
+        summoner.soloq_rank()
+        summoner.flex_rank()
+        summoner.total_ranked_games_played_per_queue()
+
+        self.assertEqual(len(self.requested_urls()), 2) # by-name y league entries
+        self.assertEqual(api_response_cache.stats.request_hits, 2)
+
+    def test_responses_are_shared_until_they_expire(self):
+        SummonerData("Some Summoner", "api-key").league_entries()
+        summoner_identity_cache.clear()
+        SummonerData("Some Summoner", "api-key").league_entries()
+        self.assertEqual(len(self.requested_urls()), 2)
+
+        summoner_identity_cache.clear()
+        with mock.patch("summoner_dashboard.cache.time.monotonic", return_value=time.monotonic() + 3600), \
+                mock.patch("summoner_dashboard.cache.time.time", return_value=time.time() + 3600):
+            SummonerData("Some Summoner", "api-key").league_entries()
+        self.assertEqual(len(self.requested_urls()), 4)
+
+    def test_cache_is_size_bounded(self):
+        summoner = SummonerData("Some Summoner", "api-key")
+        api_response_cache.clear()
+        self.shared_cache.backend = None
+        with mock.patch.object(api_response_cache, "maxsize", 3):
+            for match_id in ["EUW1_1", "EUW1_2", "EUW1_3", "EUW1_4", "EUW1_1"]:
+                summoner._get(f"match/v5/matches/{match_id}", general_region=True, method=MATCH_METHOD)
+
+        self.assertEqual(len(api_response_cache), 3)
+        self.assertEqual(api_response_cache.stats.evictions, 2)
+        self.assertEqual(self.requested_urls().count("https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1"), 2)
+
+    def test_workers_share_responses(self):
+        summoner = SummonerData("Some Summoner", "api-key")
+        summoner._get("match/v5/matches/EUW1_1", general_region=True, method=MATCH_METHOD)
+
+        # Otro worker: su cache en memoria esta vacia pero lee el mismo fichero
+        api_response_cache.clear()
+        other_worker_cache = SharedCache(SQLiteCacheBackend(self.shared_cache.backend.path))
+        with mock.patch("summoner_dashboard.services.api_handler.shared_response_cache", other_worker_cache):
+            response = summoner._get("match/v5/matches/EUW1_1", general_region=True, method=MATCH_METHOD)
+
+        self.assertEqual(response, {"metadata": {"matchId": "EUW1_1"}})
+        self.assertEqual(self.requested_urls().count("https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1"), 1)
+        self.assertEqual(other_worker_cache.stats.hits, 1)
+
+
+class SQLiteCacheBackendTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.backend = SQLiteCacheBackend(os.path.join(cache_dir.name, "api_cache.sqlite3"), max_size=300)
+
+    def test_least_recently_used_entries_are_evicted_over_max_size(self):
+        for key in ["a", "b", "c"]:
+            self.backend.set(key, b"x" * 100)
+        self.backend.get("a")
+
+        self.assertEqual(self.backend.set("d", b"x" * 100), 1)
+        self.assertIsNone(self.backend.get("b"))
+        self.assertEqual(self.backend.get("a"), b"x" * 100)
+
+    def test_reads_do_not_write_and_the_size_is_kept_up_to_date(self):
+        for key in ["a", "b"]:
+            self.backend.set(key, b"x" * 100)
+        self.backend.set("a", b"x" * 50) # Reemplazar una entrada resta su tamano anterior
+
+        with mock.patch.object(self.backend, "_write") as write:
+            self.assertEqual(self.backend.get("a"), b"x" * 50)
+        write.assert_not_called()
+
+        size = self.backend._connection().execute("SELECT size FROM api_cache_size").fetchone()[0]
+        self.assertEqual(size, 150)
+        self.backend.clear()
+        self.assertEqual(self.backend._connection().execute("SELECT size FROM api_cache_size").fetchone()[0], 0)
+
+    def test_expired_entries_are_missing(self):
+        self.backend.set("a", b"value", ttl=60)
+        with mock.patch("summoner_dashboard.cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.backend.get("a"))
+
+    def test_values_are_stored_compressed(self):
+        payload = {"info": {"participants": [{"championName": "Hecarim", "kills": 7}] * 10}}
+        SharedCache(self.backend).set("match", payload)
+
+        self.assertLess(len(self.backend.get("match")), len(json.dumps(payload)))
+        self.assertEqual(SharedCache(self.backend).get("match"), payload)
+
+
+class JSONCodecTests(TestCase):
+    def test_same_values_with_and_without_orjson(self):
+        payload = {"metadata": {"matchId": "EUW1_1"}, "info": {"participants": [{"summonerName": "Tëst", "kda": 2.5}]}}
+        encoded = json_codec.dumps(payload)
+
+        with mock.patch("summoner_dashboard.json_codec.orjson", None):
+            self.assertEqual(json_codec.loads(encoded), payload)
+            self.assertEqual(json_codec.loads(json_codec.dumps(payload)), payload)
+        self.assertEqual(json_codec.loads(encoded.decode()), payload)
+
+    def test_archived_payload_is_the_same_with_and_without_orjson(self):
+        payload = {"metadata": {"matchId": "EUW1_1"}, "info": {"participants": [{"summonerName": "Tëst", "kda": 2.5}], "gameMode": "CLASSIC"}}
+        encoded = MatchArchive.encode(payload)
+        self.assertEqual(MatchArchive.encode(json_codec.loads(encoded)), encoded)
+
+        with mock.patch("summoner_dashboard.json_codec.orjson", None):
+            self.assertEqual(MatchArchive.encode(payload), encoded)
+            self.assertEqual(json_codec.loads(MatchArchive.encode({"challenge": 9.7e-05})), {"challenge": 9.7e-05})
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_lets_a_single_trial_call_through_after_the_recovery_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+        breaker.record_failure()
+
+        with mock.patch("summoner_dashboard.circuit_breaker.time.monotonic", return_value=time.monotonic() + 31):
+            breaker.before_call()
+            with self.assertRaises(CircuitOpenError):
+                breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        with mock.patch("summoner_dashboard.circuit_breaker.time.monotonic", return_value=time.monotonic() + 62):
+            breaker.before_call()
+            breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_make_request_does_not_call_the_api_while_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+        breaker.record_failure()
+
+        with mock.patch("summoner_dashboard.utils.circuit_breaker", breaker), \
+                mock.patch("summoner_dashboard.utils.http_client") as http_client:
+            with self.assertRaises(CircuitOpenError):
+                make_request("https://euw1.api.riotgames.com/lol/status", {}, "status")
+
+        http_client.get.assert_not_called()
+
+
+class FakeClock:
+    '''
+    Stands in for the time module of the rate limiter: sleep() moves the clock instead of waiting.
+    '''
+    def __init__(self) -> None:
+        self.now = 1700000000.0
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        mock.patch("summoner_dashboard.rate_limiter.time", self.clock).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_both_windows_are_enforced(self):
+        limiter = RateLimiter([(utils.BURST_LIMIT, utils.BURST_TIME), (utils.SUSTAINED_LIMIT, utils.SUSTAINED_TIME)])
+        start = self.clock.now
+
+        for _ in range(utils.BURST_LIMIT):
+            limiter.acquire("euw1")
+        self.assertEqual(self.clock.sleeps, [])
+        # La siguiente espera a que salga la primera de la ventana de un segundo
+        limiter.acquire("euw1")
+        self.assertAlmostEqual(self.clock.now - start, utils.BURST_TIME, delta=0.1)
+
+        for _ in range(utils.SUSTAINED_LIMIT - utils.BURST_LIMIT - 1):
+            limiter.acquire("euw1")
+        self.assertLess(self.clock.now - start, 10)
+        # Con la ventana de dos minutos llena, la siguiente espera a que salga la primera
+        limiter.acquire("euw1")
+        self.assertAlmostEqual(self.clock.now - start, utils.SUSTAINED_TIME, delta=0.1)
+
+    def test_limits_are_learned_from_the_headers(self):
+        limiter = RateLimiter([(100, 1)])
+        limiter.update_from_headers("euw1", "match-v5.getMatch", {
+            "X-App-Rate-Limit": "2:1,5:10", "X-App-Rate-Limit-Count": "1:1,1:10",
+            "X-Method-Rate-Limit": "1:5", "X-Method-Rate-Limit-Count": "1:5",
+        })
+        start = self.clock.now
+
+        limiter.acquire("euw1", "match-v5.getMatch")
+        limiter.acquire("euw1", "match-v5.getMatch")
+        # Limite del metodo: una cada 5 s
+        self.assertAlmostEqual(self.clock.now - start, 5, delta=0.1)
+        # Limite de la aplicacion: dos por segundo, tambien para otros metodos; otras regiones no cuentan
+        limiter.acquire("euw1")
+        limiter.acquire("euw1")
+        self.assertAlmostEqual(self.clock.now - start, 6, delta=0.1)
+        limiter.acquire("europe")
+        self.assertAlmostEqual(self.clock.now - start, 6, delta=0.1)
+        self.assertEqual(limiter.remaining_budget()[("method", "euw1", "match-v5.getMatch", 5)], 0)
+
+
+class SQLiteRateLimitBackendTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        mock.patch("summoner_dashboard.rate_limiter.time", self.clock).start()
+        self.addCleanup(mock.patch.stopall)
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        path = os.path.join(state_dir.name, "rate_limit.sqlite3")
+        # Dos workers: cada uno con su limitador y su conexion al mismo fichero
+        self.workers = [RateLimiter([(3, 1)], backend=SQLiteBackend(path)) for _ in range(2)]
+
+    def test_workers_share_one_budget(self):
+        first, second = self.workers
+        start = self.clock.now
+        first.acquire("euw1")
+        first.acquire("euw1")
+        second.acquire("euw1")
+        self.assertEqual(self.clock.sleeps, [])
+
+        second.acquire("euw1")
+        self.assertAlmostEqual(self.clock.now - start, 1, delta=0.1)
+
+    def test_retry_after_penalty_is_seen_by_every_worker(self):
+        first, second = self.workers
+        start = self.clock.now
+        first.penalize("euw1", 5)
+        # Un Retry-After mas corto no acorta la penalizacion
+        second.penalize("euw1", 1)
+
+        second.acquire("euw1")
+        self.assertAlmostEqual(self.clock.now - start, 5, delta=0.01)
+        # Otras regiones no estan penalizadas
+        first.acquire("europe")
+        self.assertEqual(len(self.clock.sleeps), 1)
+
+
+class FakeRiotTestCase(TestCase):
+    '''
+    Runs the tests against a FakeRiotServer (self.server) instead of the Riot API.
+    '''
+    LATENCY = 0
+
+    def setUp(self):
+        api_response_cache.clear()
+        summoner_identity_cache.clear()
+        self.server = FakeRiotServer(latency=self.LATENCY).start()
+        self.addCleanup(self.server.stop)
+
+        settings_override = override_settings(RIOT_API_BASE_URL=self.server.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        mock.patch("summoner_dashboard.utils.rate_limiter", RateLimiter([(1000, 1)], backend=LocalBackend())).start()
+        mock.patch("summoner_dashboard.utils.circuit_breaker", CircuitBreaker()).start()
+        mock.patch("summoner_dashboard.services.api_handler.shared_response_cache", SharedCache(None)).start()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive = MatchArchive(archive_dir.name)
+        mock.patch("summoner_dashboard.services.api_handler.match_archive", self.archive).start()
+        self.addCleanup(mock.patch.stopall)
+
+
+class AsyncSummonerPageTests(FakeRiotTestCase):
+    LATENCY = 0.25
+
+    def summoner_page_url(self, summoner_name):
+        return reverse("summoner_dashboard:summoner_info_async", args=[summoner_name])
+
+    async def test_new_summoner_page(self):
+        self.server.api.add_summoner("Some Summoner", matches=5)
+        response = await self.async_client.get(self.summoner_page_url("Some Summoner"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Gold 2")
+        self.assertEqual(
+            [path.split("/")[3] for _, path in self.server.requests], ["summoners", "entries"]
+        )
+        self.assertTrue(await IngestionJobModel.objects.filter(summoner_puuid="puuid-somesummoner").aexists())
+
+        # La segunda visita sale de la base de datos, sin llamar a la API
+        response = await self.async_client.get(self.summoner_page_url("somesummoner"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_concurrent_pages_of_a_new_summoner_fetch_it_once(self):
+        self.server.api.add_summoner("Some Summoner")
+
+        responses = await asyncio.gather(*(
+            self.async_client.get(self.summoner_page_url("Some Summoner")) for _ in range(5)
+        ))
+
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual([path for _, path in self.server.requests if "/entries/" in path], [
+            "lol/league/v4/entries/by-summoner/id-somesummoner"
+        ])
+        self.assertEqual(await SummonerModel.objects.filter(summoner_puuid="puuid-somesummoner").acount(), 1)
+
+    async def test_concurrent_pages_wait_on_the_api_at_the_same_time(self):
+        summoner_names = [f"Summoner {index}" for index in range(10)]
+        for summoner_name in summoner_names:
+            self.server.api.add_summoner(summoner_name)
+
+        start = time.monotonic()
+        responses = await asyncio.gather(*(
+            self.async_client.get(self.summoner_page_url(summoner_name)) for summoner_name in summoner_names
+        ))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual([response.status_code for response in responses], [200] * len(summoner_names))
+        self.assertEqual(len(self.server.requests), 2 * len(summoner_names))
+        # Una detras de otra serian 5 s de latencia (20 peticiones a 0.25 s)
+        self.assertLess(elapsed, len(self.server.requests) * self.LATENCY / 2)
+
+
+class RiotAPIDownTests(FakeRiotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.api.add_summoner("Some Summoner", matches=5)
+        summoner = SummonerData("Some Summoner", "api-key")
+        summoner.handle_summoner_data(summoner.fetch_summoner_ranks())
+        SummonerModel.objects.update(last_update=timezone.now() - timedelta(days=2))
+        summoner_identity_cache.clear()
+
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+        breaker.record_failure()
+        mock.patch("summoner_dashboard.utils.circuit_breaker", breaker).start()
+        self.server.requests.clear()
+
+    def test_stale_stored_summoner_is_served(self):
+        for url_name in ("summoner_info", "summoner_info_async"):
+            response = self.client.get(reverse(f"summoner_dashboard:{url_name}", args=["Some Summoner"]))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["summoner_data"]["summoner_level"], 30 + len("somesummoner"))
+        self.assertEqual(self.server.requests, [])
+        # El refresco en segundo plano actualiza el summoner cuando la API vuelva
+        self.assertTrue(IngestionJobModel.objects.filter(summoner_puuid="puuid-somesummoner").exists())
+
+    def test_unknown_summoner_asks_to_try_again_later(self):
+        for url_name in ("summoner_info", "summoner_info_async"):
+            response = self.client.get(reverse(f"summoner_dashboard:{url_name}", args=["Other Summoner"]))
+
+            self.assertEqual(response.status_code, 503)
+            self.assertContains(response, "try again in a few minutes", status_code=503)
+        self.assertFalse(SummonerModel.objects.filter(summoner_name="Other Summoner").exists())
+
+
+class MatchIngestionTests(FakeRiotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.api.add_summoner("Some Summoner", matches=25)
+        mock.patch("summoner_dashboard.services.db_handler.MATCHES_BATCH_SIZE", 10).start()
+        self.summoner = SummonerData("Some Summoner", "api-key")
+        self.summoner.handle_summoner_data(self.summoner.fetch_summoner_ranks())
+
+    def match_requests(self) -> list:
+        return [path for _, path in self.server.requests if path.startswith("lol/match/v5/matches/") and "by-puuid" not in path]
+
+    def test_matches_are_saved_in_batches_from_the_oldest(self):
+        saved_batches = []
+        save_matches_batch = SummonerData._save_matches_batch
+
+        def spy(summoner, matches_data):
+            saved_batches.append(list(matches_data))
+            save_matches_batch(summoner, matches_data)
+
+        with mock.patch.object(SummonerData, "_save_matches_batch", spy):
+            self.summoner.sync_matches()
+
+        match_ids = self.server.api.match_ids["puuid-somesummoner"][::-1]
+        self.assertEqual([len(batch) for batch in saved_batches], [10, 10, 5])
+        self.assertEqual(sum(saved_batches, []), match_ids)
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(summoner.last_match_id, match_ids[-1])
+        self.assertEqual(MatchModel.objects.filter(summoner=summoner).count(), 25)
+
+    def test_interrupted_sync_resumes_after_the_last_saved_batch(self):
+        match_ids = self.server.api.match_ids["puuid-somesummoner"][::-1]
+        match_data = SummonerData._match_data
+
+        def failing_match_data(summoner, match_id):
+            if match_id == match_ids[14]:
+                raise CircuitOpenError("Circuit open")
+            return match_data(summoner, match_id)
+
+        with mock.patch.object(SummonerData, "_match_data", failing_match_data):
+            with self.assertRaises(CircuitOpenError):
+                self.summoner.sync_matches()
+
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(summoner.last_match_id, match_ids[9])
+        self.assertEqual(MatchModel.objects.filter(summoner=summoner).count(), 10)
+
+        # Otro proceso (sin las respuestas en memoria) retoma la sincronizacion
+        api_response_cache.clear()
+        requested = len(self.match_requests())
+        SummonerData("Some Summoner", "api-key").sync_matches()
+
+        self.assertEqual(MatchModel.objects.filter(summoner=summoner).count(), 25)
+        self.assertEqual(len(self.match_requests()) - requested, 15)
+
+    def failing_match(self, match_id: str, status: int) -> None:
+        # El servidor falso responde `status` a las peticiones de esta partida
+        route = self.server.api.route
+
+        def failing_route(region, path, query):
+            if path == f"lol/match/v5/matches/{match_id}":
+                return status, error_body(status, "Failing match")
+            return route(region, path, query)
+
+        mock.patch.object(self.server.api, "route", failing_route).start()
+
+    def test_matches_not_found_are_skipped(self):
+        match_ids = self.server.api.match_ids["puuid-somesummoner"][::-1]
+        self.failing_match(match_ids[3], 404)
+
+        self.summoner.sync_matches()
+
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(MatchModel.objects.filter(summoner=summoner).count(), 24)
+        self.assertFalse(MatchModel.objects.filter(match_id=match_ids[3]).exists())
+        self.assertEqual(summoner.last_match_id, match_ids[-1])
+
+    def test_sync_stops_before_a_match_the_api_does_not_serve(self):
+        mock.patch("summoner_dashboard.utils.backoff_delay", return_value=0).start()
+        match_ids = self.server.api.match_ids["puuid-somesummoner"][::-1]
+        self.failing_match(match_ids[14], 503)
+
+        with self.assertRaises((utils.RiotAPIError, CircuitOpenError)):
+            self.summoner.sync_matches()
+
+        # El cursor no pasa por encima de la partida que falta
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(summoner.last_match_id, match_ids[9])
+        self.assertFalse(MatchModel.objects.filter(match_id__in=match_ids[10:]).exists())
+
+    def test_summoner_stored_without_cursor_gets_one(self):
+        self.summoner.sync_matches()
+        SummonerModel.objects.filter(summoner_puuid="puuid-somesummoner").update(last_match_id=None, last_match_end_timestamp=None)
+
+        api_response_cache.clear()
+        self.summoner = SummonerData("Some Summoner", "api-key")
+        self.summoner.sync_matches()
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(summoner.last_match_id, self.server.api.match_ids["puuid-somesummoner"][0])
+
+        self.assertEqual(summoner.last_match_end_timestamp, MatchModel.objects.get(match_id=summoner.last_match_id).game_end_timestamp)
+        # Ninguna partida se ha vuelto a descargar
+        self.assertEqual(len(self.match_requests()), 25)
+
+    def test_saving_the_same_batch_twice_stores_it_once(self):
+        matches_data = dict(self.summoner._iter_new_matches_data(self.server.api.match_ids["puuid-somesummoner"]))
+
+        self.summoner.save_matches_data_to_db(matches_data)
+        champion_stats = list(ChampionStatsModel.objects.values_list("champion_name", "matches_played", "wins"))
+        self.summoner.save_matches_data_to_db(matches_data)
+
+        self.assertEqual(MatchModel.objects.filter(summoner_id="puuid-somesummoner").count(), 25)
+        self.assertEqual(MatchDetailModel.objects.count(), 25)
+        self.assertEqual(ParticipantModel.objects.count(), 25 * 10)
+        # Las partidas repetidas no se vuelven a sumar
+        self.assertEqual(list(ChampionStatsModel.objects.values_list("champion_name", "matches_played", "wins")), champion_stats)
+
+    def test_participants_are_read_from_the_participant_rows(self):
+        self.summoner.sync_matches()
+        # Los participantes de las partidas nuevas solo se guardan en ParticipantModel
+        self.assertFalse(MatchModel.objects.filter(participant_champion_names__isnull=False).exists())
+
+        recent_matches, _ = self.summoner.recent_matches_page()
+        self.assertEqual(len(recent_matches), 10)
+        for match, profile_match in zip(recent_matches, self.summoner.profile_data()["recent_matches"]):
+            participants = self.server.api.matches[match.match_id]["info"]["participants"]
+            for record in [match, profile_match]:
+                self.assertEqual(record.participant_summoner_names, [p["summonerName"] for p in participants])
+                self.assertEqual(record.participant_champion_names, [p["championName"] for p in participants])
+                self.assertEqual(record.participant_team_ids, [p["teamId"] for p in participants])
+
+    def test_champion_stats_after_a_second_sync_match_a_full_recompute(self):
+        match_ids = self.server.api.match_ids["puuid-somesummoner"]
+        self.summoner.save_matches_data_to_db(self.summoner._iter_new_matches_data(match_ids[10:]))
+        SummonerData("Some Summoner", "api-key").sync_matches()
+
+        expected = {}
+        for match in MatchModel.objects.filter(summoner_id="puuid-somesummoner", queue_id__in=[420, 440]):
+            games, wins, kills, deaths, assists = expected.get(match.champion_name, (0, 0, 0, 0, 0))
+            expected[match.champion_name] = (
+                games + 1, wins + match.win, kills + match.kills, deaths + match.deaths, assists + match.assists
+            )
+        self.assertTrue(expected)
+
+        stats = {stats.champion_name: stats for stats in ChampionStatsModel.objects.filter(summoner_id="puuid-somesummoner")}
+        self.assertEqual(set(stats), set(expected))
+        for champion_name, (games, wins, kills, deaths, assists) in expected.items():
+            champion = stats[champion_name]
+            self.assertEqual((champion.matches_played, champion.wins, champion.losses), (games, wins, games - wins))
+            self.assertAlmostEqual(champion.wr, wins * 100 / games)
+            self.assertAlmostEqual(champion.kda, (kills + assists) / (deaths + 0.001))
+
+    def test_cursor_without_timestamp_does_not_download_the_stored_matches_again(self):
+        self.summoner.sync_matches()
+        # Partidas guardadas antes de que existiera game_end_timestamp
+        MatchModel.objects.update(game_end_timestamp=0)
+        MatchDetailModel.objects.update(game_end_timestamp=0)
+        SummonerModel.objects.filter(summoner_puuid="puuid-somesummoner").update(last_match_end_timestamp=0)
+
+        api_response_cache.clear()
+        calls = []
+        all_match_ids = SummonerData.all_match_ids_this_season
+
+        def spy(summoner, **kwargs):
+            calls.append((kwargs["start_time"], all_match_ids(summoner, **kwargs)))
+            return calls[-1][1]
+
+        with mock.patch.object(SummonerData, "all_match_ids_this_season", spy):
+            SummonerData("Some Summoner", "api-key").sync_matches()
+
+        # No va mas atras de la temporada, y se para en la primera partida ya guardada
+        self.assertEqual(calls, [(SEASON_START_TIMESTAMP, [])])
+        self.assertEqual(len(self.match_requests()), 25)
+
+    def test_game_end_timestamps_are_backfilled_from_the_match_details(self):
+        self.summoner.sync_matches()
+        expected = dict(MatchModel.objects.values_list("match_id", "game_end_timestamp"))
+        MatchModel.objects.update(game_end_timestamp=0)
+        SummonerModel.objects.filter(summoner_puuid="puuid-somesummoner").update(last_match_end_timestamp=0)
+
+        migration = importlib.import_module("summoner_dashboard.migrations.0015_backfill_game_end_timestamps")
+        migration.backfill_game_end_timestamps(django_apps, None)
+
+        self.assertEqual(dict(MatchModel.objects.values_list("match_id", "game_end_timestamp")), expected)
+        summoner = SummonerModel.objects.get(summoner_puuid="puuid-somesummoner")
+        self.assertEqual(summoner.last_match_end_timestamp, expected[summoner.last_match_id])
+
+
+class MatchArchiveTests(FakeRiotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.api.add_summoner("Some Summoner", matches=12)
+        self.server.api.add_summoner("Other Summoner", matches=3)
+        for summoner_name in ["Some Summoner", "Other Summoner"]:
+            summoner = SummonerData(summoner_name, "api-key")
+            summoner.handle_summoner_data(summoner.fetch_summoner_ranks())
+            summoner.sync_matches()
+
+    def test_downloaded_payloads_are_archived(self):
+        self.assertEqual(MatchDetailModel.objects.filter(payload_digest="").count(), 0)
+        for match in MatchDetailModel.objects.all():
+            self.assertEqual(self.archive.get(match.payload_digest), self.server.api.matches[match.match_id])
+
+        # Mismo contenido, mismo fichero
+        match = MatchDetailModel.objects.first()
+        self.assertEqual(self.archive.put(self.server.api.matches[match.match_id]), match.payload_digest)
+
+    def test_reprocess_extracts_the_archived_payloads_without_calling_the_api(self):
+        requests = len(self.server.requests)
+        MatchModel.objects.update(kills=0)
+        ParticipantModel.objects.update(kills=0, champion_name="")
+
+        for workers in [1, 2]:
+            call_command("reprocess", archive_dir=self.archive.path, workers=workers, batch_size=5, stdout=StringIO())
+
+            self.assertEqual(len(self.server.requests), requests)
+            for match in MatchModel.objects.all():
+                participants = self.server.api.matches[match.match_id]["info"]["participants"]
+                participant = next(p for p in participants if p["puuid"] == match.summoner_id)
+                self.assertEqual(match.kills, participant["kills"])
+                self.assertEqual(
+                    list(ParticipantModel.objects.filter(match_id=match.match_id).order_by("participant_index").values_list("champion_name", flat=True)),
+                    [p["championName"] for p in participants],
+                )
+            self.assertEqual(ParticipantModel.objects.count(), 15 * 10)
+
+    def test_reprocess_rebuilds_the_champion_stats(self):
+        champion_stats = lambda: sorted(ChampionStatsModel.objects.values_list(
+            "summoner_id", "champion_name", "matches_played", "wins", "kills", "total_kills", "kda"
+        ))
+        expected = champion_stats()
+        self.assertTrue(expected)
+
+        # Los totales se calcularon con los datos viejos de las partidas
+        MatchModel.objects.update(kills=0)
+        ChampionStatsModel.objects.update(kills=0, total_kills=0, kda=0)
+        call_command("reprocess", archive_dir=self.archive.path, workers=1, batch_size=5, stdout=StringIO())
+
+        self.assertEqual(champion_stats(), expected)
+
+    def test_reprocess_a_single_summoner(self):
+        MatchModel.objects.update(kills=-1)
+        call_command(
+            "reprocess", summoner="other summoner", archive_dir=self.archive.path, workers=1, stdout=StringIO()
+        )
+
+        self.assertEqual(MatchModel.objects.filter(summoner_id="puuid-othersummoner", kills=-1).count(), 0)
+        self.assertEqual(MatchModel.objects.filter(summoner_id="puuid-somesummoner", kills=-1).count(), 12)
+
+
+class FakeRiotServerTests(FakeRiotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server.api.add_summoner("Some Summoner", matches=3)
+        mock.patch("summoner_dashboard.utils.backoff_delay", return_value=0).start()
+
+    def summoner_url(self, server=None):
+        return (server or self.server).base_url.format(region="euw1") + "/lol/summoner/v4/summoners/by-name/Some Summoner"
+
+    def test_rate_limit_headers_and_429(self):
+        self.server.app_limits = [(3, 10)]
+        for _ in range(3):
+            make_request(self.summoner_url(), {}, "summoner-v4.getBySummonerName", "euw1")
+        self.assertEqual(utils.rate_limiter._app_limits["euw1"], [(3, 10)])
+
+        response = utils.http_client.get(self.summoner_url(), params={})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["X-Rate-Limit-Type"], "application")
+        self.assertEqual(response.headers["X-App-Rate-Limit-Count"], "3:10")
+        self.assertLessEqual(int(response.headers["Retry-After"]), 10)
+
+    def test_injected_failures_are_retried(self):
+        self.server.fail_next(503, count=2)
+        self.server.fail_next(429, retry_after=0)
+
+        summoner = make_request(self.summoner_url(), {}, "summoner-v4.getBySummonerName")
+        self.assertEqual(summoner["puuid"], "puuid-somesummoner")
+        self.assertEqual(self.server.status_counts, {503: 2, 429: 1, 200: 1})
+
+    def test_injected_failures_are_retried_by_the_async_client(self):
+        self.server.fail_next(503, count=2)
+        self.server.fail_next(429, retry_after=0)
+
+        summoner = async_to_sync(make_request_async)(self.summoner_url(), {}, "summoner-v4.getBySummonerName")
+        self.assertEqual(summoner["puuid"], "puuid-somesummoner")
+        self.assertEqual(self.server.status_counts, {503: 2, 429: 1, 200: 1})
+
+        self.server.fail_next(404)
+        with self.assertRaises(utils.RiotAPIError):
+            async_to_sync(make_request_async)(self.summoner_url(), {}, "summoner-v4.getBySummonerName")
+
+    def test_async_clients_are_closed_with_their_event_loop(self):
+        clients = []
+
+        async def get_summoner():
+            await utils.async_http_client.get(self.summoner_url())
+            clients.append(await utils.async_http_client._client())
+
+        # async_to_sync corre cada llamada en un loop nuevo
+        async_to_sync(get_summoner)()
+        async_to_sync(get_summoner)()
+
+        self.assertEqual(len(clients), 2)
+        self.assertIsNot(clients[0], clients[1])
+        self.assertTrue(all(client.is_closed for client in clients))
+
+    def test_recorded_responses_are_replayed(self):
+        fixtures_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(fixtures_dir.cleanup)
+
+        with FakeRiotServer(FixtureRiotAPI(fixtures_dir.name, upstream=self.server.base_url)) as recorder:
+            recorded = make_request(self.summoner_url(recorder), {"api_key": "secret"})
+        self.assertEqual(len(self.server.requests), 1)
+
+        with FakeRiotServer(FixtureRiotAPI(fixtures_dir.name)) as replay:
+            self.assertEqual(make_request(self.summoner_url(replay), {"api_key": "other"}), recorded)
+            with self.assertRaises(Exception):
+                make_request(replay.base_url.format(region="euw1") + "/lol/league/v4/entries/by-summoner/x", {})
+        self.assertEqual(len(self.server.requests), 1)
+
+        for directory, _, file_names in os.walk(fixtures_dir.name):
+            for file_name in file_names:
+                with open(os.path.join(directory, file_name)) as fixture:
+                    self.assertNotIn("secret", fixture.read())
+
+    def test_failed_responses_do_not_replace_a_recording(self):
+        fixtures_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(fixtures_dir.cleanup)
+        recorder = FixtureRiotAPI(fixtures_dir.name, upstream=self.server.base_url)
+        path = "lol/summoner/v4/summoners/by-name/Some Summoner"
+        status, recorded = recorder.route("euw1", path, {})
+        self.assertEqual(status, 200)
+
+        self.server.fail_next(503)
+        self.assertEqual(recorder.route("euw1", path, {})[0], 503)
+        bad_gateway = requests.Response()
+        bad_gateway.status_code, bad_gateway._content = 502, b"<html>Bad Gateway</html>"
+        with mock.patch.object(recorder._session, "get", return_value=bad_gateway):
+            status, payload = recorder.route("euw1", path, {})
+        self.assertEqual((status, payload["status"]["status_code"]), (502, 502))
+
+        self.assertEqual(FixtureRiotAPI(fixtures_dir.name).route("euw1", path, {}), (200, recorded))
+
+
+class MetricsTests(FakeRiotTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.server.api.add_summoner("Some Summoner", matches=3)
+        mock.patch("summoner_dashboard.utils.backoff_delay", return_value=0).start()
+
+    def test_summoner_page_server_timing_and_metrics(self):
+        self.server.app_limits = [(20, 1), (100, 120)]
+        response = self.client.get(reverse("summoner_dashboard:summoner_info", args=["Some Summoner"]))
+        self.assertEqual(response.status_code, 200)
+
+        timings = {timing.split(";")[0]: timing for timing in response["Server-Timing"].split(", ")}
+        self.assertEqual(set(timings), {"throttle", "riot", "db", "render", "total"})
+        self.assertIn('desc="2 calls"', timings["riot"])
+
+        response = self.client.get(reverse("summoner_dashboard:metrics"))
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        for line in [
+            'whgg_riot_api_requests_total{method="summoner-v4.getBySummonerName",status="200"} 1',
+            'whgg_riot_api_requests_total{method="league-v4.getLeagueEntriesForSummoner",status="200"} 1',
+            'whgg_http_requests_total{view="summoner_dashboard:summoner_info",status="200"} 1',
+            'whgg_http_request_seconds_count{view="summoner_dashboard:summoner_info"} 1',
+            'whgg_service_call_seconds_count{method="SummonerProfile.profile_data"} 1',
+            'whgg_riot_api_rate_limit_remaining{scope="application",region="euw1",method="",window="120"} 98',
+            'whgg_api_cache_lookups_total{cache="process",result="miss"} 2',
+        ]:
+            self.assertContains(response, line + "\n")
+
+    def test_metrics_are_only_served_to_the_allowed_ips(self):
+        url = reverse("summoner_dashboard:metrics")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.7").status_code, 403)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.7", HTTP_X_FORWARDED_FOR="127.0.0.1").status_code, 403)
+
+        with override_settings(METRICS_ALLOWED_IPS=["203.0.113.7"]):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="203.0.113.7").status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_rate_limited_responses_are_counted(self):
+        self.server.fail_next(429, retry_after=0)
+        self.server.fail_next(503)
+        url = self.server.base_url.format(region="euw1") + "/lol/summoner/v4/summoners/by-name/Some Summoner"
+        make_request(url, {}, "summoner-v4.getBySummonerName", "euw1")
+
+        method = "summoner-v4.getBySummonerName"
+        self.assertEqual(metrics.RIOT_API_RATE_LIMITED.value(method=method, type="service"), 1)
+        self.assertEqual(metrics.RIOT_API_REQUESTS.value(method=method, status=503), 1)
+        self.assertEqual(metrics.RIOT_API_REQUEST_SECONDS.count(method=method), 3)
+
+    def test_histogram_text_format(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("name",), buckets=(0.1, 1))
+        histogram.observe(0.05, name='a "b"')
+        histogram.observe(0.5, name='a "b"')
+        registry = metrics.Registry()
+        registry.register(histogram)
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{name="a \\"b\\"",le="0.1"} 1',
+            'test_seconds_bucket{name="a \\"b\\"",le="1"} 2',
+            'test_seconds_bucket{name="a \\"b\\"",le="+Inf"} 2',
+            'test_seconds_sum{name="a \\"b\\""} 0.55',
+            'test_seconds_count{name="a \\"b\\""} 2',
+        ])
 
-# Create your tests here.
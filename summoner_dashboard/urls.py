@@ -4,4 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('summoners/euw1/<str:summoner_name>', views.summoner_info, name='summoner_info'),
+    path('summoners/euw1/<str:summoner_name>/matches', views.recent_matches, name='recent_matches'),
+    path('summoners/euw1/<str:summoner_name>/ingestion', views.ingestion_status, name='ingestion_status'),
+    # Misma pagina con la vista async, para servirla desde whgg_django.asgi
+    path('async/summoners/euw1/<str:summoner_name>', views.summoner_info_async, name='summoner_info_async'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,6 +1,37 @@
+import asyncio
 from datetime import datetime
-import requests
+import logging
+from urllib.parse import urlparse
 import time
+import httpx
+import requests
+from django.conf import settings
+
+from . import json_codec, metrics
+from .circuit_breaker import CircuitBreaker
+from .http_client import AsyncRiotHTTPClient, RiotHTTPClient, backoff_delay
+from .rate_limiter import RateLimiter, load_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+class RiotAPIError(Exception):
+    '''
+    The Riot API didn't answer or answered with an error, after the retries. status_code is the status
+    of the last response, or None if there was no response.
+    '''
+    def __init__(self, message: str, status_code: int = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def transient(self) -> bool:
+        '''
+        True if retrying later may work: no response, a 5xx or 429 after the retries.
+        A 4xx other than 429 is permanent.
+        '''
+        return self.status_code is None or self.status_code in RETRY_STATUS_CODES
 
 
 # Season Constants
@@ -15,45 +46,150 @@ BURST_TIME = 1
 SUSTAINED_LIMIT = 100
 SUSTAINED_TIME = 120
 
-last_request_time = 0
+# El estado del rate limiter vive en el backend configurado, compartido por todos los workers
+rate_limiter = RateLimiter(
+    app_limits=[(BURST_LIMIT, BURST_TIME), (SUSTAINED_LIMIT, SUSTAINED_TIME)],
+    backend=load_backend(getattr(settings, "RIOT_RATE_LIMIT_BACKEND", None)),
+)
+
+
+# Cliente HTTP con conexiones keep-alive compartidas por todas las peticiones del proceso
+http_client = RiotHTTPClient(pool_maxsize=BURST_LIMIT)
+async_http_client = AsyncRiotHTTPClient(max_connections=BURST_LIMIT)
+
+MAX_RETRIES = 3
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Tras varios errores seguidos (429, 5xx, timeouts) se deja de llamar a la API durante un rato
+circuit_breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
 
-def throttle():
+
+def api_client_metrics() -> list:
     '''
-    Enforces a minimum delay between API requests to prevent exceeding rate limit.
+    Collector of /metrics: the budget left in each rate limit window and the state of the circuit breaker.
     '''
-    global last_request_time
-    time_since_last_request = time.time() - last_request_time
-    if time_since_last_request < BURST_TIME:
-        time.sleep(BURST_TIME - time_since_last_request)
-    last_request_time = time.time()
+    # Se leen del modulo en cada scrape (los tests los sustituyen)
+    remaining = [
+        ({"scope": scope, "region": region, "method": method, "window": window}, value)
+        for (scope, region, method, window), value in sorted(rate_limiter.remaining_budget().items())
+    ]
+    return [
+        ("whgg_riot_api_rate_limit_remaining", "gauge",
+         "Requests left in each rate limit window, according to the last response of the Riot API.", remaining),
+        ("whgg_riot_api_circuit_open", "gauge",
+         "1 while the circuit breaker stops the calls to the Riot API.", [({}, int(circuit_breaker.state != CircuitBreaker.CLOSED))]),
+    ]
+
 
+metrics.registry.add_collector(api_client_metrics)
 
-def make_request(url, params):
+
+def _failed_request_delay(error: Exception, method: str, elapsed: float, attempt: int) -> float:
+    '''
+    Records a request that got no response (connection error, timeout) and returns how long to wait
+    before retrying it. Raises RiotAPIError after the last attempt.
+    '''
+    metrics.record_api_response(method, "error", elapsed)
+    circuit_breaker.record_failure()
+    if attempt == MAX_RETRIES:
+        raise RiotAPIError(f"Error fetching data from API: {error}")
+    return backoff_delay(attempt)
+
+
+def _retry_delay(response, region: str, method: str, elapsed: float, attempt: int) -> float:
+    '''
+    Records a response of the Riot API (metrics, rate limits, circuit breaker) and classifies it:
+    returns how long to wait before retrying it, or None if it is final. A final error response
+    raises RiotAPIError. Works with the responses of requests and of httpx.
+    '''
+    metrics.record_api_response(method, response.status_code, elapsed, response.headers)
+    rate_limiter.update_from_headers(region, method, response.headers)
+    
+    if response.status_code not in RETRY_STATUS_CODES:
+        circuit_breaker.record_success()
+    else:
+        circuit_breaker.record_failure()
+    
+    if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+        retry_after = response.headers.get('Retry-After')
+        if response.status_code == 429 and retry_after is not None:
+            # La penalizacion la respetan todos los workers en su siguiente acquire()
+            logger.warning(f"API rate limit exceeded. Retrying in {retry_after} seconds.")
+            rate_limiter.penalize(region, float(retry_after))
+            return 0
+        return backoff_delay(attempt)
+    
+    if response.status_code >= 400:
+        raise RiotAPIError(
+            f"Error fetching data from API: {response.status_code} for url: {response.url}", response.status_code
+        )
+    return None
+
+
+def make_request(url, params, method=None, region=None):
     '''
     Makes a GET request to the specified URL with the provided parameters.
     
+    Rate limited (429) and server error (5xx) responses, as well as connection errors and timeouts,
+    are retried up to MAX_RETRIES times with jittered backoff. Every one of them counts as a failure
+    for the circuit breaker: while it is open, no request is sent and CircuitOpenError is raised.
+    
     Parameters:
         url (str): The URL to send the GET request to.
         params (dict): A dictionary of query parameters to include in the GET request.
+        method (str): The Riot API method being called, used for its own rate limit bucket.
+        region (str): The routing value or platform of the request, for its rate limit bucket.
+            By default it is taken from the host.
 
     Returns:
         dict: The JSON response from the API converted to a dictionary.
     '''
-    throttle()
-    try:
-        response = requests.get(url=url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        if response.status_code == 429:
-            retry_after = int(response.headers.get('Retry-After', 1))
-            print(f"API rate limit exceeded. Retrying in {retry_after} seconds.")
-            time.sleep(retry_after)
-            return make_request(url, params)
-        else:
-            raise Exception(f"Error fetching data from API: {e}")
+    # El routing value ("europe") o la plataforma ("euw1") es el primer nivel del host
+    region = region or urlparse(url).netloc.split(".")[0]
+    
+    for attempt in range(MAX_RETRIES + 1):
+        circuit_breaker.before_call()
+        with metrics.timed(metrics.RIOT_API_THROTTLE_SECONDS, "throttle", method=method or "unknown"):
+            rate_limiter.acquire(region, method)
+        
+        start = time.perf_counter()
+        try:
+            response = http_client.get(url, params=params)
+        except requests.exceptions.RequestException as e:
+            time.sleep(_failed_request_delay(e, method, time.perf_counter() - start, attempt))
+            continue
+        
+        delay = _retry_delay(response, region, method, time.perf_counter() - start, attempt)
+        if delay is None:
+            return json_codec.loads(response.content)
+        time.sleep(delay)
+
 
 
+async def make_request_async(url, params, method=None, region=None):
+    '''
+    Same as make_request(), but with httpx and the asyncio-aware rate limiter, so waiting
+    for the API or for the rate limit doesn't block the event loop.
+    '''
+    region = region or urlparse(url).netloc.split(".")[0]
+    
+    for attempt in range(MAX_RETRIES + 1):
+        circuit_breaker.before_call()
+        with metrics.timed(metrics.RIOT_API_THROTTLE_SECONDS, "throttle", method=method or "unknown"):
+            await rate_limiter.acquire_async(region, method)
+        
+        start = time.perf_counter()
+        try:
+            response = await async_http_client.get(url, params=params)
+        except httpx.TransportError as e:
+            await asyncio.sleep(_failed_request_delay(e, method, time.perf_counter() - start, attempt))
+            continue
+        
+        delay = _retry_delay(response, region, method, time.perf_counter() - start, attempt)
+        if delay is None:
+            return json_codec.loads(response.content)
+        await asyncio.sleep(delay)
+
 
 # Game Type
 def get_game_type(queue_id):
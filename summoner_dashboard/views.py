@@ -1,27 +1,88 @@
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
-from .services.summoner_data import SummonerData
-from .utils import get_game_type
-import os
+from . import metrics
+from .circuit_breaker import CircuitOpenError
+from .models import IngestionJobModel, SummonerModel
+from .services.ingestion_queue import ingestion_job_status
+from .services.async_summoner_data import AsyncSummonerData
+from .services.summoner_data import REGION_DEFAULT, SummonerData
+from .utils import RiotAPIError
 from django.conf import settings
 
+def render_timed(request, template_name, context=None, status=None):
+    # render() midiendo el tiempo de la plantilla ("render" en Server-Timing)
+    with metrics.timed(metrics.TEMPLATE_RENDER_SECONDS, "render", template=template_name):
+        return render(request, template_name, context, status=status)
+
+
+def summoner_unavailable(request, summoner_name):
+    # El summoner no esta guardado y la API de Riot no responde: se pide volver a intentarlo en vez de un 500
+    return render_timed(
+        request, 'summoner_dashboard/summoner_unavailable.html', {"summoner_name": summoner_name}, status=503
+    )
+
+
 def home(request):
-    return render(request, 'summoner_dashboard/main_page.html')
+    return render_timed(request, 'summoner_dashboard/main_page.html')
 
 
 def summoner_info(request, summoner_name):
     api_key = settings.API_KEY
     
-    summoner = SummonerData(summoner_name, api_key)
-    summoner_data = summoner.league_data()
-    recent_matches_data = summoner.recent_matches_data()
-    top_champs_data = summoner.top_champions_data()
-    role_data = summoner.role_data()
+    try:
+        summoner = SummonerData(summoner_name, api_key)
+        # Rangos, roles, campeones y partidas recientes en una sola consulta
+        profile = summoner.profile_data()
+        summoner_data = profile["summoner_data"]
+        
+        # Las partidas se descargan en segundo plano (manage.py ingestion_worker); aqui solo se muestra lo ya guardado
+        if summoner_data is None:
+            summoner_data = summoner.league_data()
+    except (CircuitOpenError, RiotAPIError):
+        return summoner_unavailable(request, summoner_name)
+    
+    if profile["summoner_data"] is None:
+        ingestion_job = summoner.enqueue_ingestion()
+    else:
+        # Lo guardado se muestra aunque este desactualizado; si lo esta, se refresca en segundo plano
+        ingestion_job = summoner.refresh_if_stale(summoner_data)
+    
+    ingestion = ingestion_job_status(ingestion_job) if ingestion_job else summoner.ingestion_status()
+    summoner_profile = summoner_page_context(summoner_name, summoner_data, profile, ingestion)
+    return render_timed(request, 'summoner_dashboard/summoner_page.html', summoner_profile)
+
+
+async def summoner_info_async(request, summoner_name):
+    '''
+    Same page as summoner_info, but async end to end: served by the ASGI application, a request
+    waiting on the Riot API or the database doesn't block the worker.
+    '''
+    try:
+        summoner = await AsyncSummonerData.create(summoner_name, settings.API_KEY)
+        profile = await summoner.aprofile_data()
+        summoner_data = profile["summoner_data"]
+        
+        if summoner_data is None:
+            summoner_data = await summoner.aleague_data()
+    except (CircuitOpenError, RiotAPIError):
+        return summoner_unavailable(request, summoner_name)
     
+    if profile["summoner_data"] is None:
+        ingestion_job = await summoner.aenqueue_ingestion()
+    else:
+        ingestion_job = await summoner.arefresh_if_stale(summoner_data)
     
+    ingestion = ingestion_job_status(ingestion_job) if ingestion_job else await summoner.aingestion_status()
+    summoner_profile = summoner_page_context(summoner_name, summoner_data, profile, ingestion)
+    return render_timed(request, 'summoner_dashboard/summoner_page.html', summoner_profile)
+
+
+def summoner_page_context(summoner_name: str, summoner_data: dict, profile: dict, ingestion: dict) -> dict:
     summoner_data = {
         "summoner_name": summoner_name,
         "profile_icon_id": summoner_data["profile_icon_id"],
         "summoner_level": summoner_data["summoner_level"],
+        "last_update": summoner_data.get("last_update"),
         "soloq": {
             "rank": summoner_data["soloq_rank"].title(),
             "lp": summoner_data["soloq_lp"],
@@ -48,40 +109,7 @@ def summoner_info(request, summoner_name):
             "wr": round(champ["wr"]),
             "games_played": champ["matches_played"],
         }
-        for champ in top_champs_data
-    ]
-    
-    recent_matches = [
-        {
-            "game_type": get_game_type(match["queue_id"]),
-            "game_mode": match["game_mode"],
-            "queue_id": match["queue_id"],
-            "game_duration": match["game_duration"],
-            "win": match["win"],
-            "champion_name": match["champion_name"],
-            "item_ids": [
-                match["item0"], 
-                match["item1"], 
-                match["item2"], 
-                match["item3"], 
-                match["item4"], 
-                match["item5"], 
-                match["item6"]
-                ],
-            "summoner_spell_ids": [
-                match["summoner_spell1"], 
-                match["summoner_spell2"]],
-            "kills": int(match["kills"]),
-            "deaths": int(match["deaths"]),
-            "assists": int(match["assists"]),
-            "kda_ratio": round((int(match["kills"]) + int(match["assists"])) / int(match["deaths"]), 2) if int(match["deaths"]) > 0 else round((int(match["kills"]) + int(match["assists"])), 2),
-            "cs": match["cs"],
-            "vision": match["vision"],
-            "participant_summoner_names": [match["participant1_summoner_name"], match["participant2_summoner_name"], match["participant3_summoner_name"], match["participant4_summoner_name"], match["participant5_summoner_name"], match["participant6_summoner_name"], match["participant7_summoner_name"], match["participant8_summoner_name"], match["participant9_summoner_name"], match["participant10_summoner_name"]],
-            "participant_champion_names": [match["participant1_champion_name"], match["participant2_champion_name"], match["participant3_champion_name"], match["participant4_champion_name"], match["participant5_champion_name"], match["participant6_champion_name"], match["participant7_champion_name"], match["participant8_champion_name"], match["participant9_champion_name"], match["participant10_champion_name"]
-            ],
-        }
-        for match in recent_matches_data
+        for champ in profile["top_champions"]
     ]
 
 
@@ -89,9 +117,54 @@ def summoner_info(request, summoner_name):
         'summoner_name': summoner_name,
         'summoner_data': summoner_data,
         'champions_played': champions_played,
-        'recent_matches': recent_matches,
-        'role_data': role_data,
+        'recent_matches': profile["recent_matches"],
+        'next_matches_cursor': profile["next_matches_cursor"],
+        'role_data': profile["role_data"],
+        'ingestion': ingestion,
     }
+    return summoner_profile
+
+
+def stored_summoner(summoner_name: str) -> SummonerModel:
+    # El mismo nombre normalizado puede estar en varias filas (un cambio de nombre, otra region): la mas reciente
+    return SummonerModel.objects.by_name(summoner_name).filter(region=REGION_DEFAULT).order_by('-last_update').first()
+
+
+def recent_matches(request, summoner_name):
+    '''
+    Returns the next page of recent matches ("load more") as an HTML fragment. It only reads the database.
+    '''
+    summoner_model = stored_summoner(summoner_name)
+    if summoner_model is None:
+        raise Http404("Summoner not found.")
+    summoner = SummonerData.from_db(summoner_model, settings.API_KEY)
     
+    try:
+        recent_matches_data, next_matches_cursor = summoner.recent_matches_page(before=request.GET.get('before'))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid matches cursor.")
     
-    return render(request, 'summoner_dashboard/summoner_page.html', summoner_profile)
\ No newline at end of file
+    context = {
+        'recent_matches': recent_matches_data,
+        'next_matches_cursor': next_matches_cursor,
+    }
+    return render_timed(request, 'summoner_dashboard/recent_matches.html', context)
+
+
+def ingestion_status(request, summoner_name):
+    summoner = stored_summoner(summoner_name)
+    job = IngestionJobModel.objects.filter(summoner_puuid=summoner.summoner_puuid).first() if summoner else None
+    
+    if job is None:
+        return JsonResponse({"status": None, "active": False}, status=404)
+    return JsonResponse(ingestion_job_status(job))
+
+
+def metrics_view(request):
+    '''
+    Metrics of this process in the Prometheus text format, only for the addresses in METRICS_ALLOWED_IPS.
+    '''
+    # REMOTE_ADDR y no X-Forwarded-For, que lo puede poner cualquier cliente
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, "METRICS_ALLOWED_IPS", ()):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'summoner_dashboard.middleware.server_timing_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -147,4 +148,34 @@ LOGGING = {
 
 
 
-API_KEY = env('RIOT_API_KEY')
\ No newline at end of file
+API_KEY = env('RIOT_API_KEY')
+
+
+# Estado del rate limiter de la API de Riot, compartido por todos los workers.
+# Para varias maquinas se puede usar 'summoner_dashboard.rate_limiter.RedisBackend' con OPTIONS {'url': ...}
+RIOT_RATE_LIMIT_BACKEND = {
+    'BACKEND': 'summoner_dashboard.rate_limiter.SQLiteBackend',
+    'OPTIONS': {
+        'path': BASE_DIR / 'rate_limit.sqlite3',
+    },
+}
+
+
+# Cache de respuestas de la API de Riot compartida por todos los workers (partidas, league entries...).
+# Tambien se puede usar una de las CACHES de Django: 'summoner_dashboard.cache.DjangoCacheBackend' con OPTIONS {'alias': ...}
+RIOT_API_CACHE = {
+    'BACKEND': 'summoner_dashboard.cache.SQLiteCacheBackend',
+    'OPTIONS': {
+        'path': BASE_DIR / 'api_cache.sqlite3',
+        'max_size': 256 * 1024 * 1024,
+    },
+}
+
+
+# IPs que pueden leer /metrics (el scraper de Prometheus); al resto se le responde 403
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+
+
+# Archivo de los payloads completos de match/v5, para volver a extraer las estadisticas sin pedirlos otra vez
+# (manage.py reprocess). None para no archivarlos.
+RIOT_MATCH_ARCHIVE_DIR = BASE_DIR / 'match_archive'